@@ -0,0 +1,70 @@
+"""Per-frame versus batch interpolation and encoding of many frames
+
+Run from the root of the repository (requires NumPy):
+
+    python -m benchmarks.bench_batch [-c config.ini] [-n 100000] [-s 1000] [-r 3]
+
+Both paths are timed `repeat` times and the fastest run counts, so one-time costs such as NumPy loading numpy.random on
+first use are left out of the comparison.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from weathervane.batch import BatchEncoder
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.interpolation import interpolate
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.verify import synthetic_weather_data
+
+
+def fastest(function, repeat):
+    """The shortest time of repeated calls of the function, and its last result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch interpolation and encoding")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--frames", type=int, default=100_000)
+    parser.add_argument("-s", "--snapshots", type=int, default=1000, help="amount of distinct snapshots")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    plan = BitPackingPlan(config_parser.parse_bit_packing_section())
+    rng = random.Random(0)
+    snapshots = [dict(weather_data, error=False) for weather_data in synthetic_weather_data(plan, args.snapshots, rng)]
+    pairs = [rng.randrange(args.snapshots - 1) for _ in range(args.frames)]
+    percentages = [rng.random() for _ in range(args.frames)]
+
+    def per_frame_path():
+        for pair, percentage in zip(pairs, percentages):
+            plan.encode(interpolate(snapshots[pair], snapshots[pair + 1], percentage))
+
+    def batch_path():
+        encoder = BatchEncoder(plan)
+        columns = encoder.columns(snapshots)
+        consecutive = np.arange(args.snapshots - 1)
+        ramp = encoder.ramp(columns.take(consecutive), columns.take(consecutive + 1))
+        return encoder.encode(ramp.at(percentages, np.asarray(pairs)))
+
+    per_frame, _ = fastest(per_frame_path, args.repeat)
+    batch, frames = fastest(batch_path, args.repeat)
+
+    print(f"{args.frames} frames of {plan.byte_length} bytes from {args.snapshots} snapshots")
+    print(f"per frame: {per_frame:8.3f} s ({args.frames / per_frame:10.0f} frames/s)")
+    print(f"batch:     {batch:8.3f} s ({args.frames / batch:10.0f} frames/s, {per_frame / batch:.0f}x)")
+    assert frames.shape == (args.frames, plan.byte_length)
+
+
+if __name__ == "__main__":
+    main()
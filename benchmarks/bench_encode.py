@@ -0,0 +1,44 @@
+"""Frames per second of the bit-packing encoder, before and after compiling the layout
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_encode [-c config.ini] [-n 20000]
+"""
+import argparse
+import random
+import time
+
+from tests.test_bitpacking import legacy_encode, random_weather_data
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.parser import WeathervaneConfigParser
+
+
+def frames_per_second(encode, frames):
+    start = time.perf_counter()
+    for weather_data in frames:
+        encode(weather_data)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bit-packing encoder")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--frames", type=int, default=20_000)
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    bits = config_parser.parse_bit_packing_section()
+    plan = BitPackingPlan(bits)
+    rng = random.Random(0)
+    frames = [random_weather_data(rng) for _ in range(args.frames)]
+
+    before = frames_per_second(lambda wd: legacy_encode(wd, bits, random.randint(0, 255)), frames)
+    after = frames_per_second(plan.encode, frames)
+    print(f"{plan}")
+    print(f"string encoder:   {before:10.0f} frames/s")
+    print(f"compiled encoder: {after:10.0f} frames/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
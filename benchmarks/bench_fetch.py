@@ -0,0 +1,72 @@
+"""Latency per fetch of the feed with a new HTTP client per fetch versus the persistent client of the data source
+
+The feed is served over HTTPS by the local stand-in server. Setting up a connection on localhost is much cheaper than
+over WiFi, so the server can add a delay to every new connection to mimic the extra round trips.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_fetch [-n 50] [--connection-delay 0.05]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from tests.standin import StandInServer, client_ssl_context
+from weathervane.datasources import BuienRadarDataSource
+
+
+async def new_client_per_fetch(url, verify, fetches):
+    latencies = []
+    for _ in range(fetches):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(verify=verify) as client:
+            r = await client.get(url, timeout=5)
+            r.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def persistent_client(url, verify, fetches):
+    data_source = BuienRadarDataSource(None, [], [], url=url, verify=verify)
+    latencies = []
+    try:
+        for _ in range(fetches):
+            start = time.perf_counter()
+            r = await data_source._get_client().get(url, timeout=5)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await data_source.aclose()
+    return latencies
+
+
+def summary(name, latencies):
+    return (f"{name:<22}{statistics.median(latencies) * 1000:8.1f} ms median"
+            f"{statistics.mean(latencies) * 1000:8.1f} ms mean")
+
+
+async def run(fetches, connection_delay):
+    verify = client_ssl_context()
+    with StandInServer(connection_delay=connection_delay) as server:
+        before = await new_client_per_fetch(server.url, verify, fetches)
+        connections = server.connections
+        after = await persistent_client(server.url, verify, fetches)
+        print(f"{fetches} fetches, {connection_delay * 1000:.0f} ms extra per new connection")
+        print(summary("new client per fetch", before) + f"{connections:6} connections")
+        print(summary("persistent client", after) + f"{server.connections - connections:6} connections")
+        print(f"saved per fetch: {(statistics.mean(before) - statistics.mean(after)) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the persistent HTTP client of the data source")
+    parser.add_argument("-n", "--fetches", type=int, default=50)
+    parser.add_argument("--connection-delay", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.fetches, args.connection_delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Time to data under packet loss, with a fixed timeout and retry delay versus hedged requests and adaptive timeouts
+
+The local stand-in server stalls a fraction of the requests for a while, as a lost packet does until it is sent again
+after the retransmission timeout. Before, a stalled request was waited for; now a hedged request is sent once the first
+one takes longer than nearly all recent requests.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_hedge [-n 200] [--loss 0.3] [--loss-delay 1.0]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from tests.standin import StandInServer, client_ssl_context, fresh_feed
+from weathervane.datasources import BuienRadarDataSource
+from weathervane.parser import WeathervaneConfigParser
+
+
+async def time_to_data(config, url, fetches, hedging):
+    data_source = BuienRadarDataSource(None, config["stations"], config["bits"], url=url,
+                                       verify=client_ssl_context(), hedging=hedging)
+    latencies = []
+    try:
+        for _ in range(fetches):
+            # Every fetch gets and parses the feed, instead of finding it unchanged
+            data_source._forget_feed()
+            start = time.perf_counter()
+            await data_source.retrieve()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await data_source.aclose()
+    return latencies, data_source
+
+
+def summary(name, latencies):
+    ordered = sorted(latencies)
+    return (f"{name:<10}{statistics.median(latencies) * 1000:8.1f} ms median"
+            f"{statistics.mean(latencies) * 1000:8.1f} ms mean"
+            f"{ordered[int(0.95 * len(ordered))] * 1000:8.1f} ms p95")
+
+
+async def run(config, fetches, loss, loss_delay):
+    print(f"{fetches} fetches, {loss:.0%} of the requests stall for {loss_delay * 1000:.0f} ms")
+    for name, hedging in (("fixed", False), ("hedged", True)):
+        with StandInServer(body=fresh_feed(), loss=loss, loss_delay=loss_delay, seed=1) as server:
+            latencies, data_source = await time_to_data(config, server.url, fetches, hedging)
+            print(summary(name, latencies) + f"{server.stalled:6} stalls{data_source.hedges:6} hedges"
+                                             f"{data_source.hedges_won:6} won")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged requests under packet loss")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--fetches", type=int, default=200)
+    parser.add_argument("--loss", type=float, default=0.3)
+    parser.add_argument("--loss-delay", type=float, default=1.0)
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    asyncio.run(run(config_parser.parse_config(), args.fetches, args.loss, args.loss_delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Time and peak memory of decoding the whole feed versus extracting the configured stations while streaming
+
+The feed in tests/buienradar.json is used as is, and enlarged with copies of its stations to mimic a bigger feed.
+Peak memory is measured with tracemalloc, which only counts allocations by Python, as an indication of the peak RSS.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_parse [-n 200] [--stations 1000]
+"""
+import argparse
+import copy
+import json
+import time
+import tracemalloc
+
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser
+from weathervane.streaming import StationExtractor
+
+CHUNK_SIZE = 16 * 1024
+
+
+def enlarged_feed(feed: bytes, stations: int) -> bytes:
+    data = json.loads(feed)
+    measurements = data["actual"]["stationmeasurements"]
+    copies = []
+    for i in range(stations - len(measurements)):
+        station = copy.deepcopy(measurements[i % len(measurements)])
+        station["stationid"] = 100_000 + i
+        copies.append(station)
+    measurements.extend(copies)
+    return json.dumps(data, indent=2).encode()
+
+
+def decode_whole_feed(feed, parser):
+    return parser.parse(json.loads(feed))
+
+
+def extract_while_streaming(feed, parser):
+    extractor = StationExtractor(parser.stations)
+    for i in range(0, len(feed), CHUNK_SIZE):
+        extractor.feed(feed[i:i + CHUNK_SIZE])
+    return parser.parse(extractor.close())
+
+
+def measure(function, feed, parser, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function(feed, parser)
+    elapsed = (time.perf_counter() - start) / repetitions
+
+    tracemalloc.start()
+    function(feed, parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decoding the feed versus streaming extraction")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--repetitions", type=int, default=200)
+    parser.add_argument("--stations", type=int, default=1000, help="amount of stations in the enlarged feed")
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    config = config_parser.parse_config()
+    weather_parser = BuienradarParser(config["stations"], config["bits"])
+
+    with open("tests/buienradar.json", "rb") as f:
+        feed = f.read()
+    for name, data in (("recorded feed", feed), (f"{args.stations} stations", enlarged_feed(feed, args.stations))):
+        print(f"{name}: {len(data) / 1024:.0f} KiB")
+        for label, function in (("json.loads", decode_whole_feed), ("streaming", extract_while_streaming)):
+            elapsed, peak = measure(function, data, weather_parser, args.repetitions)
+            print(f"  {label:<12}{elapsed * 1000:8.2f} ms{peak / 1024:10.0f} KiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time until fetch_weather_data publishes weather data when the provider fails, and how often it needs to recover
+
+The local stand-in server answers a fraction of the requests with 503, resets the connection or cuts the body off.
+A fetch retries with backoff; when all attempts fail it resets the WiFi and tries again, and reboots if that fails too.
+The WiFi reset and the reboot are only counted here, and the WiFi reset pretends to succeed at once.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_recovery [-n 50] [--error-rate 0.1] [--reset-rate 0.1] [--truncate-rate 0.1]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from tests.standin import StandInServer, client_ssl_context, synthetic_feed
+from weathervane.datasources import DEFAULT_WEATHER_DATA, BuienRadarDataSource
+from weathervane.parser import WeathervaneConfigParser
+
+
+class CountingDataSource(BuienRadarDataSource):
+    wifi_resets = 0
+    reboots = 0
+
+    @classmethod
+    def _reset_wifi_connection(cls):
+        cls.wifi_resets += 1
+        return True
+
+    @classmethod
+    def _reboot_system(cls):
+        cls.reboots += 1
+        return False
+
+
+async def run(config, fetches, error_rate, reset_rate, truncate_rate):
+    server = StandInServer(body=synthetic_feed(seed=1), validators=False, error_rate=error_rate,
+                           reset_rate=reset_rate, truncate_rate=truncate_rate, seed=1)
+    with server:
+        data_source = CountingDataSource(asyncio.Queue(maxsize=1), config["stations"], config["bits"],
+                                         url=server.url, verify=client_ssl_context())
+        latencies = []
+        defaults = 0
+        try:
+            for _ in range(fetches):
+                data_source._forget_feed()
+                start = time.perf_counter()
+                await data_source.fetch_weather_data()
+                latencies.append(time.perf_counter() - start)
+                defaults += data_source.queue.get_nowait() is DEFAULT_WEATHER_DATA
+        finally:
+            await data_source.aclose()
+
+    ordered = sorted(latencies)
+    print(f"{fetches} fetches, {server.requests} requests, injected: "
+          + ", ".join(f"{count} {kind}" for kind, count in sorted(server.injected.items())))
+    print(f"time to publish: {statistics.median(latencies) * 1000:.1f} ms median, "
+          f"{ordered[int(0.95 * len(ordered))] * 1000:.1f} ms p95, {max(latencies) * 1000:.1f} ms max")
+    print(f"{defaults} default weather data, {CountingDataSource.wifi_resets} WiFi resets, "
+          f"{CountingDataSource.reboots} reboots")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recovery of fetch_weather_data from faults")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--fetches", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--reset-rate", type=float, default=0.1)
+    parser.add_argument("--truncate-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    # Every failed attempt is logged, which would bury the results
+    logging.disable(logging.CRITICAL)
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    asyncio.run(run(config_parser.parse_config(), args.fetches, args.error_rate, args.reset_rate, args.truncate_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Latency of getting the feed and time of parsing it, as the feed grows from 10 to 100 000 stations
+
+Synthetic feeds are served over HTTPS by the local stand-in server, so the latency includes TLS, the transfer and the
+extraction or decoding of the feed, but not the internet. Some measurements are left out, so the parser also falls
+back to the secondary stations.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_scaling [-n 10] [--stations 10,100,1000,10000,100000] [--missing 0.1]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from tests.standin import StandInServer, client_ssl_context, synthetic_feed
+from weathervane.datasources import BuienRadarDataSource
+from weathervane.parser import BuienradarParser, WeathervaneConfigParser
+
+
+async def get_weather(config, url, fetches, streaming):
+    data_source = BuienRadarDataSource(None, config["stations"], config["bits"], url=url,
+                                       verify=client_ssl_context(), streaming=streaming)
+    latencies = []
+    try:
+        for _ in range(fetches):
+            # Every fetch gets the whole feed, instead of finding it unchanged
+            data_source._forget_feed()
+            start = time.perf_counter()
+            await data_source._BuienRadarDataSource__get_weather()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await data_source.aclose()
+    return latencies
+
+
+def parse(config, feed, repetitions):
+    parser = BuienradarParser(config["stations"], config["bits"])
+    durations = []
+    for _ in range(repetitions):
+        data = json.loads(feed)
+        start = time.perf_counter()
+        parser.parse(data)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+async def run(config, fetches, amounts, missing):
+    print(f"{'stations':>9}{'KiB':>9}{'streaming':>12}{'json.loads':>12}{'parse':>10}  (medians in ms)")
+    for amount in amounts:
+        feed = synthetic_feed(amount, missing=missing, seed=1)
+        with StandInServer(body=feed, validators=False) as server:
+            streaming = await get_weather(config, server.url, fetches, True)
+            decoding = await get_weather(config, server.url, fetches, False)
+        parsing = parse(config, feed, fetches)
+        print(f"{amount:9}{len(feed) / 1024:9.0f}{statistics.median(streaming) * 1000:12.1f}"
+              f"{statistics.median(decoding) * 1000:12.1f}{statistics.median(parsing) * 1000:10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark getting and parsing the feed as it grows")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--fetches", type=int, default=10)
+    parser.add_argument("--stations", default="10,100,1000,10000,100000",
+                        help="comma-separated amounts of stations in the feed")
+    parser.add_argument("--missing", type=float, default=0.1, help="probability that a measurement is missing")
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    amounts = [int(amount) for amount in args.stations.split(",")]
+    asyncio.run(run(config_parser.parse_config(), args.fetches, amounts, args.missing))
+
+
+if __name__ == "__main__":
+    main()
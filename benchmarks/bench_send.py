@@ -0,0 +1,106 @@
+"""Memory allocated per frame on the way from the weather data to the SPI device, measured with tracemalloc
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_send [-c config.ini] [-n 10000]
+
+No SPI device is needed: a stand-in for spidev does in Python what spidev does in C with the frame. xfer converts the
+frame into a list and returns the bytes it read as another list; writebytes2 reads the buffer of the frame directly.
+
+The peak of the traced memory is reset before every frame, so the peak after it is the memory that the frame needed at
+most, including objects that were freed again right away. Three paths are compared:
+
+- encode into a new bytearray and send it with xfer
+- encode into the buffer of the interface and send it with writebytes2
+- send the precomputed frames of a FrameTable with writebytes2, which is what the display timer does
+
+The last two paths make no copy of the frame at all: no new bytearray, no list for xfer, and no temporary copy when the
+frame is remembered for the comparison with the next one. What they still allocate are the integers of the arithmetic,
+packing the fields and comparing frames apart from the don't care bits, which are freed right away. Nothing is retained
+per frame.
+"""
+import argparse
+import random
+import tracemalloc
+
+from weathervane.gpio import GPIO
+from weathervane.interpolation import FrameTable
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.verify import synthetic_weather_data
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+
+class SpidevStandIn(object):
+    def xfer(self, frame):
+        sent = list(frame)
+        return [0] * len(sent)
+
+    def writebytes2(self, frame):
+        pass
+
+
+class StandInGPIO(GPIO):
+    def open_spi(self):
+        return SpidevStandIn()
+
+
+def bytes_per_frame(send, items):
+    """The mean and the largest amount of memory that sending one frame allocated, and the memory still allocated
+    after all frames"""
+    for item in items[:10]:
+        # Warm up caches such as the one of the logging module
+        send(item)
+    total = largest = 0
+    start = tracemalloc.get_traced_memory()[0]
+    for item in items:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        send(item)
+        peak = tracemalloc.get_traced_memory()[1] - before
+        total += peak
+        largest = max(largest, peak)
+    retained = tracemalloc.get_traced_memory()[0] - start
+    return total / len(items), largest, retained
+
+
+def interface(configuration, write_only):
+    wvi = WeatherVaneInterface(**dict(configuration, test=True, writer_thread=False, write_only=write_only))
+    wvi.gpio = StandInGPIO(**dict(configuration, test=True, writer_thread=False, write_only=write_only,
+                                  dont_care=wvi.plan.mask_of(["random"])))
+    return wvi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory allocated per frame sent")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-n", "--frames", type=int, default=10_000)
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    configuration = config_parser.parse_config()
+    copying, zero_copy = interface(configuration, write_only=False), interface(configuration, write_only=True)
+    rng = random.Random(0)
+    snapshots = [dict(weather_data, error=False)
+                 for weather_data in synthetic_weather_data(copying.plan, args.frames, rng)]
+    frames = FrameTable.build(snapshots[0], snapshots[1], zero_copy.encode_weather_data, anchor=0,
+                              duration=args.frames, interval=1).frames
+
+    tracemalloc.start()
+    try:
+        results = [
+            ("new bytearray, xfer", bytes_per_frame(
+                lambda weather_data: copying.send_frame(copying.encode_weather_data(weather_data)), snapshots
+            )),
+            ("reused buffer, writebytes2", bytes_per_frame(zero_copy.send, snapshots)),
+            ("frame table, writebytes2", bytes_per_frame(zero_copy.send_frame, frames)),
+        ]
+    finally:
+        tracemalloc.stop()
+    print(f"{copying.plan}, {args.frames} frames")
+    for name, (mean, largest, retained) in results:
+        print(f"{name:28} {mean:8.1f} bytes/frame on average, {largest:6d} at most, {retained:6d} retained")
+
+
+if __name__ == "__main__":
+    main()
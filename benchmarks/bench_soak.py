@@ -0,0 +1,79 @@
+"""Soak test of the whole send path against the simulated display, without a Raspberry Pi
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_soak [-c config.ini] [-s 10] [-i 0.01] [--bit-error-rate 0.0001] [--latency 0.002]
+
+Transitions between synthetic snapshots are encoded into FrameTables and sent every `interval` seconds, through the
+writer thread, to a SimulatedDisplay with the layout and frequency of the configuration. Afterwards every frame that
+the display received is compared with the frame that was sent, and the statistics of both ends are printed.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from weathervane.interpolation import FrameTable
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.verify import synthetic_weather_data
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+
+async def soak(interface: WeatherVaneInterface, seconds: float, interval: float, frames_per_transition: int):
+    rng = random.Random(0)
+    snapshots = synthetic_weather_data(interface.plan, 1_000_000, rng)
+    old = dict(next(snapshots), error=False)
+    stop = time.monotonic() + seconds
+    sent = 0
+    while time.monotonic() < stop:
+        new = dict(next(snapshots), error=False)
+        table = FrameTable.build(old, new, interface.encode_weather_data, anchor=0,
+                                 duration=frames_per_transition * interval, interval=interval)
+        for frame in table.frames:
+            interface.send_frame(frame)
+            sent += 1
+            await asyncio.sleep(interval)
+        old = new
+    # Let the writer thread finish the last frame and report it
+    await asyncio.sleep(0.1)
+    interface.close()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the send path against a simulated display")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-s", "--seconds", type=float, default=10.0)
+    parser.add_argument("-i", "--interval", type=float, default=0.01, help="seconds between frames")
+    parser.add_argument("-t", "--transition", type=int, default=20, help="frames per transition")
+    parser.add_argument("--bit-error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0002, help="seconds of driver overhead per transfer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="at most this many seconds of extra latency")
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    configuration = config_parser.parse_config()
+    simulator = dict(configuration["simulator"], bit_error_rate=args.bit_error_rate, latency=args.latency,
+                     latency_jitter=args.jitter, history=int(args.seconds / args.interval) + 1000)
+
+    async def run():
+        interface = WeatherVaneInterface(**dict(configuration, test=True, writer_thread=True, simulator=simulator))
+        return interface, await soak(interface, args.seconds, args.interval, args.transition)
+
+    interface, sent = asyncio.run(run())
+    gpio = interface.gpio
+    display = gpio.writer.spi
+    corrupted = sum(received.frame != received.sent for received in display.history)
+    stats = gpio.stats()
+    print(f"{interface.plan}, {display}")
+    print(f"{sent} frames offered, {stats['frames_sent']} sent, {stats['frames_suppressed']} suppressed as unchanged, "
+          f"{stats['overwrites']} overwritten before the transfer")
+    print(f"{display.frames_received} received, {corrupted} with bit errors ({display.bit_errors} bits), "
+          f"{display.undecodable} undecodable, {stats['transfer_errors']} transfer errors")
+    print(f"transfer latency {stats['latency_p50_ms']:.3f} ms median, {stats['latency_p99_ms']:.3f} ms p99; "
+          f"the bus was busy {display.busy_time / args.seconds:.1%} of the time")
+
+
+if __name__ == "__main__":
+    main()
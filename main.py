@@ -3,15 +3,19 @@ import argparse
 import asyncio
 import logging
 import time
+from datetime import datetime
 
 import httpx
 
-from weathervane.datasources import BuienRadarDataSource
-from weathervane.parser import WeathervaneConfigParser
-from weathervane.weathervaneinterface import Display, WeatherVaneInterface
+from weathervane.datasources import DEFAULT_WEATHER_DATA, create_data_source
+from weathervane.fetcher import FetchCoordinator
+from weathervane.interpolation import FrameTable, interpolate
+from weathervane.parser import HOUR_ERROR_LIMIT, WeathervaneConfigParser, is_weather_data_stale
+from weathervane.polling import MAX_INTERVAL
+from weathervane.scheduler import Scheduler
+from weathervane.weathervaneinterface import Display, DisplayGroup
 
-NON_INTERPOLATABLE_VARIABLES = ["error", "winddirection", "winddirection", "rain", "barometric_trend"]
-SLEEP_INTERVAL = 0.1
+STATS_INTERVAL = 60 * 60
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -28,6 +32,9 @@ class TestDisplay:
     async def tick(self):
         pass
 
+    def seconds_until_next_transition(self, now):
+        return None
+
 
 class WeatherVane(object):
     def __init__(self, *args, **configuration):
@@ -36,7 +43,7 @@ class WeatherVane(object):
         self.bits = configuration.get('bits')
         self.args = args
         self.configuration = configuration
-        self.interface = WeatherVaneInterface(*args, **configuration)
+        self.interface = DisplayGroup.from_configuration(*args, **configuration)
 
         if not configuration.get("test", False):
             self.display = Display(**configuration["display"])
@@ -44,75 +51,139 @@ class WeatherVane(object):
             self.display = TestDisplay()
         logger.info(f"Using {self.interface}")
         self.wd = None
+        self.frame_table = None
         self.data_collection_interval = configuration["data_collection_interval"]
         self.data_display_interval = configuration["data_display_interval"]
+        self.last_arrival = None
+        self.collection_timer = None
         self.start_collection_time = time.monotonic()
         self.end_collection_time = time.monotonic()
         self.queue = asyncio.Queue(maxsize=1)
-        self.data_source = BuienRadarDataSource(self.queue, self.stations, self.bits)
+        self.scheduler = Scheduler()
+        self.data_source = create_data_source(self.queue, configuration)
+        self.fetcher = FetchCoordinator(self.data_source, self.data_collection_interval, DEFAULT_WEATHER_DATA)
+
+    def show_snapshot(self) -> bool:
+        """Send the last good frame of the previous run, before there is any network activity
+
+        The error bit is set if the weather data is too old to be trusted.
+        """
+        snapshots = self.data_source.snapshots
+        snapshot = snapshots.load() if snapshots else None
+        if snapshot is None:
+            return False
+        timestamp = snapshot.weather_data.get("timestamp")
+        if timestamp:
+            stale = is_weather_data_stale(timestamp, datetime.now())
+        else:
+            stale = snapshot.age() > HOUR_ERROR_LIMIT
+        self.wd = dict(snapshot.weather_data, error=stale)
+        self.interface.send_frame(
+            self.interface.encode_weather_data(self.wd, first_frame=snapshots.frame_of(snapshot, error=stale))
+        )
+        logger.info(f"Showing the snapshot of {snapshot.age() / 60:.0f} minutes ago")
+        return True
 
     async def start_data_collection(self):
-        await asyncio.create_task(self.data_source.fetch_weather_data())
+        await self.fetcher.fetch()
 
     async def retrieve_data(self):
-        wd = self.queue.get_nowait()
+        wd = await self.queue.get()
         self.old_weatherdata, self.wd = self.wd, wd
         logger.info("weather data", extra=wd)
+        now = time.monotonic()
+        self.frame_table = self.build_frame_table(self.old_weatherdata, wd, now, self.transition_duration(now))
+        self.schedule_collection()
         return wd
 
+    def transition_duration(self, now: float) -> float:
+        """The transition to new weather data lasts as long as the interval since the previous weather data arrived"""
+        previous, self.last_arrival = self.last_arrival, now
+        if previous is None:
+            return self.data_collection_interval
+        return min(MAX_INTERVAL, max(self.data_display_interval, now - previous))
+
     @staticmethod
     def interpolate(old_weatherdata, new_weatherdata, percentage):
-        percentage = min(percentage, 1)
-        if new_weatherdata["error"]:
-            return new_weatherdata
-        if not old_weatherdata:
-            return new_weatherdata
-
-        interpolated_wd = {}
-
-        for key, old_value in old_weatherdata.items():
-            new_value = new_weatherdata.get(key, None)
-            if not new_value:
-                interpolated_wd[key] = old_value
-            elif key in NON_INTERPOLATABLE_VARIABLES:
-                interpolated_wd[key] = new_value
-            else:
-                try:
-                    interpolated_wd[key] = float(old_value) + (percentage * (float(new_value) - float(old_value)))
-                except ValueError:
-                    interpolated_wd[key] = new_value
-                except TypeError:
-                    interpolated_wd[key] = new_value
-
-        return interpolated_wd
+        return interpolate(old_weatherdata, new_weatherdata, percentage)
+
+    def build_frame_table(self, old_weatherdata, new_weatherdata, anchor, duration=None):
+        """Encode all frames of the transition to the new weather data, which starts at `anchor`"""
+        frame_table = FrameTable.build(
+            old_weatherdata,
+            new_weatherdata,
+            self.interface.encode_weather_data,
+            anchor=anchor,
+            duration=duration or self.data_collection_interval,
+            interval=self.data_display_interval,
+        )
+        logger.debug(f"Built {frame_table}")
+        return frame_table
+
+    def collect_data(self):
+        logger.debug(f"Starting weather data collection from {self.data_source}")
+        self.fetcher.start()
+
+    def next_collection(self, _previous_deadline=None):
+        return time.monotonic() + self.data_source.polling.next_delay()
+
+    def schedule_collection(self):
+        """Plan the next fetch, now that the polling policy of the data source has seen the latest weather data
+
+        Until new weather data arrives the timer keeps repeating on its own, in case a fetch does not queue any. The
+        same timer is moved to the new deadline, so its statistics cover all fetches.
+        """
+        if self.collection_timer:
+            self.scheduler.reschedule(self.collection_timer, self.next_collection())
+        else:
+            self.collection_timer = self.scheduler.call_repeatedly(
+                self.next_collection(), self.next_collection, self.collect_data
+            )
 
-    async def loop(self):
-        prev_data_collection_start_time = time.monotonic()
-        prev_display_data_send_time = time.monotonic()
-        await self.start_data_collection()
-        wd = None
+    def show_frame(self):
+        if self.frame_table:
+            self.interface.send_frame(self.frame_table.frame_at(time.monotonic()))
 
+    async def consume_data(self):
         while True:
-            await self.display.tick()
+            await self.retrieve_data()
 
-            if time.monotonic() - prev_data_collection_start_time > self.data_collection_interval:
-                prev_data_collection_start_time = time.monotonic()
-                logger.debug("Starting weather data collection from BuienRadar")
-                asyncio.create_task(self.data_source.fetch_weather_data())
+    def consumer_done(self, consumer: asyncio.Task):
+        """Stop the scheduler when the consumer failed
 
-            while not self.queue.empty():
-                wd = await self.retrieve_data()
+        Otherwise the display keeps showing the last frame table and the fetches fill a queue that nobody reads.
+        """
+        if consumer.cancelled() or consumer.exception() is None:
+            return
+        logger.error(f"Consuming the weather data failed: {consumer.exception()!r}")
+        self.scheduler.stop()
 
-            display_time_elapsed = time.monotonic() - prev_display_data_send_time
-            if wd and display_time_elapsed > self.data_display_interval:
-                prev_display_data_send_time = time.monotonic()
-                percentage = display_time_elapsed / self.data_collection_interval
-                interpolated_wd = self.interpolate(self.old_weatherdata, wd, percentage)
-                logger.debug(f"Sending interpolated weather data to interface: {interpolated_wd}")
-                self.interface.send(interpolated_wd)
-                logger.debug("Weather data sent successfully")
+    def next_display_transition(self, _previous_deadline=None):
+        seconds = self.display.seconds_until_next_transition(datetime.now())
+        return None if seconds is None else time.monotonic() + seconds
 
-            await asyncio.sleep(SLEEP_INTERVAL)
+    async def loop(self):
+        await self.start_data_collection()
+        consumer = asyncio.create_task(self.consume_data())
+        consumer.add_done_callback(self.consumer_done)
+
+        now = time.monotonic()
+        scheduler = self.scheduler
+        self.schedule_collection()
+        scheduler.call_every(self.data_display_interval, self.show_frame)
+        scheduler.call_repeatedly(now, self.next_display_transition, self.display.tick, name="display")
+        scheduler.call_every(STATS_INTERVAL, scheduler.log_stats, start=now + STATS_INTERVAL)
+        scheduler.call_every(STATS_INTERVAL, self.interface.log_stats, start=now + STATS_INTERVAL, name="spi stats")
+        try:
+            await scheduler.run()
+            # The scheduler only stops when the consumer failed; raise its error, so the process exits and systemd
+            # restarts it
+            consumer.result()
+        finally:
+            consumer.cancel()
+            self.interface.close()
+            await self.fetcher.aclose()
+            await self.data_source.aclose()
 
 
 def get_configuration(args):
@@ -139,6 +210,8 @@ async def main():
     wv_config = get_configuration(args)
     logger.info("Weathervane started with properties", extra=wv_config)
     wv = WeatherVane(**wv_config)
+    wv.show_snapshot()
+    await asyncio.to_thread(wait_for_connection)
     await wv.loop()
 
 
@@ -158,7 +231,6 @@ def wait_for_connection():
 
 if __name__ == "__main__":
     try:
-        wait_for_connection()
         asyncio.run(main())
     finally:
         logger.info("Shutting down")
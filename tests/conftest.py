@@ -0,0 +1,9 @@
+import pytest
+
+from tests.helpers import load_configuration
+
+
+@pytest.fixture
+def configuration() -> dict:
+    """The configuration of config-test1.ini"""
+    return load_configuration()
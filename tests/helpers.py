@@ -0,0 +1,12 @@
+"""Helpers that several test modules share"""
+from weathervane.parser import WeathervaneConfigParser
+
+
+def load_configuration(**overrides) -> dict:
+    """The configuration of config-test1.ini, with the given keys overridden
+
+    The snapshot and the history are not kept in files, so the tests do not write into the working directory.
+    """
+    config_parser = WeathervaneConfigParser()
+    config_parser.read("tests/config-test1.ini")
+    return {**config_parser.parse_config(), "snapshot_file": None, "history_file": "", **overrides}
@@ -1,6 +1,11 @@
-from unittest.mock import MagicMock
+import asyncio
+import threading
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
 
 from weathervane.gpio import GPIO
+from weathervane.spiwriter import SpiWriter
 
 
 def test_initialization():
@@ -14,3 +19,147 @@ def test_transmission():
     spi.send_data(data)
     assert spi.spi.xfer.called
 
+
+def test_unchanged_frame_is_suppressed():
+    spi = GPIO(channel=0, frequency=25000, test=True)
+    assert spi.send_data(bytearray([1, 2]))
+    assert not spi.send_data(bytearray([1, 2]))
+    assert spi.send_data(bytearray([1, 3]))
+    assert spi.spi.frames_received == 2
+    assert spi.frames_sent == 2
+    assert spi.frames_suppressed == 1
+
+
+def test_unchanged_frame_is_sent_after_keep_alive_interval():
+    spi = GPIO(channel=0, frequency=25000, test=True, keep_alive_interval=10)
+    with patch("weathervane.gpio.time.monotonic", side_effect=[100.0, 105.0, 110.5]):
+        assert spi.send_data(bytearray([1]))
+        assert not spi.send_data(bytearray([1]))
+        assert spi.send_data(bytearray([1]))
+
+
+def test_forced_frame_is_always_sent():
+    spi = GPIO(channel=0, frequency=25000, test=True)
+    spi.send_data(bytearray([1]))
+    assert spi.send_data(bytearray([1]), force=True)
+
+
+def test_dont_care_bits_are_ignored():
+    spi = GPIO(channel=0, frequency=25000, test=True, dont_care=bytes([0x00, 0x0F]))
+    assert spi.send_data(bytearray([0xAA, 0x01]))
+    assert not spi.send_data(bytearray([0xAA, 0x0E]))
+    assert spi.send_data(bytearray([0xAB, 0x0E]))
+
+
+class BlockingSpi(object):
+    """An SPI device whose transfers wait until they are released"""
+
+    def __init__(self):
+        self.frames = []
+        self.threads = set()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def xfer(self, frame):
+        self.threads.add(threading.current_thread().name)
+        self.started.set()
+        self.release.wait(1)
+        self.frames.append(bytes(frame))
+
+
+def test_writer_thread_overwrites_waiting_frames():
+    spi = BlockingSpi()
+    with patch.object(GPIO, "open_spi", return_value=spi):
+        gpio = GPIO(test=True, writer_thread=True)
+    gpio.send_data(bytearray([1]))
+    assert spi.started.wait(1)
+    # The thread is busy with the first frame, so only the newest of the others is sent after it
+    for frame in ([2], [3], [4]):
+        assert gpio.send_data(bytearray(frame))
+    spi.release.set()
+    gpio.close()
+
+    assert spi.frames == [bytes([1]), bytes([4])]
+    assert spi.threads == {"spi-writer-0.0"}
+    assert gpio.stats()["overwrites"] == 2
+    assert gpio.stats()["frames_sent"] == 4
+    assert gpio.transfers == 2
+
+
+def test_writer_thread_reports_errors():
+    failing = Mock()
+    failing.xfer.side_effect = OSError("no device")
+    with patch.object(GPIO, "open_spi", return_value=failing):
+        gpio = GPIO(test=True, writer_thread=True)
+    gpio.send_data(bytearray([1]))
+    gpio.close()
+    assert gpio.transfer_errors == 1
+    assert isinstance(gpio.last_error, OSError)
+    assert failing.close.called
+
+
+def test_writer_thread_does_not_start_without_a_device():
+    with patch.object(GPIO, "open_spi", side_effect=FileNotFoundError("/dev/spidev0.0")):
+        with pytest.raises(FileNotFoundError):
+            GPIO(test=True, writer_thread=True)
+
+
+def test_writer_thread_reports_on_the_loop():
+    threads = []
+
+    def report(transfer):
+        threads.append(threading.current_thread())
+        gpio.record_transfer(transfer)
+
+    async def send():
+        gpio.writer = SpiWriter(Mock(), report, asyncio.get_running_loop())
+        gpio.send_data(bytearray([1]))
+        for _ in range(100):
+            if gpio.transfers:
+                break
+            await asyncio.sleep(0.01)
+        gpio.close()
+
+    gpio = GPIO(test=True)
+    asyncio.run(send())
+    assert gpio.transfers == 1
+    assert threads == [threading.main_thread()]
+
+
+def test_write_only_sends_the_buffer_itself():
+    spi = GPIO(test=True, write_only=True)
+    frame = memoryview(bytearray([1, 2]))
+    with patch.object(spi.spi, "writebytes2") as writebytes2, patch.object(spi.spi, "xfer") as xfer:
+        assert spi.send_data(frame)
+    writebytes2.assert_called_once()
+    assert writebytes2.call_args.args[0] is frame
+    assert not xfer.called
+
+
+def test_reused_buffer_is_compared_with_a_copy_of_the_sent_frame():
+    spi = GPIO(test=True, write_only=True)
+    buffer = bytearray([1, 2])
+    assert spi.send_data(buffer)
+    last_frame = spi.last_frame
+    buffer[1] = 3
+    assert spi.send_data(buffer)
+    assert not spi.send_data(buffer)
+    # The copy of the last frame is kept in the same bytearray
+    assert spi.last_frame is last_frame
+    assert spi.last_frame == bytearray([1, 3])
+
+
+def test_writer_thread_copies_the_frame_into_its_mailbox():
+    spi = BlockingSpi()
+    with patch.object(GPIO, "open_spi", return_value=spi):
+        gpio = GPIO(test=True, writer_thread=True)
+    buffer = bytearray([1])
+    gpio.send_data(buffer)
+    assert spi.started.wait(1)
+    buffer[0] = 2
+    gpio.send_data(buffer)
+    # The caller reuses its buffer right away, which does not change the frames in the mailbox
+    buffer[0] = 3
+    spi.release.set()
+    gpio.close()
+    assert spi.frames == [bytes([1]), bytes([2])]
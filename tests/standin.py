@@ -0,0 +1,304 @@
+"""A local stand-in for the Buienradar feed, for tests and benchmarks
+
+The server runs in a background thread and speaks HTTP/1.1 with keep-alive, optionally over TLS with the self-signed
+certificate in this folder. It counts connections and requests, so tests can check whether connections are reused,
+and it can inject faults: error statuses, slow responses, stalls that mimic packet loss, connections that are reset
+and bodies that are cut off. synthetic_feed() generates feeds of any size, with missing fields and stale measurements.
+"""
+import collections
+import hashlib
+import http.server
+import json
+import os
+import random
+import socket
+import ssl
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Mapping, Optional
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+CERTIFICATE = os.path.join(FOLDER, "standin-cert.pem")
+KEY = os.path.join(FOLDER, "standin-key.pem")
+FEED = os.path.join(FOLDER, "buienradar.json")
+FEED_PATH = "/2.0/feed/json"
+
+ERROR = "error"
+RESET = "reset"
+TRUNCATE = "truncate"
+# Fields of a station that are always in the feed; the measurements of a station can be missing
+IDENTITY_FIELDS = ("$id", "stationid", "stationname", "lat", "lon", "regio", "timestamp")
+WIND_DIRECTIONS = ("N", "NNO", "NO", "ONO", "O", "OZO", "ZO", "ZZO", "Z", "ZZW", "ZW", "WZW", "W", "WNW", "NW", "NNW")
+
+
+def client_ssl_context() -> ssl.SSLContext:
+    """An SSL context for clients that trusts the certificate of the stand-in server"""
+    return ssl.create_default_context(cafile=CERTIFICATE)
+
+
+def fresh_feed() -> bytes:
+    """The recorded feed, with the measurements of all stations dated now so they are not stale"""
+    with open(FEED, "rb") as f:
+        data = json.load(f)
+    timestamp = datetime.now().replace(microsecond=0).isoformat()
+    for station in data["actual"]["stationmeasurements"]:
+        station["timestamp"] = timestamp
+    return json.dumps(data).encode()
+
+
+def _measurements(rng: random.Random) -> dict:
+    direction = rng.randrange(360)
+    windspeed = round(rng.uniform(0, 20), 1)
+    temperature = round(rng.uniform(-10, 35), 1)
+    return {
+        "weatherdescription": "Zwaar bewolkt",
+        "winddirection": WIND_DIRECTIONS[round(direction / 22.5) % 16],
+        "airpressure": round(rng.uniform(970, 1040), 1),
+        "temperature": temperature,
+        "groundtemperature": round(temperature + rng.uniform(-3, 3), 1),
+        "feeltemperature": round(temperature + rng.uniform(-5, 2), 1),
+        "visibility": float(rng.randrange(0, 80_000, 100)),
+        "windgusts": round(windspeed + rng.uniform(0, 10), 1),
+        "windspeed": windspeed,
+        "windspeedBft": min(12, round((windspeed / 0.836) ** (2 / 3))),
+        "humidity": float(rng.randrange(20, 101)),
+        "precipitation": rng.choice([0.0, round(rng.uniform(0.1, 10), 1)]),
+        "sunpower": float(rng.randrange(0, 900)),
+        "rainFallLast24Hour": round(rng.uniform(0, 30), 1),
+        "rainFallLastHour": round(rng.uniform(0, 5), 1),
+        "winddirectiondegrees": direction,
+    }
+
+
+def synthetic_feed(
+        stations: int = 51,
+        missing: float = 0.0,
+        stale: float = 0.0,
+        seed: Optional[int] = None,
+        now: Optional[datetime] = None,
+) -> bytes:
+    """A feed shaped like the recorded one, with random measurements of any amount of stations
+
+    The stations of the recorded feed come first, so the configured stations are in feeds of at least 51 stations;
+    the others get made-up numbers and locations.
+
+    @param missing: probability that a measurement of a station is left out
+    @param stale: probability that the measurements of a station are older than the limit for stale weather data
+    @param now: the timestamp of the measurements that are not stale; defaults to the current time
+    """
+    rng = random.Random(seed)
+    with open(FEED, "rb") as f:
+        data = json.load(f)
+    recorded = data["actual"]["stationmeasurements"]
+    now = (now or datetime.now()).replace(microsecond=0)
+    timestamp = now.isoformat()
+    stale_timestamp = (now - timedelta(hours=3)).isoformat()
+    measurements = []
+    for i in range(stations):
+        if i < len(recorded):
+            station = {key: recorded[i][key] for key in IDENTITY_FIELDS}
+        else:
+            station = {
+                "$id": str(i + 4),
+                "stationid": 100_000 + i,
+                "stationname": f"Meetstation {i}",
+                "lat": round(rng.uniform(50.7, 53.6), 2),
+                "lon": round(rng.uniform(3.3, 7.2), 2),
+                "regio": f"Regio {i}",
+            }
+        station["timestamp"] = stale_timestamp if rng.random() < stale else timestamp
+        for key, value in _measurements(rng).items():
+            if rng.random() >= missing:
+                station[key] = value
+        measurements.append(station)
+    data["actual"]["stationmeasurements"] = measurements
+    return json.dumps(data).encode()
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm the body waits for the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connection_opened()
+
+    def do_GET(self):
+        number = self.server.request_received()
+        if self.path != FEED_PATH:
+            self.send_error(404)
+            return
+        if self.server.response_delay:
+            time.sleep(self.server.response_delay)
+        if self.server.stalls(number):
+            time.sleep(self.server.loss_delay)
+        fault = self.server.fault(number)
+        if fault == RESET:
+            self._reset()
+            return
+        if fault == ERROR or self.server.status != 200:
+            self.send_error(self.server.error_status if fault == ERROR else self.server.status)
+            return
+        body = self.server.body
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.server.validators and self.headers.get("If-None-Match") == etag:
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.validators:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if fault == TRUNCATE:
+            # The client expects the whole body from the Content-Length, but the connection ends halfway
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def _reset(self):
+        """Close the connection without an answer; with a linger time of 0 the client gets a RST instead of a FIN"""
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.server.reset_requested(self.connection)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """Serves the feed on a free port of localhost; use it as a context manager
+
+    @param tls: serve HTTPS instead of HTTP
+    @param connection_delay: seconds to wait before serving a new connection, to mimic the round trips of setting up a
+        connection over a slow network
+    @param validators: send an ETag and answer 304 Not Modified to requests with the current ETag
+    @param status: the status of the answer to every request for the feed, such as 503 for an unavailable provider
+    @param response_delay: seconds to wait before answering a request, to mimic a slow provider
+    @param loss: probability that a request stalls for `loss_delay` seconds, to mimic a lost packet that is sent again
+        after the retransmission timeout
+    @param stalled_requests: the numbers of the requests that stall, counting from 1, for reproducible tests
+    @param error_rate: probability that a request is answered with `error_status`
+    @param reset_rate: probability that the connection is reset instead of answering a request
+    @param truncate_rate: probability that the body of an answer is cut off halfway
+    @param faults: the fault of specific requests, counting from 1, for reproducible tests: ERROR, RESET or TRUNCATE
+    @param seed: seed of the random packet loss and faults
+    """
+    daemon_threads = True
+
+    def __init__(self, tls=True, connection_delay=0.0, body=None, validators=True, status=200,
+                 response_delay=0.0, loss=0.0, loss_delay=1.0, stalled_requests=(), error_rate=0.0,
+                 error_status=503, reset_rate=0.0, truncate_rate=0.0, faults: Optional[Mapping[int, str]] = None,
+                 seed=None):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.tls = tls
+        self.connection_delay = connection_delay
+        if body is None:
+            with open(FEED, "rb") as f:
+                body = f.read()
+        self.body = body
+        self.validators = validators
+        self.status = status
+        self.response_delay = response_delay
+        self.loss = loss
+        self.loss_delay = loss_delay
+        self.stalled_requests = set(stalled_requests)
+        self.stalled = 0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reset_rate = reset_rate
+        self.truncate_rate = truncate_rate
+        self.faults = dict(faults or {})
+        # The amount of injected faults per kind
+        self.injected = collections.Counter()
+        self._resets = set()
+        self._random = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        if tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(CERTIFICATE, KEY)
+            # The handshake happens on the first read, in the thread of the connection instead of the server loop
+            self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+
+    @property
+    def url(self) -> str:
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://localhost:{self.server_address[1]}{FEED_PATH}"
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+        if self.connection_delay:
+            time.sleep(self.connection_delay)
+
+    def request_received(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def stalls(self, number: int) -> bool:
+        with self._lock:
+            stalls = number in self.stalled_requests or self._random.random() < self.loss
+            self.stalled += stalls
+        return stalls
+
+    def fault(self, number: int) -> Optional[str]:
+        """The fault to inject in the answer to a request, if any"""
+        with self._lock:
+            fault = self.faults.get(number)
+            if fault is None:
+                draw = self._random.random()
+                for kind, rate in ((ERROR, self.error_rate), (RESET, self.reset_rate), (TRUNCATE, self.truncate_rate)):
+                    if draw < rate:
+                        fault = kind
+                        break
+                    draw -= rate
+            if fault is not None:
+                self.injected[fault] += 1
+        return fault
+
+    def reset_requested(self, request):
+        with self._lock:
+            self._resets.add(request)
+
+    def shutdown_request(self, request):
+        with self._lock:
+            reset = request in self._resets
+            self._resets.discard(request)
+        if reset:
+            # Shutting down the connection first would send a FIN
+            self.close_request(request)
+        else:
+            super().shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # Clients that close their connection are expected, not worth a traceback
+        pass
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import pytest
+
+from tests.helpers import load_configuration
+from tests.standin import FEED, StandInServer, client_ssl_context
+from weathervane.archive import INDEX_ENTRY, ArchiveReader, ArchiveWriter
+from weathervane.datasources import BuienRadarDataSource
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def record(i: int) -> bytes:
+    return json.dumps({"record": i, "padding": "x" * 1000}).encode()
+
+
+def test_round_trip(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), clock=clock)
+    for i in range(10):
+        writer.append(record(i), fetched_at=clock.now + i)
+    writer.close()
+    records = list(ArchiveReader(str(tmp_path)).records())
+    assert [record(i) for i in range(10)] == [r.data for r in records]
+    assert [clock.now + i for i in range(10)] == [r.fetched_at for r in records]
+    assert writer.bytes_out < writer.bytes_in / 10
+
+
+def test_batched_writes(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), batch_bytes=10_000_000, flush_interval=3600, clock=clock)
+    for i in range(5):
+        assert not writer.append(record(i))
+        clock.now += 60
+    assert 0 == len(ArchiveReader(str(tmp_path)))
+    clock.now += 3600
+    assert writer.append(record(5))
+    assert 6 == len(ArchiveReader(str(tmp_path)))
+    assert 1 == writer.flushes
+
+
+def test_batch_size(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), batch_bytes=10, clock=clock)
+    assert writer.append(record(0))
+
+
+def test_time_range(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), max_bytes=8 * 200, batch_bytes=1, clock=clock)
+    for i in range(40):
+        writer.append(record(i), fetched_at=1000.0 + i)
+    assert len(os.listdir(tmp_path)) > 2
+    reader = ArchiveReader(str(tmp_path))
+    first = reader.records()
+    oldest = next(first).fetched_at
+    first.close()
+    assert [record(i) for i in range(20, 31)] == [r.data for r in reader.records(1020, 1030)]
+    assert [] == list(reader.records(2000))
+    assert 1020 - oldest == len(list(reader.records(end=1019.5)))
+
+
+def test_size_cap(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), max_bytes=4000, batch_bytes=1, clock=clock)
+    for i in range(200):
+        writer.append(record(i), fetched_at=1000.0 + i)
+    assert writer.size() <= 4000
+    assert writer.segments_deleted > 0
+    records = list(ArchiveReader(str(tmp_path)).records())
+    assert record(199) == records[-1].data
+    assert len(records) < 200
+
+
+def test_reopen(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), clock=clock)
+    writer.append(record(0), fetched_at=1000.0)
+    writer.close()
+    writer = ArchiveWriter(str(tmp_path), clock=clock)
+    writer.append(record(1), fetched_at=1001.0)
+    writer.close()
+    assert [record(0), record(1)] == [r.data for r in ArchiveReader(str(tmp_path)).records()]
+
+
+def test_interrupted_write(tmp_path, clock):
+    writer = ArchiveWriter(str(tmp_path), clock=clock)
+    for i in range(3):
+        writer.append(record(i), fetched_at=1000.0 + i)
+    writer.close()
+    (segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".seg")]
+    index = os.path.join(tmp_path, segment[:-4] + ".idx")
+    # An index entry that was only partly written, and one for a record beyond the end of the segment
+    with open(index, "ab") as f:
+        f.write(INDEX_ENTRY.pack(1003.0, os.path.getsize(os.path.join(tmp_path, segment)), 100))
+        f.write(b"\0" * 7)
+    assert 3 == len(list(ArchiveReader(str(tmp_path)).records()))
+
+
+def test_missing_directory(tmp_path):
+    assert [] == list(ArchiveReader(str(tmp_path / "missing")).records())
+
+
+class TestDataSourceArchive(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StandInServer().start()
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.config = load_configuration()
+
+    async def asyncTearDown(self):
+        self.server.stop()
+
+    async def fetch(self, **options):
+        data_source = BuienRadarDataSource(
+            asyncio.Queue(maxsize=1), self.config["stations"], self.config["bits"], url=self.server.url,
+            verify=client_ssl_context(), archive=ArchiveWriter(self.directory), **options
+        )
+        try:
+            await data_source.retrieve()
+            # The feed did not change, so it is not archived again
+            await data_source.retrieve()
+        finally:
+            await data_source.aclose()
+        return [r.data for r in ArchiveReader(self.directory).records()]
+
+    async def test_configured_stations(self):
+        for streaming in (True, False):
+            with self.subTest(streaming=streaming):
+                (data,) = await self.fetch(streaming=streaming)
+                stations = json.loads(data)["actual"]["stationmeasurements"]
+                self.assertEqual(set(self.config["stations"]), {station["stationid"] for station in stations})
+                for name in os.listdir(self.directory):
+                    os.unlink(os.path.join(self.directory, name))
+
+    async def test_whole_feed(self):
+        with open(FEED, "rb") as f:
+            feed = f.read()
+        self.assertEqual([feed], await self.fetch(streaming=True, archive_whole_feed=True))
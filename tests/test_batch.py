@@ -0,0 +1,72 @@
+import os
+import random
+
+import pytest
+
+from tests.test_bitpacking import random_weather_data
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.interpolation import interpolate
+from weathervane.parser import WeathervaneConfigParser
+
+pytest.importorskip("numpy")
+
+import numpy as np
+from weathervane.batch import BatchEncoder
+
+
+@pytest.fixture
+def plan():
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "config.ini"))
+    return BitPackingPlan(cp.parse_bit_packing_section())
+
+
+def without_random(plan, frame):
+    mask = plan.mask_of(["random"])
+    return bytes(b & ~m & 0xFF for b, m in zip(frame, mask))
+
+
+def snapshot(rng):
+    weather_data = random_weather_data(rng)
+    weather_data["error"] = rng.random() < 0.1
+    for key in rng.sample(sorted(weather_data), 2):
+        if key != "error":
+            del weather_data[key]
+    if rng.random() < 0.2:
+        weather_data["windspeed"] = 0
+    return weather_data
+
+
+def test_batch_frames_match_per_frame_path(plan):
+    rng = random.Random(7)
+    old_snapshots = [None if rng.random() < 0.1 else snapshot(rng) for _ in range(500)]
+    new_snapshots = [snapshot(rng) for _ in range(500)]
+    percentages = [rng.choice([0.0, rng.random(), 1.0, 1.5]) for _ in range(500)]
+
+    frames = BatchEncoder(plan).frames(old_snapshots, new_snapshots, percentages)
+
+    assert frames.dtype == np.uint8
+    assert frames.shape == (500, plan.byte_length)
+    for frame, old, new, percentage in zip(frames, old_snapshots, new_snapshots, percentages):
+        expected = plan.encode(interpolate(old, new, percentage))
+        assert without_random(plan, frame.tobytes()) == without_random(plan, expected)
+
+
+def test_single_pair_is_broadcast_over_percentages(plan):
+    old = {"temperature": 10.0, "winddirection": "N", "error": False}
+    new = {"temperature": 20.0, "winddirection": "ZW", "error": False}
+    percentages = np.linspace(0, 1, 151)
+
+    frames = BatchEncoder(plan).frames([old], [new], percentages)
+
+    assert frames.shape == (151, plan.byte_length)
+    for frame, percentage in zip(frames, percentages):
+        expected = plan.encode(interpolate(old, new, percentage))
+        assert without_random(plan, frame.tobytes()) == without_random(plan, expected)
+
+
+def test_tail_bits_are_right_aligned():
+    plan = BitPackingPlan([{"key": "a", "length": "8"}, {"key": "b", "length": "4"}])
+    encoder = BatchEncoder(plan)
+    frames = encoder.encode(encoder.values(encoder.columns([{"a": 0xAB, "b": 0x0C}])))
+    assert frames.tolist() == [[0xAB, 0x0C]]
@@ -0,0 +1,140 @@
+import math
+import os
+import random
+from unittest.mock import patch
+
+import pytest
+
+from weathervane.bitpacking import WIND_DIRECTIONS, BitPackingPlan
+from weathervane.parser import WeathervaneConfigParser
+
+
+def legacy_encode(weather_data, bits, random_value=0):
+    """The string based encoder as it was before the layout was compiled; used as a reference"""
+
+    def value_to_bits(measurement_name, value, step_value, min_value, max_value):
+        if measurement_name == "winddirection":
+            return WIND_DIRECTIONS.get(value, 0)
+        elif measurement_name == "precipitation":
+            return 1 if value and value > 0 else 0
+        value = min(max(value, min_value), max_value)
+        try:
+            value -= min_value
+            value /= float(step_value)
+        except TypeError:
+            return 0
+        return int(value)
+
+    t_data = {}
+    for data_point in bits:
+        measurement_name = data_point["key"]
+        value = weather_data.get(measurement_name, 0)
+        if measurement_name == "random":
+            value = random_value
+        t_data[measurement_name] = value_to_bits(
+            measurement_name,
+            value,
+            float(data_point.get("step", 1)),
+            float(data_point.get("min", 0)),
+            float(data_point.get("max", 255)),
+        )
+        windspeed = t_data.get("windspeed", 0)
+        if windspeed > t_data.get("windgusts", windspeed):
+            t_data["windspeed"] = t_data["windgusts"]
+
+    binary_string = ""
+    for data in bits:
+        binary_string += f"{t_data[data['key']]:0{int(data['length'])}b}"
+    data_length = math.ceil(len(binary_string) / 8)
+    return bytearray([int(binary_string[i * 8:(i * 8) + 8], base=2) for i in range(data_length)])
+
+
+def random_weather_data(rng):
+    return {
+        "winddirection": rng.choice(list(WIND_DIRECTIONS) + ["A", None]),
+        "windspeed": rng.uniform(-5, 70),
+        "windgusts": rng.uniform(-5, 70),
+        "windspeedBft": rng.randint(0, 14),
+        "airpressure": rng.uniform(880, 1170),
+        "temperature": round(rng.uniform(-45, 55), 1),
+        "feeltemperature": round(rng.uniform(-45, 55), 1),
+        "humidity": rng.uniform(0, 110),
+        "data_from_fallback": rng.choice([True, False]),
+        "barometric_trend": rng.choice([1, 2, 4]),
+        "precipitation": rng.choice([0.0, 0.3, None]),
+        "error": rng.choice([True, False]),
+        "rainFallLastHour": rng.uniform(0, 120),
+        "rainFallLast24Hour": rng.uniform(0, 300),
+        "sunpower": rng.uniform(0, 1300),
+    }
+
+
+@pytest.fixture(params=["config-test1.ini", "config-test2.ini"])
+def bits(request):
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "tests", request.param))
+    return cp.parse_bit_packing_section()
+
+
+def test_identical_to_legacy_encoder(bits):
+    plan = BitPackingPlan(bits)
+    rng = random.Random(42)
+    with patch("weathervane.bitpacking.randint", return_value=0xA5):
+        for _ in range(2000):
+            weather_data = random_weather_data(rng)
+            assert plan.encode(weather_data) == legacy_encode(weather_data, bits, random_value=0xA5)
+
+
+def test_tail_bits_are_right_aligned():
+    """With 12 bits, the last 4 bits are placed in the low nibble of the second byte, just like the old encoder"""
+    plan = BitPackingPlan([{"key": "a", "length": "8"}, {"key": "b", "length": "4"}])
+    assert plan.byte_length == 2
+    assert plan.encode({"a": 0xAB, "b": 0x0C}) == bytearray([0xAB, 0x0C])
+
+
+def test_value_too_large_for_field_is_saturated():
+    plan = BitPackingPlan([{"key": "a", "length": "4", "min": "0", "max": "255", "step": "1"}, {"key": "b", "length": "4"}])
+    assert plan.encode({"a": 200, "b": 1}) == bytearray([0xF1])
+
+
+def test_pack_into_reuses_buffer(bits):
+    plan = BitPackingPlan(bits)
+    buffer = bytearray(plan.byte_length)
+    weather_data = random_weather_data(random.Random(1))
+    with patch("weathervane.bitpacking.randint", return_value=0):
+        plan.pack_into(buffer, weather_data)
+        assert buffer == plan.encode(weather_data)
+
+
+def test_decode_restores_quantized_values(bits):
+    plan = BitPackingPlan(bits)
+    weather_data = {"winddirection": "ZW", "windspeed": 10, "windgusts": 15, "airpressure": 1014, "windspeedBft": 5}
+    decoded = plan.decode(plan.encode(weather_data))
+    for key, value in weather_data.items():
+        assert decoded[key] == value
+
+
+def test_decode_tail_byte():
+    plan = BitPackingPlan([{"key": "a", "length": "8"}, {"key": "b", "length": "4", "min": "-1", "step": "0.5"}])
+    assert plan.decode(bytearray([0xAB, 0x0C])) == {"a": 0xAB, "b": 5.0}
+
+
+def test_decode_raw_is_inverse_of_transmittable_data(bits):
+    plan = BitPackingPlan(bits)
+    weather_data = random_weather_data(random.Random(3))
+    with patch("weathervane.bitpacking.randint", return_value=1):
+        assert plan.decode_raw(plan.encode(weather_data)) == plan.transmittable_data(weather_data)
+
+
+def test_decode_rejects_wrong_length(bits):
+    plan = BitPackingPlan(bits)
+    with pytest.raises(ValueError):
+        plan.decode(bytearray(plan.byte_length + 1))
+
+
+def test_mask_of_random_field(bits):
+    plan = BitPackingPlan(bits)
+    mask = plan.mask_of(["random"])
+    decoded = plan.decode_raw(mask)
+    assert decoded["random"] == 0xFF
+    assert all(value == 0 for key, value in decoded.items() if key != "random")
@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+
+import pytest
+
+from tests.helpers import load_configuration
+from tests.standin import StandInServer, client_ssl_context, fresh_feed
+from weathervane.datasources import (
+    DATA_SOURCES,
+    BuienRadarDataSource,
+    CompositeDataSource,
+    TestDataSource,
+    create_data_source,
+)
+from weathervane.parser import InvalidConfigException, normalize_snapshot
+
+
+class FailingDataSource(TestDataSource):
+    async def retrieve(self):
+        await asyncio.sleep(self.delay)
+        raise ConnectionError("Provider unavailable")
+
+
+def test_registry():
+    assert DATA_SOURCES["buienradar"] is BuienRadarDataSource
+    assert DATA_SOURCES["test"] is TestDataSource
+
+
+def test_create_data_source(configuration):
+    assert isinstance(create_data_source(None, configuration), BuienRadarDataSource)
+    assert isinstance(create_data_source(None, dict(configuration, source="test")), TestDataSource)
+    composite = create_data_source(None, dict(configuration, source="buienradar, test"))
+    assert isinstance(composite, CompositeDataSource)
+    assert ["buienradar", "test"] == [provider.name for provider in composite.providers]
+
+
+@pytest.mark.parametrize("source", ["knmi", "rijkswaterstaat", "buienradar,knmi", "weerplaza", ""])
+def test_create_data_source_invalid(configuration, source):
+    with pytest.raises(InvalidConfigException):
+        create_data_source(None, dict(configuration, source=source))
+
+
+def test_normalize_snapshot():
+    wd = normalize_snapshot({"temperature": "12.5", "wind_speed": 4, "humidity": "wet", "extra": "kept"}, "test")
+    assert {"temperature": 12.5, "wind_speed": 4.0, "extra": "kept", "source": "test"} == wd
+
+
+class TestTestDataSource(unittest.IsolatedAsyncioTestCase):
+    async def test_retrieve(self):
+        config = load_configuration()
+        wd = await TestDataSource(None, config["bits"], seed=1).retrieve()
+        self.assertEqual("test", wd["source"])
+        self.assertFalse(wd["error"])
+        self.assertIn("timestamp", wd)
+        # The random field is filled in by the encoder
+        self.assertTrue({field["key"] for field in config["bits"]} - {"random"} <= set(wd))
+
+    async def test_seed(self):
+        bits = load_configuration()["bits"]
+        first = await TestDataSource(None, bits, seed=1).retrieve()
+        second = await TestDataSource(None, bits, seed=1).retrieve()
+        self.assertEqual(first, second)
+
+
+class TestCompositeDataSource(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.config = load_configuration()
+        self.servers = []
+
+    async def asyncTearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def buienradar(self, **server_options):
+        server = StandInServer(body=fresh_feed(), **server_options).start()
+        self.servers.append(server)
+        return BuienRadarDataSource(None, self.config["stations"], self.config["bits"], url=server.url,
+                                    verify=client_ssl_context())
+
+    async def test_fastest_provider_wins(self):
+        fast = self.buienradar()
+        slow = self.buienradar(response_delay=1.0)
+        slow.name = "slow"
+        queue = asyncio.Queue(maxsize=1)
+        composite = CompositeDataSource(queue, [slow, fast])
+        try:
+            await composite.fetch_weather_data()
+        finally:
+            await composite.aclose()
+        wd = queue.get_nowait()
+        self.assertEqual("buienradar", wd["source"])
+        self.assertFalse(wd["error"])
+        self.assertEqual(1, composite.health["buienradar"].wins)
+        self.assertIsNotNone(composite.health["buienradar"].latency)
+        self.assertEqual(1, composite.health["slow"].cancelled)
+        self.assertEqual(0, composite.health["slow"].failures)
+
+    async def test_unavailable_provider_loses(self):
+        unavailable = self.buienradar(status=503)
+        unavailable.name = "unavailable"
+        composite = CompositeDataSource(None, [unavailable, TestDataSource(None, self.config["bits"], delay=0.05)])
+        try:
+            wd = await composite.retrieve()
+        finally:
+            await composite.aclose()
+        self.assertEqual("test", wd["source"])
+        self.assertEqual(1, composite.health["unavailable"].cancelled)
+
+    async def test_failures_lower_the_health(self):
+        failing = FailingDataSource(None, self.config["bits"])
+        failing.name = "failing"
+        composite = CompositeDataSource(None, [failing, TestDataSource(None, self.config["bits"], delay=0.05)])
+        for _ in range(3):
+            wd = await composite.retrieve()
+            self.assertEqual("test", wd["source"])
+        health = composite.health["failing"]
+        self.assertEqual(3, health.failures)
+        self.assertLess(health.health, 0.6)
+        self.assertEqual(1.0, composite.health["test"].health)
+
+    async def test_all_providers_fail(self):
+        failing = FailingDataSource(None, self.config["bits"])
+        composite = CompositeDataSource(None, [failing])
+        with self.assertRaises(ConnectionError):
+            await composite.retrieve()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, AsyncMock, MagicMock, call, Mock
+from unittest.mock import ANY, patch, AsyncMock, MagicMock, Mock
 
 import httpx  # Required for httpx.RequestError
 import pytest
@@ -7,6 +7,13 @@ import pytest
 # Assuming BuienRadarDataSource and HTTP_OK are in weathervane.datasources
 # Adjust the import path if your project structure is different.
 from weathervane.datasources import BuienRadarDataSource, HTTP_OK
+from weathervane.resilience import BACKOFF_BASE
+
+
+def assert_backoff(mock_sleep):
+    """Each retry waits a random time up to a maximum that doubles with every attempt"""
+    for attempt, sleep_call in enumerate(mock_sleep.call_args_list):
+        assert 0 <= sleep_call.args[0] <= BACKOFF_BASE * 2 ** attempt
 
 
 # Patch logger at the module level where BuienRadarDataSource is defined
@@ -27,13 +34,14 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
     @patch('asyncio.sleep', new_callable=AsyncMock)
     @patch('httpx.AsyncClient')  # Remove new_callable=AsyncMock
     async def test_get_weather_success_first_try(self, mock_async_client_class, mock_sleep, mock_logger_class_level):
-        # Set up async context manager
+        # The data source keeps a single long-lived client
         mock_client_instance = AsyncMock()
-        mock_async_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_async_client_class.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_async_client_class.return_value = mock_client_instance
 
         mock_response = Mock()
         mock_response.status_code = HTTP_OK
+        mock_response.headers = {}
+        mock_response.content = b"{}"
         mock_response.elapsed = MagicMock()
         mock_response.elapsed.total_seconds.return_value = 0.1  # 100 ms
 
@@ -49,7 +57,8 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
 
         # Your code returns r.json(), which is a dict, not a string
         self.assertEqual(result, expected_data)
-        mock_client_instance.get.assert_called_once_with("https://data.buienradar.nl/2.0/feed/json", timeout=5)
+        mock_client_instance.get.assert_called_once_with("https://data.buienradar.nl/2.0/feed/json", timeout=5,
+                                                         headers={}, extensions=ANY)
         mock_sleep.assert_not_called()
         mock_logger_class_level.info.assert_any_call("Weather data retrieved in 100 ms on attempt 1")
 
@@ -57,16 +66,17 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
     @patch('httpx.AsyncClient')  # Remove new_callable=AsyncMock
     async def test_get_weather_success_after_retries_req_error(self, mock_async_client_class, mock_sleep,
                                                                mock_logger_class_level):
-        # Set up async context manager
+        # The data source keeps a single long-lived client
         mock_client_instance = AsyncMock()
-        mock_async_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_async_client_class.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_async_client_class.return_value = mock_client_instance
 
         mock_failure_exception = httpx.RequestError("Simulated network error", request=MagicMock())
 
         # Create successful response mock
         mock_successful_response = Mock()
         mock_successful_response.status_code = HTTP_OK
+        mock_successful_response.headers = {}
+        mock_successful_response.content = b"{}"
         mock_successful_response.elapsed = MagicMock()
         mock_successful_response.elapsed.total_seconds.return_value = 0.1
         expected_data = {"success": True}
@@ -83,7 +93,7 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(expected_data, result)
         self.assertEqual(mock_client_instance.get.call_count, 3)
-        mock_sleep.assert_has_calls([call(10), call(10)])
+        assert_backoff(mock_sleep)
         self.assertEqual(mock_sleep.call_count, 2)
 
         # Check log calls
@@ -97,10 +107,9 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
     @patch('httpx.AsyncClient')  # Remove new_callable=AsyncMock
     async def test_get_weather_success_after_retries_status_code(self, mock_async_client_class, mock_sleep,
                                                                  mock_logger_class_level):
-        # Set up async context manager
+        # The data source keeps a single long-lived client
         mock_client_instance = AsyncMock()
-        mock_async_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_async_client_class.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_async_client_class.return_value = mock_client_instance
 
         mock_failure_response = Mock()
         mock_failure_response.status_code = 500
@@ -109,6 +118,8 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
 
         mock_successful_response = Mock()
         mock_successful_response.status_code = HTTP_OK
+        mock_successful_response.headers = {}
+        mock_successful_response.content = b"{}"
         mock_successful_response.elapsed = MagicMock()
         mock_successful_response.elapsed.total_seconds.return_value = 0.1  # 100ms
         # Mock the json() method to return actual dict
@@ -127,7 +138,7 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
         # Your code returns r.json(), which is a dict, not a string
         self.assertEqual(result, expected_data)
         self.assertEqual(mock_client_instance.get.call_count, 3)
-        mock_sleep.assert_has_calls([call(10), call(10)])
+        assert_backoff(mock_sleep)
         self.assertEqual(mock_sleep.call_count, 2)
 
         mock_logger_class_level.warning.assert_any_call(
@@ -140,10 +151,9 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
     @patch('httpx.AsyncClient')  # Remove new_callable=AsyncMock
     async def test_get_weather_failure_all_retries_request_error(self, mock_async_client_class, mock_sleep,
                                                                  mock_logger_class_level):
-        # Create a proper async context manager mock
+        # The data source keeps a single long-lived client
         mock_client_instance = AsyncMock()
-        mock_async_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_async_client_class.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_async_client_class.return_value = mock_client_instance
 
         mock_failure_exception = httpx.RequestError("Simulated persistent network error", request=MagicMock())
         # max_retries = 3, so 4 attempts total
@@ -156,7 +166,7 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(mock_client_instance.get.call_count, 4)
         self.assertEqual(mock_sleep.call_count, 3)  # Sleeps between 4 attempts
-        mock_sleep.assert_has_calls([call(10)] * 3)
+        assert_backoff(mock_sleep)
         mock_logger_class_level.error.assert_any_call("All 4 attempts to connect to Buienradar failed.")
         # Check that specific warnings for each attempt were logged
         for i in range(1, 5):  # Attempts 1 through 4
@@ -167,9 +177,9 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
     @patch('httpx.AsyncClient')  # Remove new_callable=AsyncMock
     async def test_get_weather_failure_all_retries_status_code(self, mock_async_client_class, mock_sleep,
                                                                mock_logger_class_level):
+        # The data source keeps a single long-lived client
         mock_client_instance = AsyncMock()
-        mock_async_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_async_client_class.return_value.__aexit__ = AsyncMock(return_value=None)
+        mock_async_client_class.return_value = mock_client_instance
 
         mock_failure_response = AsyncMock()
         mock_failure_response.status_code = 503
@@ -187,8 +197,55 @@ class TestBuienRadarDataSourceResilience(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(str(cm.value), "Buienradar: 503")  # Use cm.value, not cm.exception
         self.assertEqual(mock_client_instance.get.call_count, 4)
         self.assertEqual(mock_sleep.call_count, 3)
-        mock_sleep.assert_has_calls([call(10)] * 3)
+        assert_backoff(mock_sleep)
         mock_logger_class_level.error.assert_any_call("All 4 attempts to connect to Buienradar failed.")
         for i in range(1, 5):
             mock_logger_class_level.warning.assert_any_call(
-                f"Attempt {i}/4: Got response in 50 ms, but unexpected status code 503")
\ No newline at end of file
+                f"Attempt {i}/4: Got response in 50 ms, but unexpected status code 503")
+
+    @patch('asyncio.sleep', new_callable=AsyncMock)
+    @patch('httpx.AsyncClient')
+    async def test_get_weather_rebuilds_client_after_connection_error(self, mock_async_client_class, mock_sleep,
+                                                                      mock_logger_class_level):
+        broken_client = AsyncMock()
+        broken_client.get.side_effect = httpx.ConnectError("Simulated connection reset", request=MagicMock())
+        working_client = AsyncMock()
+        mock_successful_response = Mock()
+        mock_successful_response.status_code = HTTP_OK
+        mock_successful_response.headers = {}
+        mock_successful_response.content = b"{}"
+        mock_successful_response.elapsed.total_seconds.return_value = 0.1
+        mock_successful_response.json.return_value = {"success": True}
+        working_client.get.return_value = mock_successful_response
+        mock_async_client_class.side_effect = [broken_client, working_client]
+
+        data_source = BuienRadarDataSource(queue=None, stations=[], bits=[])
+        result = await data_source._BuienRadarDataSource__get_weather()
+
+        self.assertEqual({"success": True}, result)
+        broken_client.aclose.assert_awaited_once()
+        self.assertIs(working_client, data_source.client)
+        self.assertEqual(2, data_source.clients_created)
+
+    @patch('asyncio.sleep', new_callable=AsyncMock)
+    @patch('httpx.AsyncClient')
+    async def test_get_weather_keeps_client_after_status_code(self, mock_async_client_class, mock_sleep,
+                                                              mock_logger_class_level):
+        mock_client_instance = AsyncMock()
+        mock_async_client_class.return_value = mock_client_instance
+        mock_failure_response = Mock()
+        mock_failure_response.status_code = 503
+        mock_failure_response.elapsed.total_seconds.return_value = 0.05
+        mock_successful_response = Mock()
+        mock_successful_response.status_code = HTTP_OK
+        mock_successful_response.headers = {}
+        mock_successful_response.content = b"{}"
+        mock_successful_response.elapsed.total_seconds.return_value = 0.1
+        mock_successful_response.json.return_value = {"success": True}
+        mock_client_instance.get.side_effect = [mock_failure_response, mock_successful_response]
+
+        data_source = BuienRadarDataSource(queue=None, stations=[], bits=[])
+        await data_source._BuienRadarDataSource__get_weather()
+
+        mock_client_instance.aclose.assert_not_awaited()
+        self.assertEqual(1, data_source.clients_created)
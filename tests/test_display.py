@@ -1,6 +1,8 @@
+from datetime import datetime
+
 import pytest
 
-from weathervane.weathervaneinterface import Display
+from weathervane.weathervaneinterface import TRANSITION_MARGIN, Display
 
 
 class TestConvertToMinutes:
@@ -80,3 +82,29 @@ class TestIsActiveOvernight:
 
     def test_inactive_midday(self, display):
         assert display.is_active(420) is False  # 7:00
+
+
+class TestSecondsUntilNextTransition:
+    @pytest.fixture
+    def display(self):
+        d = Display.__new__(Display)
+        d.auto_disable_display = True
+        d.start_at_minutes = Display.convert_to_minutes("6:30")
+        d.end_at_minutes = Display.convert_to_minutes("22:00")
+        return d
+
+    def test_until_start(self, display):
+        now = datetime(2024, 1, 1, 6, 29, 30)
+        assert display.seconds_until_next_transition(now) == 30 + TRANSITION_MARGIN
+
+    def test_until_one_minute_after_end(self, display):
+        now = datetime(2024, 1, 1, 22, 0, 0)
+        assert display.seconds_until_next_transition(now) == 60 + TRANSITION_MARGIN
+
+    def test_until_start_on_the_next_day(self, display):
+        now = datetime(2024, 1, 1, 23, 30, 0)
+        assert display.seconds_until_next_transition(now) == 7 * 60 * 60 + TRANSITION_MARGIN
+
+    def test_never_without_auto_turn_off(self, display):
+        display.auto_disable_display = False
+        assert display.seconds_until_next_transition(datetime(2024, 1, 1, 12, 0)) is None
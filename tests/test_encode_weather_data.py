@@ -89,6 +89,14 @@ class TestEncodeWeatherData(unittest.TestCase):
         result_warm = self.interface.encode_weather_data(warm)
         assert result_cold != result_warm
 
+    def test_encode_frame_reuses_the_buffer(self, mock_class):
+        base = {"winddirection": "N", "windspeed": 0, "windgusts": 0, "airpressure": 900, "temperature": -39.9}
+        warm = dict(base, temperature=30.0)
+        frame = self.interface.encode_frame(base)
+        self.assertEqual(self.interface.encode_weather_data(base), frame)
+        self.assertIs(frame, self.interface.encode_frame(warm))
+        self.assertEqual(self.interface.encode_weather_data(warm), frame)
+
 
 if __name__ == "__main__":
     unittest.main()
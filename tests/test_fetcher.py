@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+
+from weathervane.fetcher import FetchCoordinator, PhaseTimings
+
+FALLBACK = {"error": True}
+
+
+class FakeDataSource(object):
+    paced = False
+
+    def __init__(self, delay=0.0, exception=None):
+        self.queue = asyncio.Queue(maxsize=1)
+        self.delay = delay
+        self.exception = exception
+        self.fetches = 0
+        self.cancelled = False
+
+    async def fetch_weather_data(self):
+        self.fetches += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.exception:
+            raise self.exception
+        await self.queue.put({"error": False, "fetch": self.fetches})
+
+
+class TestFetchCoordinator(unittest.IsolatedAsyncioTestCase):
+    async def test_fetch(self):
+        data_source = FakeDataSource()
+        coordinator = FetchCoordinator(data_source, 1, FALLBACK)
+        await coordinator.fetch()
+        self.assertEqual({"error": False, "fetch": 1}, data_source.queue.get_nowait())
+        self.assertEqual(1, coordinator.completed)
+        self.assertFalse(coordinator.in_flight)
+
+    async def test_single_flight(self):
+        data_source = FakeDataSource(delay=0.05)
+        coordinator = FetchCoordinator(data_source, 1, FALLBACK)
+        task = coordinator.start()
+        self.assertIsNone(coordinator.start())
+        await task
+        self.assertEqual(1, data_source.fetches)
+        self.assertEqual(1, coordinator.skipped)
+
+    async def test_fetch_joins_the_fetch_in_flight(self):
+        data_source = FakeDataSource(delay=0.02)
+        coordinator = FetchCoordinator(data_source, 1, FALLBACK)
+        coordinator.start()
+        await coordinator.fetch()
+        self.assertEqual(1, data_source.fetches)
+        self.assertEqual(0, coordinator.skipped)
+
+    async def test_deadline(self):
+        data_source = FakeDataSource(delay=1)
+        coordinator = FetchCoordinator(data_source, 0.01, FALLBACK)
+        await coordinator.fetch()
+        self.assertTrue(data_source.cancelled)
+        self.assertEqual(1, coordinator.timed_out)
+        self.assertIs(FALLBACK, data_source.queue.get_nowait())
+
+    async def test_unexpected_error_publishes_fallback_data(self):
+        data_source = FakeDataSource(exception=RuntimeError("broken"))
+        coordinator = FetchCoordinator(data_source, 1, FALLBACK)
+        await coordinator.fetch()
+        self.assertEqual(1, coordinator.failed)
+        self.assertIs(FALLBACK, data_source.queue.get_nowait())
+
+    async def test_aclose_cancels_the_fetch_in_flight(self):
+        data_source = FakeDataSource(delay=1)
+        coordinator = FetchCoordinator(data_source, 10, FALLBACK)
+        coordinator.start()
+        await asyncio.sleep(0)
+        await coordinator.aclose()
+        self.assertTrue(data_source.cancelled)
+        self.assertFalse(coordinator.in_flight)
+        self.assertTrue(data_source.queue.empty())
+
+
+class TestPhaseTimings(unittest.IsolatedAsyncioTestCase):
+    async def test_trace(self):
+        timings = PhaseTimings()
+        for name in ("connection.connect_tcp", "connection.start_tls", "http11.receive_response_body"):
+            await timings.trace(f"{name}.started", {})
+            await timings.trace(f"{name}.complete", {})
+        await timings.trace("http11.response_closed.started", {})
+        self.assertEqual(["connect", "tls", "body"], list(timings.phases))
+
+    async def test_phases_of_failed_attempts_are_summed(self):
+        timings = PhaseTimings()
+        await timings.trace("connection.connect_tcp.started", {})
+        await timings.trace("connection.connect_tcp.failed", {})
+        first = timings.phases["connect"]
+        await timings.trace("connection.connect_tcp.started", {})
+        await timings.trace("connection.connect_tcp.complete", {})
+        self.assertGreater(timings.phases["connect"], first)
+
+    def test_measure(self):
+        timings = PhaseTimings()
+        with timings.measure("parse"):
+            pass
+        self.assertIn("parse", timings.phases)
+        self.assertRegex(str(timings), r"^parse \d+ ms$")
@@ -0,0 +1,45 @@
+from weathervane.interpolation import FrameTable
+
+
+def encode(weather_data):
+    return bytes([int(weather_data["temperature"])])
+
+
+class TestFrameTable:
+    def test_ramp_from_old_to_new(self):
+        old = {"temperature": 10.0, "error": False}
+        new = {"temperature": 20.0, "error": False}
+        table = FrameTable.build(old, new, encode, anchor=100.0, duration=10, interval=2)
+        assert [frame[0] for frame in table.frames] == [10, 12, 14, 16, 18, 20]
+
+    def test_frame_at_follows_the_anchor(self):
+        old = {"temperature": 10.0, "error": False}
+        new = {"temperature": 20.0, "error": False}
+        table = FrameTable.build(old, new, encode, anchor=100.0, duration=10, interval=2)
+        assert table.frame_at(100.0) == bytes([10])
+        assert table.frame_at(103.9) == bytes([12])
+        assert table.frame_at(105.0) == bytes([14])
+
+    def test_frame_at_is_clamped(self):
+        old = {"temperature": 10.0, "error": False}
+        new = {"temperature": 20.0, "error": False}
+        table = FrameTable.build(old, new, encode, anchor=100.0, duration=10, interval=2)
+        assert table.frame_at(50.0) == bytes([10])
+        assert table.frame_at(1000.0) == bytes([20])
+
+    def test_single_frame_without_old_data(self):
+        new = {"temperature": 20.0, "error": False}
+        table = FrameTable.build(None, new, encode, anchor=0.0, duration=300, interval=2)
+        assert table.frames == [bytes([20])]
+
+    def test_single_frame_on_error(self):
+        old = {"temperature": 10.0, "error": False}
+        new = {"temperature": 20.0, "error": True}
+        table = FrameTable.build(old, new, encode, anchor=0.0, duration=300, interval=2)
+        assert table.frames == [bytes([20])]
+
+    def test_amount_of_frames_covers_the_collection_interval(self):
+        old = {"temperature": 10.0, "error": False}
+        new = {"temperature": 20.0, "error": False}
+        table = FrameTable.build(old, new, encode, anchor=0.0, duration=300, interval=2)
+        assert len(table) == 151
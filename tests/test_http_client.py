@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+
+from tests.helpers import load_configuration
+from tests.standin import StandInServer, client_ssl_context
+from weathervane.datasources import DEFAULT_WEATHER_DATA, BuienRadarDataSource
+
+
+class TestPersistentClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StandInServer().start()
+        config = load_configuration()
+        self.queue = asyncio.Queue(maxsize=1)
+        self.data_source = BuienRadarDataSource(
+            self.queue, config["stations"], config["bits"], url=self.server.url, verify=client_ssl_context()
+        )
+
+    async def asyncTearDown(self):
+        await self.data_source.aclose()
+        self.server.stop()
+
+    async def test_fetches_reuse_the_connection(self):
+        for _ in range(3):
+            await self.data_source.fetch_weather_data()
+            self.assertIsNot(DEFAULT_WEATHER_DATA, self.queue.get_nowait())
+        self.assertEqual(3, self.server.requests)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(1, self.data_source.clients_created)
+
+    async def test_timings_of_a_new_connection(self):
+        await self.data_source.fetch_weather_data()
+        self.assertTrue({"connect", "tls", "body", "parse"} <= set(self.data_source.timings.phases))
+
+    async def test_aclose(self):
+        await self.data_source.fetch_weather_data()
+        client = self.data_source.client
+        await self.data_source.aclose()
+        self.assertTrue(client.is_closed)
+        self.assertIsNone(self.data_source.client)
+
+
+class TestConditionalGet(unittest.IsolatedAsyncioTestCase):
+    async def fetch_twice(self, server):
+        config = load_configuration()
+        queue = asyncio.Queue(maxsize=1)
+        data_source = BuienRadarDataSource(
+            queue, config["stations"], config["bits"], url=server.url, verify=client_ssl_context()
+        )
+        parse = data_source.bp.parse
+        data_source.bp.parse = Mock(side_effect=parse)
+        try:
+            await data_source.fetch_weather_data()
+            first = queue.get_nowait()
+            await data_source.fetch_weather_data()
+            second = queue.get_nowait()
+        finally:
+            await data_source.aclose()
+        return data_source, first, second
+
+    async def test_not_modified(self):
+        with StandInServer() as server:
+            data_source, first, second = await self.fetch_twice(server)
+        self.assertEqual(1, server.not_modified)
+        self.assertEqual(1, data_source.bp.parse.call_count)
+        self.assertEqual((1, 1), (data_source.cache_hits, data_source.cache_misses))
+        self.assertEqual(first, second)
+
+    async def test_same_content_without_validators(self):
+        with StandInServer(validators=False) as server:
+            data_source, first, second = await self.fetch_twice(server)
+        self.assertEqual(0, server.not_modified)
+        self.assertEqual(1, data_source.bp.parse.call_count)
+        self.assertEqual((1, 1), (data_source.cache_hits, data_source.cache_misses))
+        self.assertEqual(first, second)
+
+    async def test_changed_content(self):
+        config = load_configuration()
+        queue = asyncio.Queue(maxsize=1)
+        with StandInServer() as server:
+            data_source = BuienRadarDataSource(
+                queue, config["stations"], config["bits"], url=server.url, verify=client_ssl_context()
+            )
+            await data_source.fetch_weather_data()
+            queue.get_nowait()
+            server.body = server.body.replace(b'"temperature": ', b'"temperature": 1')
+            await data_source.fetch_weather_data()
+            await data_source.aclose()
+        self.assertEqual(0, server.not_modified)
+        self.assertEqual((0, 2), (data_source.cache_hits, data_source.cache_misses))
+
+    def test_cached_weather_data_becomes_stale(self):
+        data_source = BuienRadarDataSource(None, [], [])
+        data_source.last_weather_data = {"error": False, "timestamp": datetime.now().isoformat()}
+        self.assertFalse(data_source._cached_weather_data()["error"])
+        data_source.last_weather_data = {"error": False, "timestamp": "2021-06-19T13:40:00"}
+        self.assertTrue(data_source._cached_weather_data()["error"])
+        self.assertFalse(data_source.last_weather_data["error"])
+
+
+class TestStreaming(unittest.IsolatedAsyncioTestCase):
+    async def fetch(self, streaming):
+        config = load_configuration()
+        queue = asyncio.Queue(maxsize=1)
+        with StandInServer() as server:
+            data_source = BuienRadarDataSource(
+                queue, config["stations"], config["bits"], url=server.url, verify=client_ssl_context(),
+                streaming=streaming,
+            )
+            await data_source.fetch_weather_data()
+            await data_source.aclose()
+        return data_source, queue.get_nowait()
+
+    async def test_same_weather_data_as_decoding_the_whole_feed(self):
+        _, expected = await self.fetch(streaming=False)
+        data_source, observed = await self.fetch(streaming=True)
+        self.assertEqual(expected, observed)
+        self.assertIn("extract", data_source.timings.phases)
@@ -0,0 +1,131 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.idw import InverseDistanceInterpolator
+from weathervane.parser import BuienradarParser
+from weathervane.spatial import distance_km
+
+# Shortly after the measurements in the feed, so they are not stale
+NOW = datetime(2021, 6, 19, 13, 45)
+
+
+def station(stationid, lat, lon, **measurements):
+    return {"stationid": stationid, "lat": lat, "lon": lon, "timestamp": "2021-06-19T13:40:00", **measurements}
+
+
+@pytest.fixture
+def feed():
+    with open(os.path.join(os.getcwd(), "tests", "buienradar.json"), "r", encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def test_at_a_station_its_measurements_are_used():
+    measurements = {
+        1: station(1, 52.0, 5.0, temperature=10.0, airpressure=1010.0),
+        2: station(2, 52.5, 5.0, temperature=20.0, airpressure=1020.0),
+    }
+    weather_data = InverseDistanceInterpolator(52.0, 5.0, 2).interpolate(measurements)
+    assert weather_data["temperature"] == 10.0
+    assert weather_data["airpressure"] == 1010.0
+
+
+def test_halfway_between_two_stations_is_their_mean():
+    measurements = {
+        1: station(1, 52.0, 5.0, temperature=10.0, windspeedBft=2),
+        2: station(2, 52.0, 6.0, temperature=20.0, windspeedBft=5),
+        # Farther than the two nearest, so it is left out
+        3: station(3, 53.0, 5.5, temperature=100.0, windspeedBft=12),
+    }
+    weather_data = InverseDistanceInterpolator(52.0, 5.5, 2).interpolate(measurements)
+    assert weather_data["temperature"] == pytest.approx(15.0)
+    assert weather_data["windspeedBft"] == 4
+    assert (weather_data["lat"], weather_data["lon"]) == (52.0, 5.5)
+
+
+def test_missing_fields_are_interpolated_from_the_other_stations():
+    measurements = {
+        1: station(1, 52.0, 5.0, temperature=10.0, airpressure=None),
+        2: station(2, 52.0, 5.2, temperature=20.0, airpressure=1020.0),
+        3: station(3, 52.0, 5.4, temperature=30.0),
+    }
+    weather_data = InverseDistanceInterpolator(52.0, 5.1, 3).interpolate(measurements)
+    assert weather_data["airpressure"] == pytest.approx(1020.0)
+    assert "sunpower" not in weather_data
+
+
+def test_wind_direction_is_a_circular_mean():
+    measurements = {
+        1: station(1, 52.0, 5.0, winddirection="N", winddirectiondegrees=10),
+        2: station(2, 52.0, 5.2, winddirection="NNW", winddirectiondegrees=None),
+    }
+    weather_data = InverseDistanceInterpolator(52.0, 5.1, 2).interpolate(measurements)
+    # The mean of 10 and 337.5 degrees, not of the numbers
+    assert weather_data["winddirectiondegrees"] == pytest.approx(353.75, abs=0.01)
+    assert weather_data["winddirection"] == "N"
+
+
+def test_weights_are_computed_once_per_set_of_stations():
+    measurements = {stationid: station(stationid, 52.0, 5.0 + stationid / 10, temperature=stationid)
+                    for stationid in range(1, 7)}
+    interpolator = InverseDistanceInterpolator(52.0, 5.0, 2)
+    for temperature in range(3):
+        measurements[1]["temperature"] = temperature
+        interpolator.interpolate(measurements)
+    assert interpolator.weights_computed == 1
+    assert interpolator.stations == (1, 2)
+
+    del measurements[1]
+    interpolator.interpolate(measurements)
+    assert interpolator.weights_computed == 2
+    assert interpolator.stations == (2, 3)
+
+
+def test_a_station_that_misses_a_streamed_feed_is_used_again():
+    stations = {stationid: station(stationid, 52.0 + (stationid + 1) / 100, 5.0, temperature=stationid)
+                for stationid in range(20)}
+    interpolator = InverseDistanceInterpolator(52.0, 5.0, 4)
+
+    def streamed(missing=None):
+        # Streaming only keeps the candidates of the interpolator
+        return {stationid: measurements for stationid, measurements in stations.items()
+                if stationid != missing and interpolator.is_candidate(measurements)}
+
+    interpolator.interpolate(streamed())
+    for missing in (0, 1, 2):
+        interpolator.interpolate(streamed(missing))
+        assert missing not in interpolator.stations
+    interpolator.interpolate(streamed())
+    assert interpolator.stations == (0, 1, 2, 3)
+
+
+def test_no_stations_with_a_location():
+    with pytest.raises(ValueError):
+        InverseDistanceInterpolator(52.0, 5.0, 2).interpolate({1: {"stationid": 1, "lat": None, "lon": None}})
+
+
+def test_parse_at_a_location(feed):
+    bits = [
+        {"key": "error", "length": "1"},
+        {"key": "winddirection", "length": "4"},
+        {"key": "temperature", "length": "10", "min": "-39.9", "max": "60", "step": "0.1"},
+        {"key": "airpressure", "length": "8", "min": "900", "max": "1155", "step": "1"},
+        {"key": "barometric_trend", "length": "2"},
+    ]
+    # Between De Bilt and Arnhem
+    bp = BuienradarParser(stations=[6260, 6275], bits=bits, interpolate_at=(52.085, 5.53), neighbours=4)
+    weather_data = bp.parse(feed, now=NOW)
+    assert not weather_data["error"]
+    assert 17.4 < weather_data["temperature"] < 20.2
+    assert weather_data["stationid"] in bp.interpolator.stations
+    assert distance_km(52.085, 5.53, weather_data["lat"], weather_data["lon"]) == 0
+
+    frame = BitPackingPlan(bits).encode(weather_data)
+    assert len(frame) == 4
+    assert not any(bp.is_nearby(station) for station in feed["actual"]["stationmeasurements"]
+                   if station["stationid"] not in bp.interpolator.candidates)
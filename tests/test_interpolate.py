@@ -57,3 +57,10 @@ class TestInterpolate:
         new = {"stationname": "Schiphol", "error": False}
         result = WeatherVane.interpolate(old, new, 0.5)
         assert result["stationname"] == "Schiphol"
+
+    def test_cleared_error_is_not_kept(self):
+        old = {"temperature": 1.0, "error": True}
+        new = {"temperature": 2.0, "error": False}
+        for percentage in (0.0, 0.5, 1.0):
+            result = WeatherVane.interpolate(old, new, percentage)
+            assert result["error"] is False
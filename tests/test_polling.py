@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from weathervane.datasources import DEFAULT_WEATHER_DATA, TestDataSource
+from weathervane.polling import DEFAULT_INTERVAL, MIN_INTERVAL, OVERDUE_INTERVAL, PollingPolicy
+
+START = datetime(2025, 6, 1, 12, 0)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def weather_data(timestamp: datetime) -> dict:
+    return {"error": False, "timestamp": timestamp.isoformat()}
+
+
+class TestPollingPolicy(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = PollingPolicy(default_interval=300, margin=15, clock=self.clock)
+
+    def publish_every_10_minutes(self, updates, publication_delay=420):
+        """Observe measurements that are published some minutes after their timestamp"""
+        for i in range(updates):
+            timestamp = START + timedelta(minutes=10 * i)
+            self.clock.now = timestamp + timedelta(seconds=publication_delay)
+            self.assertTrue(self.policy.observe(weather_data(timestamp)))
+
+    def test_default_interval_until_the_cadence_is_known(self):
+        self.assertEqual(DEFAULT_INTERVAL, PollingPolicy().next_delay())
+        self.publish_every_10_minutes(1)
+        self.assertEqual(300, self.policy.next_delay())
+
+    def test_learns_the_cadence(self):
+        self.publish_every_10_minutes(3)
+        self.assertEqual(600, self.policy.cadence)
+        self.assertEqual(420, self.policy.publication_delay)
+        # Measurements of 12:20 were seen at 12:27, so those of 12:30 are expected at 12:37
+        self.assertEqual(START + timedelta(minutes=37), self.policy.expected_update())
+        self.assertEqual(600 + 15, self.policy.next_delay())
+
+    def test_same_measurements(self):
+        self.publish_every_10_minutes(2)
+        self.clock.advance(60)
+        self.assertFalse(self.policy.observe(weather_data(START + timedelta(minutes=10))))
+        self.assertFalse(self.policy.observe(DEFAULT_WEATHER_DATA))
+        self.assertEqual(600 - 60 + 15, self.policy.next_delay())
+        self.assertEqual(4, self.policy.polls)
+        self.assertEqual(2, self.policy.updates)
+
+    def test_minimum_interval(self):
+        self.publish_every_10_minutes(2)
+        self.clock.advance(600)
+        self.assertEqual(MIN_INTERVAL, self.policy.next_delay())
+
+    def test_overdue(self):
+        self.publish_every_10_minutes(2)
+        self.clock.advance(620)
+        self.assertEqual(OVERDUE_INTERVAL, self.policy.next_delay())
+        # Give up polling faster when the update is a whole cadence late
+        self.clock.advance(600)
+        self.assertEqual(300, self.policy.next_delay())
+
+    def test_missed_update(self):
+        self.publish_every_10_minutes(3)
+        timestamp = START + timedelta(minutes=40)
+        self.clock.now = timestamp + timedelta(seconds=420)
+        self.policy.observe(weather_data(timestamp))
+        # The median ignores the single interval of 20 minutes
+        self.assertEqual(600, self.policy.cadence)
+
+    def test_publication_delay_is_the_earliest(self):
+        self.publish_every_10_minutes(2, publication_delay=500)
+        self.clock.now = START + timedelta(minutes=20, seconds=400)
+        self.policy.observe(weather_data(START + timedelta(minutes=20)))
+        self.assertEqual(400, self.policy.publication_delay)
+
+    def test_not_adaptive(self):
+        self.policy.adaptive = False
+        self.publish_every_10_minutes(3)
+        self.assertEqual(300, self.policy.next_delay())
+
+    def test_from_configuration(self):
+        policy = PollingPolicy.from_configuration({"data_collection_interval": 120, "adaptive_polling": False})
+        self.assertEqual(120, policy.default_interval)
+        self.assertFalse(policy.adaptive)
+
+
+class TestDataSourcePolling(unittest.IsolatedAsyncioTestCase):
+    async def test_published_weather_data_is_observed(self):
+        queue = asyncio.Queue(maxsize=1)
+        data_source = TestDataSource(queue, [], polling=PollingPolicy(default_interval=120))
+        await data_source.fetch_weather_data()
+        self.assertEqual(1, data_source.polling.updates)
+        self.assertEqual(120, data_source.polling.next_delay())
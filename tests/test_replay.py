@@ -0,0 +1,119 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.helpers import load_configuration
+from tests.standin import FEED
+from weathervane.archive import ArchiveWriter
+from weathervane.datasources import DEFAULT_WEATHER_DATA, ReplayDataSource, create_data_source
+from weathervane.fetcher import FetchCoordinator
+from weathervane.parser import InvalidConfigException
+from weathervane.replay import replay
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+START = datetime(2025, 6, 1, 12, 0)
+PUBLICATION_DELAY = timedelta(minutes=7)
+
+
+def record_feeds(directory, amount):
+    """Archive the recorded feed, as if it was fetched every 10 minutes"""
+    with open(FEED, "rb") as f:
+        feed = json.load(f)
+    writer = ArchiveWriter(directory)
+    for i in range(amount):
+        timestamp = START + timedelta(minutes=10 * i)
+        for station in feed["actual"]["stationmeasurements"]:
+            station["timestamp"] = timestamp.isoformat()
+            station["temperature"] = 10.0 + i
+        writer.append(json.dumps(feed).encode(), fetched_at=(timestamp + PUBLICATION_DELAY).timestamp())
+    writer.close()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    record_feeds(str(tmp_path), 3)
+    return str(tmp_path)
+
+
+def test_registry(configuration, archive):
+    data_source = create_data_source(None, dict(configuration, source="replay", archive_dir=archive, replay_speedup=60))
+    assert isinstance(data_source, ReplayDataSource)
+    assert 60 == data_source.speedup
+
+
+def test_requires_an_archive(configuration):
+    with pytest.raises(InvalidConfigException):
+        create_data_source(None, dict(configuration, source="replay", archive_dir=""))
+
+
+class TestReplayDataSource(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        record_feeds(self.directory, 3)
+        self.config = load_configuration()
+
+    def data_source(self, **options):
+        return ReplayDataSource(asyncio.Queue(maxsize=1), self.config["stations"], self.config["bits"],
+                                self.directory, **options)
+
+    async def test_retrieve(self):
+        data_source = self.data_source(speedup=0)
+        for i in range(3):
+            wd = await data_source.retrieve()
+            self.assertEqual(10.0 + i, wd["temperature"])
+            # Judged by the time it was fetched, the data is fresh
+            self.assertFalse(wd["error"])
+            self.assertEqual("replay", wd["source"])
+        with self.assertRaises(EOFError):
+            await data_source.retrieve()
+        self.assertEqual(3, data_source.replayed)
+        self.assertTrue({"read", "decode", "parse"} <= set(data_source.timings.phases))
+
+    async def test_time_range(self):
+        start = (START + timedelta(minutes=10) + PUBLICATION_DELAY).timestamp()
+        data_source = self.data_source(speedup=0, start=start)
+        self.assertEqual(11.0, (await data_source.retrieve())["temperature"])
+
+    async def test_repeat(self):
+        data_source = self.data_source(speedup=0, repeat=True)
+        temperatures = [(await data_source.retrieve())["temperature"] for _ in range(4)]
+        self.assertEqual([10.0, 11.0, 12.0, 10.0], temperatures)
+
+    async def test_speedup(self):
+        # 10 minutes between the feeds, replayed 6000 times faster: 0.1 s
+        data_source = self.data_source(speedup=6000)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await data_source.retrieve()
+        self.assertGreaterEqual(loop.time() - start, 0.19)
+
+    async def test_fetches_are_not_held_to_the_deadline(self):
+        # 10 minutes between the feeds, replayed 6000 times faster: 0.1 s, longer than the deadline of a fetch
+        data_source = self.data_source(speedup=6000)
+        coordinator = FetchCoordinator(data_source, 0.05, DEFAULT_WEATHER_DATA)
+        temperatures = []
+        for _ in range(3):
+            await coordinator.fetch()
+            temperatures.append(data_source.queue.get_nowait()["temperature"])
+        self.assertEqual([10.0, 11.0, 12.0], temperatures)
+        self.assertEqual(0, coordinator.timed_out)
+
+    async def test_fetch_weather_data(self):
+        data_source = self.data_source(speedup=0)
+        await data_source.fetch_weather_data()
+        self.assertEqual(10.0, data_source.queue.get_nowait()["temperature"])
+
+    async def test_replay_pipeline(self):
+        interface = WeatherVaneInterface(**dict(self.config, test=True))
+        report = await replay(self.data_source(speedup=0), interface.encode_weather_data, 2.0)
+        self.assertEqual(3, report.snapshots)
+        # The first snapshot is shown at once, the others in transitions of 10 minutes
+        self.assertEqual(1 + 2 * 300, report.frames)
+        self.assertGreater(report.frames_per_second, 0)
+        self.assertTrue({"read", "decode", "parse", "interpolate", "encode"} <= set(report.timings.phases))
+        self.assertIn("vanes", str(report))
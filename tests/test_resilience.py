@@ -0,0 +1,180 @@
+import asyncio
+import random
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from tests.helpers import load_configuration
+from tests.standin import StandInServer, client_ssl_context, fresh_feed
+from weathervane.datasources import BuienRadarDataSource
+from weathervane.resilience import (
+    DEFAULT_TIMEOUT,
+    MAX_TIMEOUT,
+    MIN_TIMEOUT,
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    backoff_delay,
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_defaults_without_samples(self):
+        tracker = LatencyTracker()
+        tracker.add(0.1)
+        self.assertIsNone(tracker.hedge_delay())
+        self.assertEqual(DEFAULT_TIMEOUT, tracker.timeout())
+
+    def test_percentiles(self):
+        tracker = LatencyTracker()
+        for i in range(1, 101):
+            tracker.add(i / 1000)
+        self.assertAlmostEqual(0.096, tracker.hedge_delay())
+        self.assertEqual(MIN_TIMEOUT, tracker.timeout())
+
+    def test_timeout_follows_the_latency(self):
+        tracker = LatencyTracker()
+        for _ in range(10):
+            tracker.add(0.8)
+        self.assertAlmostEqual(3.2, tracker.timeout())
+        for _ in range(10):
+            tracker.add(30)
+        self.assertEqual(MAX_TIMEOUT, tracker.timeout())
+
+    def test_window(self):
+        tracker = LatencyTracker(window=10)
+        for _ in range(10):
+            tracker.add(5.0)
+        for _ in range(10):
+            tracker.add(0.1)
+        self.assertEqual(0.1, tracker.hedge_delay())
+
+    def test_hedge_delay_when_many_requests_stall(self):
+        tracker = LatencyTracker()
+        for _ in range(40):
+            tracker.add(0.1)
+        for _ in range(60):
+            tracker.add(1.0)
+        self.assertAlmostEqual(0.4, tracker.hedge_delay())
+
+
+class TestBackoff(unittest.TestCase):
+    def test_bounds(self):
+        rng = random.Random(1)
+        for attempt in range(10):
+            for _ in range(100):
+                self.assertTrue(0 <= backoff_delay(attempt, rng, base=1, cap=20) <= min(20, 2 ** attempt))
+
+    def test_jitter(self):
+        rng = random.Random(1)
+        self.assertGreater(len({backoff_delay(3, rng) for _ in range(10)}), 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=self.clock)
+
+    def test_opens_after_failures_in_a_row(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(1, self.breaker.times_opened)
+
+    def test_half_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 59
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow())
+        # A single trial at a time
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.clock.now = 120
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+
+
+class TestHedgedRequests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StandInServer(body=fresh_feed(), stalled_requests=[1], loss_delay=1.0).start()
+        config = load_configuration()
+        self.data_source = BuienRadarDataSource(
+            asyncio.Queue(maxsize=1), config["stations"], config["bits"], url=self.server.url,
+            verify=client_ssl_context()
+        )
+        for _ in range(10):
+            self.data_source.latency.add(0.05)
+
+    async def asyncTearDown(self):
+        await self.data_source.aclose()
+        self.server.stop()
+
+    async def test_hedged_request_wins(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        wd = await self.data_source.retrieve()
+        self.assertLess(loop.time() - start, 0.5)
+        self.assertFalse(wd["error"])
+        self.assertEqual(1, self.data_source.hedges)
+        self.assertEqual(1, self.data_source.hedges_won)
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual(1, self.server.stalled)
+
+    async def test_without_hedging(self):
+        self.data_source.hedging = False
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await self.data_source.retrieve()
+        self.assertGreaterEqual(loop.time() - start, 1.0)
+        self.assertEqual(0, self.data_source.hedges)
+        self.assertEqual(1, self.server.requests)
+
+
+class TestCircuitBreakerOfDataSource(unittest.IsolatedAsyncioTestCase):
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    @patch("httpx.AsyncClient")
+    async def test_open_circuit_fails_fast(self, mock_async_client_class, mock_sleep):
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = httpx.ConnectError("Simulated connection refused")
+        mock_async_client_class.return_value = mock_client
+        data_source = BuienRadarDataSource(queue=None, stations=[], bits=[])
+
+        with self.assertRaises(httpx.ConnectError):
+            await data_source.retrieve()
+        self.assertEqual(CircuitBreaker.OPEN, data_source.breaker.state)
+        calls = mock_client.get.call_count
+
+        with self.assertRaises(CircuitOpenError):
+            await data_source.retrieve()
+        self.assertEqual(calls, mock_client.get.call_count)
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_open_circuit_skips_the_recovery(self, mock_sleep):
+        queue = asyncio.Queue(maxsize=1)
+        data_source = BuienRadarDataSource(queue=queue, stations=[], bits=[])
+        for _ in range(data_source.breaker.failure_threshold):
+            data_source.breaker.record_failure()
+        with patch.object(BuienRadarDataSource, "_reset_wifi_connection") as reset_wifi:
+            await data_source.fetch_weather_data()
+        reset_wifi.assert_not_called()
+        self.assertTrue(queue.get_nowait()["error"])
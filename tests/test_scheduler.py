@@ -0,0 +1,166 @@
+import asyncio
+import unittest
+
+from weathervane.scheduler import Scheduler
+
+
+class FakeClock(object):
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def run_due_timers(scheduler):
+    asyncio.run(scheduler.run_due_timers())
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(clock=self.clock)
+        self.calls = []
+
+    def record(self):
+        self.calls.append(self.clock.now)
+
+    def test_timer_is_not_run_before_its_deadline(self):
+        self.scheduler.call_later(5, self.record)
+        self.clock.now += 4.9
+        run_due_timers(self.scheduler)
+        self.assertEqual([], self.calls)
+
+    def test_one_shot_timer_runs_once(self):
+        timer = self.scheduler.call_later(5, self.record)
+        self.clock.now += 5
+        run_due_timers(self.scheduler)
+        self.clock.now += 5
+        run_due_timers(self.scheduler)
+        self.assertEqual([105.0], self.calls)
+        self.assertNotIn(timer, self.scheduler.timers)
+
+    def test_repeating_timer_compensates_for_lateness(self):
+        timer = self.scheduler.call_every(2, self.record)
+        for lateness in (0.3, 0.7, 0.1):
+            self.clock.now = timer.deadline + lateness
+            run_due_timers(self.scheduler)
+        # The deadlines stay on the grid of the start time, no matter how late each run was
+        self.assertEqual(106.0, timer.deadline)
+        self.assertEqual(3, timer.runs)
+        self.assertAlmostEqual(0.7, timer.max_lateness)
+        self.assertAlmostEqual((0.3 + 0.7 + 0.1) / 3, timer.mean_lateness)
+
+    def test_missed_runs_are_skipped(self):
+        timer = self.scheduler.call_every(2, self.record)
+        self.clock.now += 7
+        run_due_timers(self.scheduler)
+        self.assertEqual([107.0], self.calls)
+        self.assertEqual(3, timer.skipped)
+        self.assertEqual(108.0, timer.deadline)
+
+    def test_call_repeatedly_stops_when_there_is_no_next_deadline(self):
+        deadlines = iter([103.0, None])
+        timer = self.scheduler.call_repeatedly(101.0, lambda _: next(deadlines), self.record)
+        for now in (101.0, 103.0, 200.0):
+            self.clock.now = now
+            run_due_timers(self.scheduler)
+        self.assertEqual([101.0, 103.0], self.calls)
+        self.assertNotIn(timer, self.scheduler.timers)
+
+    def test_cancelled_timer_does_not_run(self):
+        timer = self.scheduler.call_every(1, self.record)
+        timer.cancel()
+        self.clock.now += 1
+        run_due_timers(self.scheduler)
+        self.assertEqual([], self.calls)
+        self.assertEqual([], self.scheduler.timers)
+
+    def test_failing_callback_keeps_repeating(self):
+        def fail():
+            self.record()
+            raise RuntimeError("broken")
+
+        self.scheduler.call_every(1, fail)
+        run_due_timers(self.scheduler)
+        self.clock.now += 1
+        run_due_timers(self.scheduler)
+        self.assertEqual([100.0, 101.0], self.calls)
+
+    def test_coroutine_callbacks_are_awaited(self):
+        async def callback():
+            self.record()
+
+        self.scheduler.call_later(0, callback)
+        run_due_timers(self.scheduler)
+        self.assertEqual([100.0], self.calls)
+
+    def test_stats(self):
+        self.scheduler.call_every(1, self.record, name="display")
+        run_due_timers(self.scheduler)
+        stats = self.scheduler.stats()
+        self.assertEqual(1, stats["timers"]["display"]["runs"])
+        self.assertEqual(0, stats["wakeups"])
+
+    def test_reschedule_moves_the_deadline(self):
+        timer = self.scheduler.call_repeatedly(101.0, lambda deadline: deadline + 10, self.record, name="collect")
+        self.clock.now = 101.0
+        run_due_timers(self.scheduler)
+        self.scheduler.reschedule(timer, 105.0)
+        for now in (105.0, 111.0, 115.0):
+            self.clock.now = now
+            run_due_timers(self.scheduler)
+        # The old deadline of 111 is dropped, the timer continues from the new one
+        self.assertEqual([101.0, 105.0, 115.0], self.calls)
+        self.assertEqual([timer], self.scheduler.timers)
+        self.assertEqual(3, self.scheduler.stats()["timers"]["collect"]["runs"])
+
+    def test_reschedule_a_timer_that_ran_for_the_last_time(self):
+        timer = self.scheduler.call_later(1, self.record)
+        self.clock.now += 1
+        run_due_timers(self.scheduler)
+        self.scheduler.reschedule(timer, self.clock.now + 1)
+        self.clock.now += 1
+        run_due_timers(self.scheduler)
+        self.assertEqual([101.0, 102.0], self.calls)
+        self.assertEqual(2, timer.runs)
+
+    def test_callback_reschedules_its_own_timer(self):
+        timer = self.scheduler.call_every(10, lambda: self.scheduler.reschedule(timer, self.clock.now + 3))
+        run_due_timers(self.scheduler)
+        self.assertEqual(103.0, timer.deadline)
+        self.clock.now = 103.0
+        run_due_timers(self.scheduler)
+        self.assertEqual(2, timer.runs)
+
+
+class TestSchedulerRun(unittest.IsolatedAsyncioTestCase):
+    async def test_sleeps_until_the_next_deadline(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_every(0.02, lambda: calls.append(1))
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.11)
+        task.cancel()
+        self.assertIn(len(calls), range(5, 8))
+        # Only one wakeup per run, not one per polling interval
+        self.assertLessEqual(scheduler.wakeups, len(calls))
+
+    async def test_earlier_timer_wakes_up_the_scheduler(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_later(10, lambda: calls.append("late"))
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0)
+        scheduler.call_later(0.01, lambda: calls.append("early"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        self.assertEqual(["early"], calls)
+
+    async def test_stop(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_every(0.01, lambda: calls.append(1))
+        scheduler.call_later(0.035, scheduler.stop)
+        await asyncio.wait_for(scheduler.run(), 1)
+        self.assertIn(len(calls), range(3, 6))
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from tests import test_config
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.gpio import GPIO
+from weathervane.simulator import SimulatedDisplay
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+bits = [
+    {"key": "winddirection", "length": "4"},
+    {"key": "windspeedBft", "length": "4", "min": "0", "max": "12", "step": "1"},
+    {"key": "temperature", "length": "10", "min": "-39.9", "max": "60", "step": "0.1"},
+]
+weather_data = {"winddirection": "ZW", "windspeedBft": 5, "temperature": 21.3}
+
+
+def test_frames_are_decoded_with_the_layout():
+    plan = BitPackingPlan(bits)
+    display = SimulatedDisplay(plan, realtime=False)
+    assert display.xfer(plan.encode(weather_data)) == [0, 0, 0]
+    display.writebytes2(memoryview(plan.encode(dict(weather_data, windspeedBft=6))))
+    assert [received.weather_data["windspeedBft"] for received in display.history] == [5, 6]
+    assert display.last_weather_data == dict(weather_data, windspeedBft=6)
+
+
+def test_transfer_time_follows_frequency_and_length():
+    display = SimulatedDisplay(frequency=80_000, latency=0.001, realtime=False)
+    received = display.receive(bytes(10))
+    assert received.duration == pytest.approx(10 * 8 / 80_000 + 0.001)
+    assert display.busy_time == received.duration
+
+
+def test_transfer_takes_the_modelled_time():
+    display = SimulatedDisplay(frequency=1_000_000, latency=0.02)
+    start = time.perf_counter()
+    display.writebytes2(bytes(4))
+    assert time.perf_counter() - start >= 0.02
+
+
+def test_bit_errors():
+    plan = BitPackingPlan(bits)
+    frame = bytes(plan.encode(weather_data))
+    display = SimulatedDisplay(plan, bit_error_rate=1.0, realtime=False)
+    received = display.receive(frame)
+    assert received.frame == bytes(byte ^ 0xFF for byte in frame)
+    assert received.sent == frame
+    assert display.bit_errors == received.bit_errors == 24
+
+    display = SimulatedDisplay(plan, bit_error_rate=0.1, realtime=False, seed=1)
+    for _ in range(100):
+        display.receive(frame)
+    assert 100 * 24 * 0.05 < display.bit_errors < 100 * 24 * 0.15
+
+
+def test_history_is_limited():
+    display = SimulatedDisplay(history=3, realtime=False)
+    for byte in range(5):
+        display.writebytes2(bytes([byte]))
+    assert [received.sent for received in display.history] == [bytes([2]), bytes([3]), bytes([4])]
+    assert display.frames_received == 5
+    assert display.last_weather_data is None
+
+
+def test_frame_that_does_not_match_the_layout():
+    display = SimulatedDisplay(BitPackingPlan(bits), realtime=False)
+    display.writebytes2(bytes(1))
+    assert display.last_weather_data is None
+    assert display.undecodable == 1
+
+
+def test_test_mode_sends_to_the_simulated_display():
+    interface = WeatherVaneInterface(**dict(test_config.config, test=True, simulator={"realtime": False}))
+    interface.send({"winddirection": "NO", "windspeedBft": 6, "airpressure": 1014, "temperature": 20})
+    display = interface.gpio.spi
+    assert isinstance(display, SimulatedDisplay)
+    assert display.max_speed_hz == 250000
+    assert display.last_weather_data["winddirection"] == "NO"
+    assert display.last_weather_data["airpressure"] == 1014
+    assert display.last_weather_data["temperature"] == pytest.approx(20)
+
+
+def test_writer_thread_sends_to_the_simulated_display():
+    gpio = GPIO(test=True, writer_thread=True, bits=bits, simulator={"latency": 0.001})
+    gpio.send_data(BitPackingPlan(bits).encode(weather_data))
+    gpio.close()
+    assert gpio.writer.spi.last_weather_data == weather_data
+    assert gpio.writer.spi.closed
@@ -0,0 +1,148 @@
+import json
+import os
+
+import pytest
+
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.snapshot import SnapshotCache
+
+WEATHER_DATA = {
+    "error": False,
+    "winddirection": "ZW",
+    "windspeed": 3.5,
+    "windgusts": 6.0,
+    "windspeedBft": 3,
+    "airpressure": 1012.3,
+    "temperature": 14.2,
+    "feeltemperature": 13.1,
+    "humidity": 81,
+    "timestamp": "2024-03-01T12:40:00",
+}
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def decoded(plan, frame):
+    weather_data = plan.decode(frame)
+    weather_data.pop("random", None)
+    return weather_data
+
+
+@pytest.fixture
+def plan():
+    config_parser = WeathervaneConfigParser()
+    config_parser.read("tests/config-test1.ini")
+    return BitPackingPlan(config_parser.parse_bit_packing_section())
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, plan, clock):
+    return SnapshotCache(str(tmp_path / "snapshot.json"), plan, min_write_interval=3600, clock=clock)
+
+
+def test_round_trip(cache, plan, clock):
+    assert cache.save(WEATHER_DATA)
+    snapshot = cache.load()
+    assert snapshot.weather_data == WEATHER_DATA
+    assert snapshot.saved_at == clock.now
+    assert decoded(plan, snapshot.frame) == decoded(plan, plan.encode(WEATHER_DATA))
+
+
+def test_no_snapshot(cache):
+    assert cache.load() is None
+
+
+def test_unreadable_snapshot(cache):
+    with open(cache.path, "w") as f:
+        f.write('{"version": 1, "frame": ')
+    assert cache.load() is None
+
+
+def test_writes_are_rate_limited(cache, clock):
+    assert cache.save(WEATHER_DATA)
+    clock.now += 600
+    assert not cache.save(dict(WEATHER_DATA, temperature=15.0))
+    assert cache.load().weather_data["temperature"] == 14.2
+    clock.now += 3000
+    assert cache.save(dict(WEATHER_DATA, temperature=16.0))
+    assert cache.load().weather_data["temperature"] == 16.0
+    assert cache.writes == 2
+
+
+def test_unchanged_weather_data_is_not_written(cache, clock):
+    assert cache.save(dict(WEATHER_DATA, random=1))
+    clock.now += 7200
+    assert not cache.save(dict(WEATHER_DATA, random=2))
+    assert cache.writes == 1
+
+
+def test_flush_writes_the_pending_snapshot(cache, clock):
+    cache.save(WEATHER_DATA)
+    clock.now += 1
+    cache.save(dict(WEATHER_DATA, temperature=15.0))
+    assert cache.flush()
+    assert cache.load().weather_data["temperature"] == 15.0
+    assert not cache.flush()
+
+
+def test_write_is_atomic(cache, monkeypatch):
+    cache.save(WEATHER_DATA)
+
+    def broken_fsync(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "fsync", broken_fsync)
+    cache.flush()
+    cache._pending = (dict(WEATHER_DATA, temperature=20.0), "changed")
+    assert not cache.flush()
+    assert cache.load().weather_data == WEATHER_DATA
+    assert os.listdir(os.path.dirname(cache.path)) == ["snapshot.json"]
+
+
+def test_frame_with_error_bit(cache, plan):
+    cache.save(WEATHER_DATA)
+    snapshot = cache.load()
+    assert plan.decode(cache.frame_of(snapshot, error=False))["error"] == 0
+    frame = cache.frame_of(snapshot, error=True)
+    assert plan.decode(frame)["error"] == 1
+    assert decoded(plan, frame) == dict(decoded(plan, snapshot.frame), error=1)
+
+
+def test_frame_with_a_wide_error_field(tmp_path, clock):
+    plan = BitPackingPlan([{"key": "temperature", "length": "8", "min": "-40", "max": "50", "step": "0.5"},
+                           {"key": "error", "length": "2"}])
+    cache = SnapshotCache(str(tmp_path / "snapshot.json"), plan, min_write_interval=3600, clock=clock)
+    cache.save(WEATHER_DATA)
+    assert plan.decode(cache.frame_of(cache.load(), error=True))["error"] == 1
+
+
+def test_frame_is_encoded_again_after_a_layout_change(cache, tmp_path, clock):
+    cache.save(WEATHER_DATA)
+    config_parser = WeathervaneConfigParser()
+    config_parser.read("tests/config-test2.ini")
+    other_plan = BitPackingPlan(config_parser.parse_bit_packing_section())
+    other_cache = SnapshotCache(cache.path, other_plan, min_write_interval=3600, clock=clock)
+    frame = other_cache.frame_of(other_cache.load(), error=False)
+    assert decoded(other_plan, frame) == decoded(other_plan, other_plan.encode(WEATHER_DATA))
+
+
+def test_other_version_is_ignored(cache):
+    cache.save(WEATHER_DATA)
+    with open(cache.path) as f:
+        content = json.load(f)
+    content["version"] = 0
+    with open(cache.path, "w") as f:
+        json.dump(content, f)
+    assert cache.load() is None
@@ -0,0 +1,77 @@
+import json
+import os
+import random
+from datetime import datetime
+
+import pytest
+
+from weathervane.parser import BuienradarParser
+from weathervane.spatial import StationIndex, distance_km
+
+bits = [{"key": "airpressure"}, {"key": "temperature"}, {"key": "barometric_trend"}]
+# Shortly after the measurements in the feed, so they are not stale
+NOW = datetime(2021, 6, 19, 13, 45)
+
+
+@pytest.fixture
+def feed():
+    with open(os.path.join(os.getcwd(), "tests", "buienradar.json"), "r", encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def test_distance():
+    # De Bilt to Arnhem
+    assert distance_km(52.1, 5.18, 52.07, 5.88) == pytest.approx(47.9, abs=0.1)
+    assert distance_km(52.1, 5.18, 52.1, 5.18) == 0
+
+
+def test_within_and_nearest_match_a_linear_scan():
+    rng = random.Random(1)
+    locations = [(station, rng.uniform(50, 54), rng.uniform(2, 8)) for station in range(2000)]
+    index = StationIndex(locations)
+    for _ in range(20):
+        lat, lon = rng.uniform(50, 54), rng.uniform(2, 8)
+        expected = sorted((distance_km(lat, lon, station_lat, station_lon), station)
+                          for station, station_lat, station_lon in locations)
+        assert index.within(lat, lon, 40) == [found for found in expected if found[0] <= 40]
+        assert index.nearest(lat, lon, 5) == expected[:5]
+        assert index.nearest(lat, lon, 5, max_km=1) == [found for found in expected[:5] if found[0] <= 1]
+
+
+def test_index_of_the_feed(feed):
+    index = StationIndex.from_feed(feed["actual"]["stationmeasurements"])
+    assert len(index) == len(feed["actual"]["stationmeasurements"])
+    assert 6260 in index
+    assert [station for _, station in index.nearest(*index.locations[6260], 1)] == [6260]
+
+
+def test_nearest_station_with_the_field(feed):
+    """Neither Cadzand nor Groenlo measures the air pressure, so it is taken from Vlissingen, the nearest station to
+    Cadzand that does"""
+    bp = BuienradarParser(stations=[6308, 6283], bits=bits, max_distance=50)
+    weather_data = bp.parse(feed, now=NOW)
+    assert weather_data["airpressure"] == 1015.4
+    assert weather_data["data_from_fallback"]
+    assert not weather_data["error"]
+
+
+def test_only_configured_stations_without_distance(feed):
+    bp = BuienradarParser(stations=[6308, 6283], bits=bits, max_distance=0)
+    weather_data = bp.parse(feed, now=NOW)
+    assert weather_data.get("airpressure") is None
+
+
+def test_plan_is_kept_while_the_stations_are_the_same(feed):
+    bp = BuienradarParser(stations=[6308, 6283], bits=bits, max_distance=50)
+    bp.parse(feed, now=NOW)
+    plan = bp.plan
+    assert plan.candidates("airpressure")[:2] == (6283, 6310)
+    bp.parse(feed, now=NOW)
+    assert bp.plan is plan
+
+    vlissingen = next(station for station in feed["actual"]["stationmeasurements"] if station["stationid"] == 6310)
+    feed["actual"]["stationmeasurements"].remove(vlissingen)
+    weather_data = bp.parse(feed, now=NOW)
+    assert bp.plan is not plan
+    assert 6310 not in bp.plan.candidates("airpressure")
+    assert weather_data["airpressure"] is not None
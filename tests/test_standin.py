@@ -0,0 +1,82 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from tests.helpers import load_configuration
+from tests.standin import ERROR, IDENTITY_FIELDS, RESET, TRUNCATE, StandInServer, client_ssl_context, synthetic_feed
+from weathervane.datasources import DEFAULT_WEATHER_DATA, BuienRadarDataSource
+from weathervane.parser import BuienradarParser
+
+
+def stations(feed: bytes) -> list:
+    return json.loads(feed)["actual"]["stationmeasurements"]
+
+
+class TestSyntheticFeed(unittest.TestCase):
+    def setUp(self):
+        self.config = load_configuration()
+        self.parser = BuienradarParser(self.config["stations"], self.config["bits"])
+
+    def test_amount_of_stations(self):
+        for amount in (10, 1000):
+            with self.subTest(amount=amount):
+                ids = [station["stationid"] for station in stations(synthetic_feed(amount, seed=1))]
+                self.assertEqual(amount, len(set(ids)))
+
+    def test_parses_like_the_recorded_feed(self):
+        wd = self.parser.parse(json.loads(synthetic_feed(seed=1)))
+        self.assertFalse(wd["error"])
+        self.assertFalse(wd["data_from_fallback"])
+
+    def test_reproducible(self):
+        now = datetime(2025, 6, 1, 12, 0)
+        self.assertEqual(synthetic_feed(100, seed=1, now=now), synthetic_feed(100, seed=1, now=now))
+
+    def test_missing_fields(self):
+        for station in stations(synthetic_feed(100, missing=1.0, seed=1)):
+            self.assertEqual(set(IDENTITY_FIELDS), set(station))
+
+    def test_stale(self):
+        wd = self.parser.parse(json.loads(synthetic_feed(stale=1.0, seed=1)))
+        self.assertTrue(wd["error"])
+
+
+@patch("asyncio.sleep", new_callable=AsyncMock)
+class TestFaultRecovery(unittest.IsolatedAsyncioTestCase):
+    async def fetch(self, server, streaming=True):
+        config = load_configuration()
+        data_source = BuienRadarDataSource(
+            asyncio.Queue(maxsize=1), config["stations"], config["bits"], url=server.url,
+            verify=client_ssl_context(), streaming=streaming
+        )
+        try:
+            await data_source.fetch_weather_data()
+        finally:
+            await data_source.aclose()
+        return data_source.queue.get_nowait()
+
+    async def test_retried(self, mock_sleep):
+        for fault in (ERROR, RESET, TRUNCATE):
+            for streaming in (True, False):
+                with self.subTest(fault=fault, streaming=streaming):
+                    with StandInServer(body=synthetic_feed(seed=1), faults={1: fault}) as server:
+                        wd = await self.fetch(server, streaming)
+                        self.assertFalse(wd["error"])
+                        self.assertEqual(2, server.requests)
+                        self.assertEqual({fault: 1}, server.injected)
+                        if fault != ERROR:
+                            # The broken connection is not reused
+                            self.assertEqual(2, server.connections)
+
+    async def test_recovery_cascade(self, mock_sleep):
+        with patch.object(BuienRadarDataSource, "_reset_wifi_connection", return_value=True) as reset_wifi, \
+                patch.object(BuienRadarDataSource, "_reboot_system", return_value=False) as reboot, \
+                StandInServer(error_rate=1.0, error_status=500) as server:
+            self.assertIs(DEFAULT_WEATHER_DATA, await self.fetch(server))
+        reset_wifi.assert_called_once()
+        reboot.assert_called_once()
+        # Four attempts before and four after the WiFi reset
+        self.assertEqual(8, server.requests)
+        self.assertEqual(8, server.injected[ERROR])
@@ -0,0 +1,98 @@
+import copy
+import json
+import os
+
+import pytest
+
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.interpolation import interpolate
+from weathervane.parser import BuienradarParser, StationMeasurement
+
+
+def feed():
+    with open(os.path.join("tests", "buienradar.json"), encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def test_behaves_like_a_dict():
+    measurement = StationMeasurement({"temperature": "12.5", "winddirection": "WZW", "stationname": "Arcen"})
+    assert {"temperature": 12.5, "winddirection": "WZW", "stationname": "Arcen"} == measurement
+    assert 11 == measurement.wind_direction_code
+    assert 12.5 == measurement.get("temperature")
+    assert measurement.get("humidity") is None
+    assert "humidity" not in measurement
+    measurement["humidity"] = 80
+    assert 80.0 == measurement["humidity"]
+    del measurement["humidity"]
+    with pytest.raises(KeyError):
+        measurement["humidity"]
+    assert {"temperature", "winddirection", "stationname"} == set(measurement)
+    assert 3 == len(measurement)
+
+
+def test_types():
+    measurement = StationMeasurement({"stationid": "6391", "windspeedBft": 3, "visibility": 100})
+    assert int is type(measurement["stationid"])
+    assert float is type(measurement["visibility"])
+    with pytest.raises(ValueError):
+        measurement["temperature"] = "warm"
+
+
+def test_invalid_values_are_missing():
+    measurement = StationMeasurement({"temperature": "warm", "humidity": 80})
+    assert {"humidity": 80.0} == measurement
+
+
+def test_other_fields_and_unknown_wind_directions():
+    measurement = StationMeasurement({"winddirection": "VAR", "iconurl": "https://example.com/c.png"})
+    assert "VAR" == measurement["winddirection"]
+    assert measurement.wind_direction_code is None
+    assert "https://example.com/c.png" == measurement["iconurl"]
+
+
+def test_copy():
+    measurement = StationMeasurement({"temperature": 12.5, "extra": [1]})
+    for duplicate in (measurement.copy(), copy.deepcopy(measurement), StationMeasurement(measurement)):
+        assert measurement == duplicate
+        duplicate["temperature"] = 13.0
+        assert 12.5 == measurement["temperature"]
+
+
+def test_merge_leaves_the_feed_alone():
+    data = feed()
+    original = copy.deepcopy(data)
+    bp = BuienradarParser(stations=[6308, 6275], bits=[{"key": "temperature"}, {"key": "humidity"}])
+    weather_data = bp.parse(data)
+    assert isinstance(weather_data, StationMeasurement)
+    assert weather_data["data_from_fallback"]
+    assert original == data
+
+
+def test_interpolate_and_encode():
+    bits = [{"key": "winddirection", "length": 4}, {"key": "temperature", "length": 8, "min": -40, "max": 50,
+                                                     "step": 0.5}]
+    plan = BitPackingPlan(bits)
+    old = StationMeasurement({"error": False, "winddirection": "N", "temperature": 10})
+    new = StationMeasurement({"error": False, "winddirection": "ZW", "temperature": 20})
+    halfway = interpolate(old, new, 0.5)
+    assert {"error": False, "winddirection": "ZW", "temperature": 15.0} == halfway
+    assert plan.encode(dict(new)) == plan.encode(new)
+    assert {"winddirection": 10, "temperature": 120} == plan.transmittable_data(new)
+
+
+@pytest.mark.parametrize("fields", [
+    {"winddirection": "ZW"}, {"winddirection": "N"}, {"winddirection": "VAR"}, {"winddirection": None},
+    {"temperature": 12.5},
+])
+def test_encoders_read_the_wind_direction_code(fields):
+    bits = [{"key": "winddirection", "length": 4}, {"key": "temperature", "length": 8, "min": -40, "max": 50,
+                                                     "step": 0.5}]
+    plan = BitPackingPlan(bits)
+    measurement = StationMeasurement(dict(fields, error=False))
+    assert plan.quantized_values(dict(measurement)) == plan.quantized_values(measurement)
+    pytest.importorskip("numpy")
+    from weathervane.batch import BatchEncoder
+    encoder = BatchEncoder(plan)
+    columns, expected = encoder.columns([measurement]), encoder.columns([dict(measurement)])
+    for name in ("values", "truthy", "present"):
+        assert (getattr(columns, name) == getattr(expected, name)).all()
@@ -0,0 +1,58 @@
+import json
+import random
+
+import pytest
+
+from weathervane.streaming import StationExtractor, extract_stations
+
+with open("tests/buienradar.json", "rb") as f:
+    FEED = f.read()
+
+STATIONS = [6370, 6350]
+
+
+def expected_stations(feed, stations):
+    return [s for s in json.loads(feed)["actual"]["stationmeasurements"] if s["stationid"] in stations]
+
+
+def test_extract_stations():
+    extracted = extract_stations(FEED, STATIONS)
+    assert extracted["actual"]["stationmeasurements"] == expected_stations(FEED, STATIONS)
+    assert extracted["actual"]["sunrise"] == "2021-06-19T05:19:00"
+    assert "forecast" not in extracted
+
+
+@pytest.mark.parametrize("max_chunk_size", [1, 3, 17, 4096])
+def test_chunks_of_any_size(max_chunk_size):
+    rng = random.Random(max_chunk_size)
+    extractor = StationExtractor(STATIONS)
+    position = 0
+    while position < len(FEED):
+        size = rng.randint(1, max_chunk_size)
+        extractor.feed(FEED[position:position + size])
+        position += size
+    assert extractor.close()["actual"]["stationmeasurements"] == expected_stations(FEED, STATIONS)
+    assert extractor.skipped == len(json.loads(FEED)["actual"]["stationmeasurements"]) - len(STATIONS)
+
+
+def test_compact_json_with_escaped_strings():
+    feed = json.loads(FEED)
+    feed["actual"]["stationmeasurements"][0]["stationname"] = 'Meetstation "De Bilt" {\\}'
+    stations = [feed["actual"]["stationmeasurements"][0]["stationid"]]
+    compact = json.dumps(feed, separators=(",", ":")).encode()
+    extractor = StationExtractor(stations)
+    for i in range(len(compact)):
+        extractor.feed(compact[i:i + 1])
+    assert extractor.close()["actual"]["stationmeasurements"] == expected_stations(compact, stations)
+
+
+def test_truncated_feed():
+    extractor = StationExtractor(STATIONS)
+    extractor.feed(FEED[:len(FEED) // 2])
+    with pytest.raises(ValueError):
+        extractor.close()
+
+
+def test_feed_without_station_measurements():
+    with pytest.raises(ValueError):
+        extract_stations(b'{"actual": {}, "forecast": "' + b"x" * 100_000 + b'"}', STATIONS)
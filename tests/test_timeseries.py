@@ -0,0 +1,131 @@
+import json
+import math
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from weathervane.parser import BuienradarParser
+from weathervane.timeseries import DROPPING, RISING, STABLE, RollingWindow, TimeSeriesStore
+
+START = datetime(2025, 6, 1, 12, 0)
+STATIONS = [6350, 6370]
+
+
+def every_10_minutes(store, station, hours, **fields):
+    """Record measurements in which each field changes linearly: fields map to (value at the start, change per hour)"""
+    for i in range(int(hours * 6) + 1):
+        measurements = {key: start + change * i / 6 for key, (start, change) in fields.items()}
+        store.record(station, (START + timedelta(minutes=10 * i)).timestamp(), measurements)
+
+
+@pytest.fixture
+def store():
+    store = TimeSeriesStore(None, STATIONS)
+    yield store
+    store.close()
+
+
+def test_rolling_window():
+    window = RollingWindow(span=30)
+    for timestamp, value in enumerate([5.0, 1.0, 7.0, 3.0]):
+        window.add(timestamp * 10, value)
+    # The sample at 0 is exactly 30 seconds old, so it is still in the window
+    assert (4, 16.0, 1.0, 7.0) == (len(window), window.sum, window.min, window.max)
+    window.add(40, 2.0)
+    assert (4, 13.0, 1.0, 7.0) == (len(window), window.sum, window.min, window.max)
+    window.add(100, 4.0)
+    assert (1, 4.0, 4.0, 4.0) == (len(window), window.sum, window.min, window.max)
+
+
+@pytest.mark.parametrize("change, trend", [(0.5, RISING), (-0.5, DROPPING), (0.1, STABLE)])
+def test_barometric_trend(store, change, trend):
+    every_10_minutes(store, 6350, 5, airpressure=(1010, change))
+    assert trend == store.derived()["barometric_trend"]
+
+
+def test_trend_needs_hours_of_measurements(store):
+    every_10_minutes(store, 6350, 2, airpressure=(1010, 2))
+    assert "barometric_trend" not in store.derived()
+
+
+def test_temperature_and_rain(store):
+    every_10_minutes(store, 6350, 30, temperature=(10, 0.5), precipitation=(2, 0))
+    derived = store.derived()
+    # Only the last 24 hours count
+    assert 13.0 == derived["temperatureMinLast24Hour"]
+    assert 25.0 == derived["temperatureMaxLast24Hour"]
+    # 2 mm/h over the 145 intervals of 10 minutes that end in the window, which includes both of its ends
+    assert 145 * 2 / 6 == pytest.approx(derived["rainAccumulationLast24Hour"])
+
+
+def test_fallback_station(store):
+    every_10_minutes(store, 6350, 5, temperature=(10, 0))
+    every_10_minutes(store, 6370, 5, temperature=(20, 0), airpressure=(1010, -1))
+    derived = store.derived()
+    assert 10.0 == derived["temperatureMaxLast24Hour"]
+    assert DROPPING == derived["barometric_trend"]
+
+
+def test_only_newer_measurements(store):
+    assert store.record(6350, 1000.0, {"temperature": 10})
+    assert not store.record(6350, 1000.0, {"temperature": 11})
+    assert not store.record(9999, 2000.0, {"temperature": 11})
+    assert [(1000.0, 10.0)] == [(timestamp, values[1]) for timestamp, values in store.samples(6350)]
+    assert math.isnan(store.samples(6350)[0][1][0])
+
+
+def test_ring_buffer_wraps():
+    store = TimeSeriesStore(None, STATIONS, capacity=8)
+    every_10_minutes(store, 6350, 3, temperature=(10, 6))
+    samples = store.samples(6350)
+    assert 8 == len(samples)
+    assert [21.0 + i for i in range(8)] == [values[1] for _, values in samples]
+
+
+def test_survives_a_restart(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = TimeSeriesStore(path, STATIONS)
+    every_10_minutes(store, 6370, 5, airpressure=(1010, 1), temperature=(10, 1))
+    derived = store.derived()
+    store.close()
+
+    store = TimeSeriesStore(path, list(reversed(STATIONS)))
+    assert derived == store.derived()
+    assert 31 == len(store.samples(6370))
+    store.close()
+
+
+def test_other_stations_and_layout(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = TimeSeriesStore(path, STATIONS)
+    every_10_minutes(store, 6350, 1, temperature=(10, 0))
+    every_10_minutes(store, 6370, 1, temperature=(10, 0))
+    store.close()
+
+    # A station that is no longer configured makes room for a new one
+    store = TimeSeriesStore(path, [6370, 6260])
+    assert 7 == len(store.samples(6370))
+    assert [] == store.samples(6260)
+    store.close()
+
+    # A history of another size starts anew
+    store = TimeSeriesStore(path, [6370, 6260], capacity=16)
+    assert [] == store.samples(6370)
+    store.close()
+    assert os.path.getsize(path) == store.size
+
+
+def test_parser_derives_the_trend():
+    with open(os.path.join("tests", "buienradar.json"), encoding="UTF-8") as f:
+        feed = json.load(f)
+    bp = BuienradarParser([6260], [{"key": "airpressure"}], history=TimeSeriesStore(None, [6260]))
+    station = next(s for s in feed["actual"]["stationmeasurements"] if s["stationid"] == 6260)
+    for i in range(25):
+        station["timestamp"] = (START + timedelta(minutes=10 * i)).isoformat()
+        station["airpressure"] = 1010 - 0.5 * i / 6
+        wd = bp.parse(feed, now=START + timedelta(minutes=10 * i))
+    assert DROPPING == wd["barometric_trend"]
+    assert "temperatureMaxLast24Hour" in wd
+    # Without a history the trend is not known
+    assert STABLE == BuienradarParser([6260], [{"key": "airpressure"}]).parse(feed, now=START)["barometric_trend"]
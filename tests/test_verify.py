@@ -0,0 +1,40 @@
+import json
+import random
+
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.verify import read_records, round_trip, synthetic_weather_data
+
+bits = [
+    {"key": "winddirection", "length": "4"},
+    {"key": "windspeed", "length": "6", "max": "63", "min": "0", "step": "1"},
+    {"key": "windgusts", "length": "6", "max": "63", "min": "0", "step": "1"},
+    {"key": "temperature", "length": "10", "max": "49.9", "min": "-39.9", "step": "0.1"},
+    {"key": "error", "length": "1"},
+    {"key": "random", "length": "8"},
+]
+
+
+def test_round_trip_error_is_below_step():
+    plan = BitPackingPlan(bits)
+    errors = round_trip(plan, synthetic_weather_data(plan, 2000, random.Random(0)))
+    assert "random" not in errors
+    assert errors["winddirection"].mismatches == 0
+    for field in plan.fields:
+        if field.key in errors:
+            assert errors[field.key].count == 2000
+            assert errors[field.key].max_error < field.step
+    assert errors["temperature"].clipped > 0
+
+
+def test_out_of_range_values_are_counted_as_clipped():
+    plan = BitPackingPlan(bits)
+    errors = round_trip(plan, [{"temperature": 60.0}, {"temperature": 20.0}])
+    assert errors["temperature"].clipped == 1
+    assert errors["temperature"].max_error < 0.1
+
+
+def test_read_records(tmp_path):
+    records = [{"temperature": 1.5}, {"temperature": 2.5}]
+    file_name = tmp_path / "records.jsonl"
+    file_name.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+    assert list(read_records(file_name)) == records
@@ -0,0 +1,14 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from main import WeatherVane
+from tests.helpers import load_configuration
+
+
+class TestLoop(unittest.IsolatedAsyncioTestCase):
+    async def test_failing_consumer_stops_the_loop(self):
+        weathervane = WeatherVane(**load_configuration(test=True, source="test"))
+        with patch.object(weathervane, "build_frame_table", side_effect=ValueError("bad snapshot")):
+            with self.assertRaisesRegex(ValueError, "bad snapshot"):
+                await asyncio.wait_for(weathervane.loop(), 5)
@@ -1,6 +1,8 @@
 import os
 
-from weathervane.parser import WeathervaneConfigParser
+import pytest
+
+from weathervane.parser import InvalidConfigException, WeathervaneConfigParser
 
 config_file_name = "config-test1.ini"
 
@@ -12,14 +14,31 @@ def test_parse_config():
     expected_keys = [
         "channel",
         "frequency",
+        "keep_alive_interval",
+        "writer_thread",
+        "write_only",
         "library",
         "data_collection_interval",
+        "adaptive_polling",
         "data_display_interval",
         "source",
         "stations",
         "bits",
+        "displays",
         "test",
         "barometric_trend",
+        "history_file",
+        "streaming",
+        "snapshot_file",
+        "snapshot_interval",
+        "archive_dir",
+        "archive_max_bytes",
+        "archive_whole_feed",
+        "replay_speedup",
+        "fallback_max_distance",
+        "interpolate_at",
+        "interpolate_neighbours",
+        "simulator",
         "display",
     ]
     observed = cp.parse_config()
@@ -49,3 +68,64 @@ def test_rain_config():
         "max": "99.9",
         "step": "0.1",
     }
+
+
+@pytest.mark.parametrize("key, expected", [
+    ("adaptive_polling", False),
+    ("streaming", False),
+    ("fallback_max_distance", 0),
+    ("writer_thread", False),
+])
+def test_opt_in_defaults(key, expected):
+    """Features that change the behavior of existing installs are off unless config.ini turns them on"""
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "tests", config_file_name))
+    assert expected == cp.parse_config()[key]
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("", None),
+    ("52.10, 5.18", (52.1, 5.18)),
+    ("52.1", InvalidConfigException),
+    ("north,south", InvalidConfigException),
+    ("95,5", InvalidConfigException),
+])
+def test_parse_location(location, expected):
+    cp = WeathervaneConfigParser()
+    cp.read_dict({"General": {"interpolate_at": location}})
+    if expected is InvalidConfigException:
+        with pytest.raises(InvalidConfigException):
+            cp.parse_location()
+    else:
+        assert cp.parse_location() == expected
+
+
+def test_parse_displays():
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "tests", config_file_name))
+    cp.read_string("""
+[SPI hallway]
+channel=1
+frequency=50000
+
+[Bit Packing hallway]
+0=winddirection,4
+1=windspeedBft,4,1,12,1
+
+[SPI porch]
+device=1
+""")
+    main, hallway, porch = cp.parse_config()["displays"]
+    assert (main["bus"], main["device"], main["frequency"]) == (0, 0, 250000)
+    assert (hallway["name"], hallway["bus"], hallway["device"], hallway["frequency"]) == ("hallway", 1, 0, 50000)
+    assert [field["key"] for field in hallway["bits"]] == ["winddirection", "windspeedBft"]
+    assert (porch["bus"], porch["device"], porch["frequency"]) == (0, 1, 250000)
+    assert porch["bits"] is main["bits"]
+
+
+def test_displays_need_a_device_of_their_own():
+    cp = WeathervaneConfigParser()
+    cp.read(os.path.join(os.getcwd(), "tests", config_file_name))
+    cp.read_string("[SPI hallway]\nfrequency=50000\n")
+    with pytest.raises(InvalidConfigException):
+        cp.parse_config()
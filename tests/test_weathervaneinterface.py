@@ -2,7 +2,10 @@ import unittest
 from unittest.mock import patch
 
 from tests import test_config
-from weathervane.weathervaneinterface import WeatherVaneInterface
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.interpolation import FrameTable
+from weathervane.parser import required_fields
+from weathervane.weathervaneinterface import DisplayGroup, WeatherVaneInterface
 
 
 @patch("weathervane.weathervaneinterface.GPIO", autospec=True)
@@ -102,5 +105,60 @@ class WeatherVaneTest(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+
+class DisplayGroupTest(unittest.TestCase):
+    old_layout = [{"key": "winddirection", "length": "4"}, {"key": "windspeedBft", "length": "4", "min": "1",
+                                                              "max": "12", "step": "1"}]
+
+    def setUp(self):
+        self.configuration = dict(
+            test_config.config,
+            test=True,
+            displays=[
+                {"name": "SPI", "bus": 0, "device": 0, "bits": test_config.config["bits"]},
+                {"name": "hallway", "bus": 1, "device": 0, "frequency": 50000, "bits": self.old_layout},
+            ],
+        )
+        self.group = DisplayGroup.from_configuration(**self.configuration)
+        self.weather_data = {"winddirection": "ZW", "windspeedBft": 5, "airpressure": 1014, "temperature": 20}
+
+    def test_every_display_has_its_own_device_and_layout(self):
+        main, hallway = self.group.interfaces
+        self.assertEqual((0, 250000), (main.gpio.bus, main.gpio.frequency))
+        self.assertEqual((1, 50000), (hallway.gpio.bus, hallway.gpio.frequency))
+        self.assertEqual(1, hallway.byte_length)
+        self.assertEqual(main.byte_length + 1, self.group.byte_length)
+
+    def test_each_display_is_sent_its_own_frame(self):
+        frame = self.group.encode_weather_data(self.weather_data)
+        self.group.send_frame(frame)
+        main, hallway = self.group.interfaces
+        main_frame, hallway_frame = self.group.frames_of(frame)
+        self.assertEqual(bytes(main.encode_weather_data(self.weather_data)), main_frame)
+        self.assertEqual(
+            {"winddirection": "ZW", "windspeedBft": 5}, BitPackingPlan(self.old_layout).decode(hallway_frame)
+        )
+        self.assertEqual([main_frame], [received.sent for received in main.gpio.spi.history])
+        self.assertEqual([hallway_frame], [received.sent for received in hallway.gpio.spi.history])
+
+    def test_frames_of_all_displays_are_encoded_in_one_table(self):
+        old = dict(self.weather_data, error=False)
+        new = dict(old, windspeedBft=9)
+        table = FrameTable.build(old, new, self.group.encode_weather_data, anchor=0, duration=4, interval=1)
+        hallway_plan = BitPackingPlan(self.old_layout)
+        speeds = [hallway_plan.decode(self.group.frames_of(frame)[1])["windspeedBft"] for frame in table.frames]
+        self.assertEqual([5, 6, 7, 8, 9], speeds)
+
+    def test_first_frame_is_reused(self):
+        first_frame = bytes(self.group.interfaces[0].byte_length)
+        frame = self.group.encode_weather_data(self.weather_data, first_frame=first_frame)
+        self.assertEqual(first_frame, self.group.frames_of(frame)[0])
+
+    def test_the_fields_of_all_layouts_are_required(self):
+        self.configuration["displays"][1]["bits"] = self.old_layout + [{"key": "sunpower", "length": "8"}]
+        keys = [field["key"] for field in required_fields(self.configuration)]
+        self.assertEqual([field["key"] for field in test_config.config["bits"]] + ["sunpower"], keys)
+
+
 if __name__ == "__main__":
     unittest.main()
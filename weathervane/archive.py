@@ -0,0 +1,240 @@
+"""A bounded archive of fetched feeds on disk, for replay, regression tests and analysis
+
+Records are compressed one by one with zlib and appended to segment files in a directory. Every segment has an index
+next to it (.idx) with the fetch time, offset and length of each record, so a time range is read by looking up the
+records in the small indexes and decompressing only those. Segment files are named after the fetch time of their first
+record, in milliseconds, so they sort chronologically.
+
+To spare the SD card, records are kept in memory and written in batches: when enough compressed bytes are pending or
+the oldest pending record is older than the flush interval. A segment is closed once it reaches its size, and the
+oldest segments are deleted when the archive exceeds its size cap. Records that were not flushed are lost on a crash;
+an index entry is only written after its record, so a crash never leaves an index that points to missing data.
+"""
+import bisect
+import itertools
+import logging
+import mmap
+import operator
+import os
+import struct
+import time
+import zlib
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+# Fetch time (seconds since the epoch), offset in the segment and length of the compressed record
+INDEX_ENTRY = struct.Struct("<dQI")
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# The size cap is enforced by deleting whole segments, so a segment is a fraction of the cap
+SEGMENTS_PER_ARCHIVE = 8
+DEFAULT_BATCH_BYTES = 256 * 1024
+DEFAULT_FLUSH_INTERVAL = 60 * 60
+COMPRESSION_LEVEL = 6
+
+
+class ArchiveRecord(NamedTuple):
+    fetched_at: float
+    data: bytes
+
+
+def _segment_name(fetched_at: float) -> str:
+    return f"{int(fetched_at * 1000):015d}{SEGMENT_SUFFIX}"
+
+
+def _segment_start(path: str) -> float:
+    return int(os.path.basename(path)[:-len(SEGMENT_SUFFIX)]) / 1000
+
+
+def _segments(directory: str) -> List[str]:
+    """The segment files in the directory, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()]
+
+
+def _index_path(segment: str) -> str:
+    return segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+class ArchiveWriter(object):
+    """Appends records to the archive in a directory
+
+    @param max_bytes: hard cap of the size of all segments and indexes together
+    @param batch_bytes: flush when this many compressed bytes are pending
+    @param flush_interval: flush when the oldest pending record is this many seconds old
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            batch_bytes: int = DEFAULT_BATCH_BYTES,
+            flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1, max_bytes // SEGMENTS_PER_ARCHIVE)
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.records = 0
+        self.flushes = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.segments_deleted = 0
+        self._pending: List[Tuple[float, bytes]] = []
+        self._pending_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        segments = _segments(directory)
+        self._segment = segments[-1] if segments else None
+
+    def __repr__(self):
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+        return (f"ArchiveWriter(directory={self.directory}, records={self.records}, flushes={self.flushes}, "
+                f"compression={ratio:.1f}x)")
+
+    def append(self, data: bytes, fetched_at: Optional[float] = None) -> bool:
+        """Compress the record and keep it until the next flush
+
+        @return: whether the archive was flushed
+        """
+        fetched_at = self.clock() if fetched_at is None else fetched_at
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        self._pending.append((fetched_at, compressed))
+        self._pending_bytes += len(compressed)
+        self.records += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        if self._pending_bytes >= self.batch_bytes or self.clock() - self._pending[0][0] >= self.flush_interval:
+            return self.flush()
+        return False
+
+    def flush(self) -> bool:
+        """Write the pending records, regardless of the batch size and the flush interval"""
+        if not self._pending:
+            return False
+        pending, self._pending, self._pending_bytes = self._pending, [], 0
+        try:
+            while pending:
+                pending = self._write_to_segment(pending)
+        except OSError as e:
+            logger.warning(f"Could not write {len(pending)} records to the archive in {self.directory}: {e}")
+            return False
+        self.flushes += 1
+        self._enforce_cap()
+        return True
+
+    def _write_to_segment(self, pending: List[Tuple[float, bytes]]) -> List[Tuple[float, bytes]]:
+        """Write as many records as fit in the current segment, or a new one if it is full
+
+        @return: the records that did not fit
+        """
+        if self._segment is None or os.path.getsize(self._segment) >= self.segment_bytes:
+            self._segment = os.path.join(self.directory, _segment_name(pending[0][0]))
+        offset = os.path.getsize(self._segment) if os.path.exists(self._segment) else 0
+        data = bytearray()
+        index = bytearray()
+        written = 0
+        for fetched_at, compressed in pending:
+            if data and offset + len(data) + len(compressed) > self.segment_bytes:
+                break
+            index += INDEX_ENTRY.pack(fetched_at, offset + len(data), len(compressed))
+            data += compressed
+            written += 1
+        with open(self._segment, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(_index_path(self._segment), "ab") as f:
+            f.write(index)
+            f.flush()
+            os.fsync(f.fileno())
+        return pending[written:]
+
+    def size(self) -> int:
+        """The size of all segments and indexes on disk"""
+        size = 0
+        for segment in _segments(self.directory):
+            for path in (segment, _index_path(segment)):
+                try:
+                    size += os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+        return size
+
+    def _enforce_cap(self):
+        segments = _segments(self.directory)
+        size = self.size()
+        while size > self.max_bytes and len(segments) > 1:
+            oldest = segments.pop(0)
+            for path in (oldest, _index_path(oldest)):
+                try:
+                    size -= os.path.getsize(path)
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self.segments_deleted += 1
+            logger.debug(f"Deleted {oldest} to keep the archive below {self.max_bytes} bytes")
+
+    def close(self):
+        self.flush()
+
+
+class ArchiveReader(object):
+    """Reads the records of an archive, optionally of a time range only"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __repr__(self):
+        return f"ArchiveReader(directory={self.directory})"
+
+    def _index(self, segment: str) -> List[Tuple[float, int, int]]:
+        try:
+            with open(_index_path(segment), "rb") as f:
+                content = f.read()
+            size = os.path.getsize(segment)
+        except FileNotFoundError:
+            return []
+        # A crash can leave a partial entry at the end, and an entry for a record that was not completely written
+        content = content[:len(content) - len(content) % INDEX_ENTRY.size]
+        return [entry for entry in INDEX_ENTRY.iter_unpack(content) if entry[1] + entry[2] <= size]
+
+    def _segments_between(self, start: Optional[float], end: Optional[float]) -> List[str]:
+        segments = _segments(self.directory)
+        starts = [_segment_start(segment) for segment in segments]
+        # The last segment that starts before the range may hold its first records
+        first = max(0, bisect.bisect_right(starts, start) - 1) if start is not None else 0
+        last = bisect.bisect_right(starts, end) if end is not None else len(segments)
+        return segments[first:last]
+
+    def index(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[str, float, int, int]]:
+        """The segment, fetch time, offset and length of the records fetched from start up to and including end"""
+        entries = []
+        for segment in self._segments_between(start, end):
+            for fetched_at, offset, length in self._index(segment):
+                if (start is None or fetched_at >= start) and (end is None or fetched_at <= end):
+                    entries.append((segment, fetched_at, offset, length))
+        return entries
+
+    def records(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[ArchiveRecord]:
+        """The decompressed records fetched from start up to and including end, oldest first
+
+        The segments are memory-mapped, so the compressed records are decompressed straight from the page cache.
+        """
+        for segment, entries in itertools.groupby(self.index(start, end), key=operator.itemgetter(0)):
+            with open(segment, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for _, fetched_at, offset, length in entries:
+                        yield ArchiveRecord(fetched_at, zlib.decompress(view[offset:offset + length]))
+
+    def __len__(self):
+        return len(self.index())
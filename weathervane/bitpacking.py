@@ -0,0 +1,201 @@
+import logging
+from random import randint
+from typing import NamedTuple, Sequence
+
+logger = logging.getLogger(__name__)
+
+WIND_DIRECTIONS = {
+    "N": 0x00,
+    "NNO": 0x01,
+    "NO": 0x02,
+    "ONO": 0x03,
+    "O": 0x04,
+    "OZO": 0x05,
+    "ZO": 0x06,
+    "ZZO": 0x07,
+    "Z": 0x08,
+    "ZZW": 0x09,
+    "ZW": 0x0A,
+    "WZW": 0x0B,
+    "W": 0x0C,
+    "WNW": 0x0D,
+    "NW": 0x0E,
+    "NNW": 0x0F,
+}
+COMPASS_POINTS = {code: direction for direction, code in WIND_DIRECTIONS.items()}
+
+# Decoded values are rounded to hide floating point noise such as -39.9 + 3 * 0.1 = -39.60000000000001
+DECODE_PRECISION = 9
+
+NUMERIC = 0
+RANDOM = 1
+WIND_DIRECTION = 2
+PRECIPITATION = 3
+
+FIELD_KINDS = {"winddirection": WIND_DIRECTION, "precipitation": PRECIPITATION, "random": RANDOM}
+
+
+class FieldSpec(NamedTuple):
+    """A single field of the [Bit Packing] layout with all numbers already parsed"""
+    key: str
+    kind: int
+    length: int
+    shift: int
+    mask: int
+    min: float
+    max: float
+    step: float
+
+
+class BitPackingPlan(object):
+    """The [Bit Packing] layout, compiled once into shifts and masks
+
+    The layout as produced by WeathervaneConfigParser.parse_bit_packing_section contains strings only. Parsing these for
+    every frame is wasteful, so the plan converts them once and packs the fields with integer shifts into a single
+    integer, which is then written into a buffer of known size.
+
+    The byte layout matches the original string based encoder exactly: the fields are concatenated most significant bit
+    first and cut into bytes. If the total amount of bits is not a multiple of 8, the remaining bits end up
+    right-aligned in the last byte.
+    """
+
+    def __init__(self, bits: Sequence[dict]):
+        total_length = sum(int(field.get("length", 0)) for field in bits)
+        fields = []
+        offset = total_length
+        for field in bits:
+            length = int(field.get("length", 0))
+            offset -= length
+            fields.append(
+                FieldSpec(
+                    key=field["key"],
+                    kind=FIELD_KINDS.get(field["key"], NUMERIC),
+                    length=length,
+                    shift=offset,
+                    mask=(1 << length) - 1,
+                    min=float(field.get("min", 0)),
+                    max=float(field.get("max", 255)),
+                    step=float(field.get("step", 1)),
+                )
+            )
+        self.fields = tuple(fields)
+        self.bit_length = total_length
+        self.byte_length = (total_length + 7) // 8
+        self.full_bytes = total_length // 8
+        self.tail_bits = total_length % 8
+        self.tail_mask = (1 << self.tail_bits) - 1
+        self._head = slice(0, self.full_bytes)
+        self.keys = tuple(field.key for field in self.fields)
+        self._masks_and_shifts = tuple((field.mask, field.shift) for field in self.fields)
+        self._windspeed_index = self._index_of("windspeed")
+        self._windgusts_index = self._index_of("windgusts")
+
+    def __repr__(self):
+        return f"BitPackingPlan(fields={len(self.fields)}, bits={self.bit_length}, bytes={self.byte_length})"
+
+    def _index_of(self, key):
+        indices = [i for i, field in enumerate(self.fields) if field.key == key]
+        return indices[-1] if indices else None
+
+    def quantized_values(self, weather_data) -> list:
+        """Quantize the weather data into one unsigned integer per field, in layout order"""
+        values = []
+        append = values.append
+        get = weather_data.get
+        # A StationMeasurement keeps the wind direction as its code already
+        has_wind_direction_code = hasattr(type(weather_data), "wind_direction_code")
+        for key, kind, _, _, mask, min_value, max_value, step_value in self.fields:
+            if kind <= RANDOM:
+                value = get(key, 0) if kind == NUMERIC else randint(0, mask)
+                value = min(max(value, min_value), max_value)
+                try:
+                    append(int((value - min_value) / step_value))
+                except TypeError:
+                    logger.debug(f"Value {value} for {key} is not a number")
+                    append(0)
+            elif kind == WIND_DIRECTION:
+                if has_wind_direction_code:
+                    append(weather_data.wind_direction_code or 0)
+                else:
+                    append(WIND_DIRECTIONS.get(get(key, 0), 0))
+            else:
+                value = get(key, 0)
+                append(1 if value and value > 0 else 0)
+
+        windspeed_index, windgusts_index = self._windspeed_index, self._windgusts_index
+        if windspeed_index is not None and windgusts_index is not None:
+            if values[windspeed_index] > values[windgusts_index]:
+                logger.debug(f"Wind speed {values[windspeed_index]} should not exceed maximum wind speed "
+                             f"{values[windgusts_index]}")
+                values[windspeed_index] = values[windgusts_index]
+        return values
+
+    def transmittable_data(self, weather_data) -> dict:
+        """Quantize the weather data into the unsigned integers per field name"""
+        return dict(zip(self.keys, self.quantized_values(weather_data)))
+
+    def pack(self, weather_data) -> int:
+        """Pack the weather data into a single integer of bit_length bits"""
+        packed = 0
+        for value, (mask, shift) in zip(self.quantized_values(weather_data), self._masks_and_shifts):
+            if value > mask:
+                value = mask
+            packed |= value << shift
+        return packed
+
+    def pack_into(self, buffer, weather_data) -> None:
+        """Encode the weather data into an existing, writable buffer of byte_length bytes"""
+        self._write_packed(buffer, self.pack(weather_data))
+
+    def _write_packed(self, buffer, packed: int) -> None:
+        if self.tail_bits:
+            buffer[self._head] = (packed >> self.tail_bits).to_bytes(self.full_bytes, "big")
+            buffer[self.full_bytes] = packed & self.tail_mask
+        else:
+            buffer[self._head] = packed.to_bytes(self.full_bytes, "big")
+
+    def encode(self, weather_data) -> bytearray:
+        data_bytes = bytearray(self.byte_length)
+        self.pack_into(data_bytes, weather_data)
+        return data_bytes
+
+    def mask_of(self, keys) -> bytes:
+        """A frame in which all bits of the given fields are set, e.g. to ignore them when comparing frames"""
+        packed = 0
+        for field in self.fields:
+            if field.key in keys:
+                packed |= field.mask << field.shift
+        mask = bytearray(self.byte_length)
+        self._write_packed(mask, packed)
+        return bytes(mask)
+
+    def unpack(self, frame) -> int:
+        """Convert a frame back into the integer that was packed, the inverse of pack_into"""
+        if len(frame) != self.byte_length:
+            raise ValueError(f"Frame of {len(frame)} bytes does not match layout of {self.byte_length} bytes")
+        if self.tail_bits:
+            head = int.from_bytes(frame[:self.full_bytes], "big")
+            return (head << self.tail_bits) | (frame[self.full_bytes] & self.tail_mask)
+        return int.from_bytes(frame, "big")
+
+    def decode_raw(self, frame) -> dict:
+        """Extract the transmitted unsigned integer of every field from a frame"""
+        packed = self.unpack(frame)
+        return {key: (packed >> shift) & mask for key, (mask, shift) in zip(self.keys, self._masks_and_shifts)}
+
+    def decode(self, frame) -> dict:
+        """Convert a frame back into weather data, as far as the quantization allows
+
+        Numeric fields are restored to min + value * step, the wind direction is restored to its compass notation.
+        """
+        packed = self.unpack(frame)
+        weather_data = {}
+        for key, kind, _, shift, mask, min_value, _, step_value in self.fields:
+            value = (packed >> shift) & mask
+            if kind == WIND_DIRECTION:
+                weather_data[key] = COMPASS_POINTS.get(value, "N")
+            elif kind == PRECIPITATION:
+                weather_data[key] = value
+            else:
+                weather_data[key] = round(min_value + value * step_value, DECODE_PRECISION)
+        return weather_data
@@ -1,14 +1,43 @@
 import asyncio
+import hashlib
+import json
 import logging
+import random
 import subprocess
 import sys
 import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence
 
 import httpx  # Ensure this is imported for RequestError
 
-from weathervane.parser import BuienradarParser
+from weathervane.archive import DEFAULT_MAX_BYTES, ArchiveReader, ArchiveWriter
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.fetcher import PhaseTimings
+from weathervane.parser import (
+    DEFAULT_FALLBACK_DISTANCE,
+    DEFAULT_NEIGHBOURS,
+    DEFAULT_SNAPSHOT_INTERVAL,
+    BuienradarParser,
+    InvalidConfigException,
+    is_weather_data_stale,
+    normalize_snapshot,
+    required_fields,
+)
+from weathervane.polling import PollingPolicy
+from weathervane.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay
+from weathervane.snapshot import SnapshotCache
+from weathervane.streaming import StationExtractor, select_stations
+from weathervane.timeseries import TimeSeriesStore
+from weathervane.verify import synthetic_weather_data
 
 HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
+
+BUIENRADAR_URL = "https://data.buienradar.nl/2.0/feed/json"
+# The feed is polled every few minutes, so idle connections are kept much longer than the default of 5 seconds. A
+# connection that the server closed in the meantime is detected and replaced by httpx.
+KEEPALIVE_EXPIRY = 15 * 60
 
 DEFAULT_WEATHER_DATA = {
     "error": True,
@@ -28,27 +57,330 @@ DEFAULT_WEATHER_DATA = {
 
 logger = logging.getLogger(__name__)
 
+# Returned instead of the feed when it has not changed since the previous fetch
+NOT_MODIFIED = object()
+
+DATA_SOURCES = {}
+# Providers that the configuration mentions, but that are not available yet
+PLANNED_DATA_SOURCES = ("knmi", "rijkswaterstaat")
+
+# Weight of the latest fetch in the moving averages of the latency and health of a provider
+HEALTH_WEIGHT = 0.2
+
+
+def register_data_source(name: str):
+    """Class decorator that makes a data source available as `source=name` in the configuration"""
+
+    def register(cls):
+        cls.name = name
+        DATA_SOURCES[name] = cls
+        return cls
+
+    return register
 
-class BuienRadarDataSource:
 
-    def __init__(self, queue, stations, bits):
+class DataSource(object):
+    """Gets weather data from a provider and puts it in the queue
+
+    Subclasses implement retrieve(), which returns a single normalized snapshot (see parser.SNAPSHOT_SCHEMA) or raises,
+    and from_configuration(). The main loop calls fetch_weather_data() every collection interval, which never raises:
+    if retrieving fails, the default weather data is queued instead.
+    """
+    name = None
+    # A paced data source waits in retrieve() until its next snapshot is due, so its fetches have no deadline
+    paced = False
+
+    def __init__(self, queue, bits=(), snapshot_file=None, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL,
+                 polling: PollingPolicy = None):
         self.queue = queue
-        self.bp = BuienradarParser(stations=stations, bits=bits)
+        self.snapshots = SnapshotCache(snapshot_file, BitPackingPlan(bits), snapshot_interval) if snapshot_file else None
+        self.polling = polling or PollingPolicy()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
+
+    @classmethod
+    def from_configuration(cls, queue, configuration: dict) -> "DataSource":
+        raise NotImplementedError
+
+    async def retrieve(self) -> dict:
+        raise NotImplementedError
+
+    async def fetch_weather_data(self):
+        try:
+            wd = await self.retrieve()
+        except Exception as e:
+            logger.error(f"Fetching weather data from {self.name} failed: {e}. Setting default weather data.")
+            wd = DEFAULT_WEATHER_DATA
+        await self.publish(wd)
+
+    async def publish(self, wd: dict):
+        """Put the weather data in the queue, and keep it as snapshot if it is good"""
+        self.polling.observe(wd)
+        if self.snapshots and not wd["error"]:
+            await asyncio.to_thread(self.snapshots.save, wd)
+        await self.queue.put(wd)
+
+    async def aclose(self):
+        if self.snapshots:
+            await asyncio.to_thread(self.snapshots.flush)
+
+
+@register_data_source("buienradar")
+class BuienRadarDataSource(DataSource):
+
+    def __init__(
+            self,
+            queue,
+            stations,
+            bits,
+            url=BUIENRADAR_URL,
+            verify=True,
+            http2=False,
+            streaming=False,
+            snapshot_file=None,
+            snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL,
+            hedging=True,
+            polling=None,
+            archive: ArchiveWriter = None,
+            archive_whole_feed=False,
+            history: TimeSeriesStore = None,
+            max_distance=DEFAULT_FALLBACK_DISTANCE,
+            interpolate_at=None,
+            neighbours=DEFAULT_NEIGHBOURS,
+            fields=None,
+    ):
+        """
+        @param bits: the layout of the frame of the snapshot
+        @param fields: the fields to fill in from the secondary stations, those of all displays; defaults to bits
+        """
+        super().__init__(queue, bits, snapshot_file, snapshot_interval, polling)
+        self.bp = BuienradarParser(
+            stations=stations, bits=fields or bits, history=history, max_distance=max_distance,
+            interpolate_at=interpolate_at, neighbours=neighbours,
+        )
+        self.url = url
+        self.verify = verify
+        self.http2 = http2
+        self.streaming = streaming
+        self.hedging = hedging
+        self.archive = archive
+        self.archive_whole_feed = archive_whole_feed
+        # A data source has a single endpoint, so it keeps the latency and the circuit breaker of that endpoint
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self.rng = random.Random()
+        self.hedges = 0
+        self.hedges_won = 0
+        self.client = None
+        self.clients_created = 0
+        self.timings = PhaseTimings()
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.last_weather_data = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __repr__(self):
+        return f"BuienRadarDataSource(url={self.url}, stations={self.bp.stations})"
+
+    @classmethod
+    def from_configuration(cls, queue, configuration: dict) -> "BuienRadarDataSource":
+        archive_dir = configuration.get("archive_dir")
+        return cls(
+            queue,
+            configuration.get("stations"),
+            configuration.get("bits"),
+            streaming=configuration.get("streaming", False),
+            snapshot_file=configuration.get("snapshot_file"),
+            snapshot_interval=configuration.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL),
+            polling=PollingPolicy.from_configuration(configuration),
+            archive=ArchiveWriter(
+                archive_dir, configuration.get("archive_max_bytes", DEFAULT_MAX_BYTES)
+            ) if archive_dir else None,
+            archive_whole_feed=configuration.get("archive_whole_feed", False),
+            history=TimeSeriesStore.from_configuration(configuration),
+            max_distance=configuration.get("fallback_max_distance", DEFAULT_FALLBACK_DISTANCE),
+            interpolate_at=configuration.get("interpolate_at"),
+            neighbours=configuration.get("interpolate_neighbours", DEFAULT_NEIGHBOURS),
+            fields=required_fields(configuration),
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """The long-lived client, which keeps the connection to the server open between fetches"""
+        if self.client is None:
+            limits = httpx.Limits(max_connections=2, max_keepalive_connections=1, keepalive_expiry=KEEPALIVE_EXPIRY)
+            try:
+                self.client = httpx.AsyncClient(http2=self.http2, verify=self.verify, limits=limits)
+            except ImportError:
+                logger.warning("HTTP/2 requires the h2 package (pip install httpx[http2]); falling back to HTTP/1.1")
+                self.http2 = False
+                self.client = httpx.AsyncClient(verify=self.verify, limits=limits)
+            self.clients_created += 1
+        return self.client
+
+    async def _discard_client(self):
+        """Close the client after a connection-level failure, so the next attempt starts with a fresh connection"""
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"Closing the HTTP client failed: {e}")
+
+    async def aclose(self):
+        await self._discard_client()
+        if self.archive:
+            await asyncio.to_thread(self.archive.close)
+        if self.bp.history:
+            await asyncio.to_thread(self.bp.history.close)
+        await super().aclose()
+
+    def _conditional_headers(self) -> dict:
+        if self.last_weather_data is None:
+            return {}
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def _is_unchanged(self, r, content_hash: bytes) -> bool:
+        """Remember the validators and the hash of the feed, and whether it is the same as the previous one
+
+        Not every server supports validators, so the hash of the content catches a feed that did not change as well.
+        """
+        self.etag = r.headers.get("ETag")
+        self.last_modified = r.headers.get("Last-Modified")
+        unchanged = content_hash == self.content_hash and self.last_weather_data is not None
+        self.content_hash = content_hash
+        return unchanged
+
+    def _forget_feed(self):
+        self.etag = self.last_modified = self.content_hash = self.last_weather_data = None
 
     @staticmethod
-    async def __get_weather() -> dict:
+    def _content_hash(content: bytes = b""):
+        return hashlib.blake2b(content, digest_size=16)
+
+    async def _get(self, client: httpx.AsyncClient, timeout: float, timings: PhaseTimings):
+        """Get the feed at once
+
+        @return: the response, the hash of its content, the decoded feed and the content
+        """
+        r = await client.get(
+            self.url, timeout=timeout, headers=self._conditional_headers(), extensions={"trace": timings.trace}
+        )
+        if r.status_code != HTTP_OK:
+            return r, None, None, None
+        return r, self._content_hash(r.content).digest(), r.json, r.content
+
+    async def _stream(self, client: httpx.AsyncClient, timeout: float, timings: PhaseTimings):
+        """Get the feed, extracting the configured stations from the bytes as they arrive
+
+        @return: the response, the hash of its content, the extracted part of the feed and the content if the whole
+            feed is archived
+        """
+        extractor = StationExtractor(self.bp.stations, keep=self.bp.is_nearby)
+        content_hash = self._content_hash()
+        content = bytearray() if self.archive and self.archive_whole_feed else None
+        async with client.stream(
+                "GET", self.url, timeout=timeout, headers=self._conditional_headers(),
+                extensions={"trace": timings.trace}
+        ) as r:
+            if r.status_code != HTTP_OK:
+                return r, None, None, None
+            with timings.measure("extract"):
+                async for chunk in r.aiter_bytes():
+                    content_hash.update(chunk)
+                    extractor.feed(chunk)
+                    if content is not None:
+                        content += chunk
+        return r, content_hash.digest(), extractor.close, content
+
+    async def _archive_feed(self, data: dict, content: Optional[bytes]):
+        """Append the feed, or only the configured stations, to the archive"""
+        if not self.archive_whole_feed:
+            selected = select_stations(data, self.bp.stations, keep=self.bp.is_nearby)
+            content = json.dumps(selected, separators=(",", ":")).encode()
+        try:
+            await asyncio.to_thread(self.archive.append, bytes(content))
+        except Exception as e:
+            logger.warning(f"Could not archive the feed: {e}")
+
+    async def _request(self, client: httpx.AsyncClient, timeout: float, timings: PhaseTimings):
+        start = time.monotonic()
+        fetch = self._stream if self.streaming else self._get
+        result = await fetch(client, timeout, timings)
+        if result[0].status_code in (HTTP_OK, HTTP_NOT_MODIFIED):
+            self.latency.add(time.monotonic() - start)
+        return result
+
+    async def _hedged_request(self, client: httpx.AsyncClient):
+        """Request the feed, and request it again if the first request is slower than nearly all recent ones
+
+        The first response wins and the other request is cancelled. Cancelled requests are not added to the latency,
+        so a stalled connection does not push the moment of hedging up.
+        """
+        timeout = self.latency.timeout()
+        hedge_delay = self.latency.hedge_delay() if self.hedging else None
+        first = asyncio.create_task(self._request(client, timeout, self.timings))
+        requests = {first: self.timings}
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if not done:
+                logger.info(f"No response after {hedge_delay * 1000:.0f} ms, sending a hedged request")
+                self.hedges += 1
+                timings = PhaseTimings()
+                requests[asyncio.create_task(self._request(client, timeout, timings))] = timings
+
+            pending = set(requests)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for request in done:
+                    if request.exception() is not None:
+                        error = error or request.exception()
+                        continue
+                    if request is not first:
+                        self.hedges_won += 1
+                        self.timings = requests[request]
+                    return request.result()
+            raise error
+        finally:
+            for request in requests:
+                request.cancel()
+            await asyncio.gather(*requests, return_exceptions=True)
+
+    async def __get_weather(self):
+        """Get the feed, or NOT_MODIFIED if it is the same as the previous time"""
         max_retries = 3
-        retry_delay_seconds = 10
 
         for attempt in range(max_retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Buienradar failed {self.breaker.failures} times in a row; not trying for now")
             try:
-                async with httpx.AsyncClient() as client:
-                    r = await client.get("https://data.buienradar.nl/2.0/feed/json", timeout=5)
+                client = self._get_client()
+                r, content_hash, decode, content = await self._hedged_request(client)
 
-                if r.status_code == HTTP_OK:
+                if r.status_code in (HTTP_OK, HTTP_NOT_MODIFIED):
+                    self.breaker.record_success()
+                if r.status_code == HTTP_NOT_MODIFIED:
+                    logger.info(f"Weather data not modified according to the server, checked in "
+                                f"{r.elapsed.total_seconds() * 1000:.0f} ms on attempt {attempt + 1}")
+                    return NOT_MODIFIED
+                elif r.status_code == HTTP_OK:
                     logger.info(
                         f"Weather data retrieved in {r.elapsed.total_seconds() * 1000:.0f} ms on attempt {attempt + 1}")
-                    return r.json()
+                    if self._is_unchanged(r, content_hash):
+                        logger.info("Weather data has the same content as the previous time")
+                        return NOT_MODIFIED
+                    data = decode()
+                    if self.archive:
+                        await self._archive_feed(data, content)
+                    return data
                 else:
                     logger.warning(
                         f"Attempt {attempt + 1}/{max_retries + 1}: "
@@ -60,11 +392,15 @@ class BuienRadarDataSource:
             except httpx.RequestError as e:
                 logger.warning(f"Attempt {attempt + 1}/{max_retries + 1}: RequestError connecting to Buienradar: {e}")
                 last_exception = e
+                if isinstance(e, httpx.TransportError):
+                    await self._discard_client()
             except ConnectionError as e:
                 last_exception = e  # Ensure last_exception is updated
+            self.breaker.record_failure()
 
             if attempt < max_retries:
-                logger.info(f"Waiting {retry_delay_seconds} seconds before retrying...")
+                retry_delay_seconds = backoff_delay(attempt, self.rng)
+                logger.info(f"Waiting {retry_delay_seconds:.1f} seconds before retrying...")
                 await asyncio.sleep(retry_delay_seconds)
             elif last_exception:  # If it's the last attempt and an exception occurred
                 logger.error(f"All {max_retries + 1} attempts to connect to Buienradar failed.")
@@ -119,8 +455,12 @@ class BuienRadarDataSource:
 
     async def fetch_weather_data(self):
         data = None
+        self.timings = PhaseTimings()
         try:
             data = await self.__get_weather()
+        except CircuitOpenError as e:
+            # Buienradar failed very recently and the recovery below has already been tried
+            logger.warning(f"Not fetching weather data: {e}")
         except (httpx.RequestError, ConnectionError) as e:
             logger.warning(f"Initial attempts to fetch weather data failed: {e}. Attempting WiFi reset.")
 
@@ -129,6 +469,9 @@ class BuienRadarDataSource:
 
             if wifi_reset_success:
                 logger.info("WiFi reset seemed successful. Attempting to fetch weather data one more time.")
+                await self._discard_client()
+                # The failures before the reset say nothing about the new connection
+                self.breaker.reset()
                 try:
                     data = await self.__get_weather()  # One more try
                 except (httpx.RequestError, ConnectionError) as e_after_reset:
@@ -171,7 +514,7 @@ class BuienRadarDataSource:
         # 2. Reboot command failed to dispatch, and data was set to None.
         if data:
             try:
-                wd = self.bp.parse(data)
+                wd = self._weather_data(data)
             except Exception as e_parse:  # Broader exception catch for parsing issues
                 logger.error(f"Data parsing failed: {e_parse}. Setting error.")
                 wd = DEFAULT_WEATHER_DATA
@@ -183,5 +526,323 @@ class BuienRadarDataSource:
                 "Setting default weather data as a last resort after other recovery attempts (including reboot dispatch failure).")
             wd = DEFAULT_WEATHER_DATA
 
-        await self.queue.put(wd)
+        await self.publish(wd)
+
+    async def retrieve(self) -> dict:
+        """Get and parse the feed once, without the WiFi reset and reboot of fetch_weather_data"""
+        self.timings = PhaseTimings()
+        return self._weather_data(await self.__get_weather())
+
+    def _weather_data(self, data) -> dict:
+        """Parse the feed, or reuse the previous weather data if the feed did not change"""
+        if data is NOT_MODIFIED:
+            self.cache_hits += 1
+            logger.info(f"Weather data unchanged, parsing skipped (hits: {self.cache_hits}, misses: "
+                        f"{self.cache_misses}): {self.timings}")
+            return self._cached_weather_data()
+
+        self.cache_misses += 1
+        try:
+            with self.timings.measure("parse"):
+                wd = self.bp.parse(data)
+        except Exception:
+            self._forget_feed()
+            raise
+        self.last_weather_data = wd
+        logger.info(f"Weather data fetched: {self.timings}")
+        return wd
+
+    def _cached_weather_data(self) -> dict:
+        """The weather data of the previous fetch, which may have become stale in the meantime"""
+        wd = dict(self.last_weather_data)
+        if not wd["error"]:
+            wd["error"] = is_weather_data_stale(wd["timestamp"], datetime.now())
+        return wd
+
+
+
+@register_data_source("test")
+class TestDataSource(DataSource):
+    """Synthetic weather data that covers the range of every field of the layout, without any network access
+
+    @param delay: seconds it takes to retrieve the weather data
+    @param seed: seed of the random weather data, for reproducible tests
+    @param fields: the fields to synthesize, those of all displays; defaults to bits
+    """
+    __test__ = False
+
+    def __init__(self, queue, bits, delay=0.0, seed=None, snapshot_file=None,
+                 snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, polling=None, fields=None):
+        super().__init__(queue, bits, snapshot_file, snapshot_interval, polling)
+        self.plan = BitPackingPlan(fields or bits)
+        self.delay = delay
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_configuration(cls, queue, configuration: dict) -> "TestDataSource":
+        return cls(
+            queue,
+            configuration.get("bits"),
+            snapshot_file=configuration.get("snapshot_file"),
+            snapshot_interval=configuration.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL),
+            polling=PollingPolicy.from_configuration(configuration),
+            fields=required_fields(configuration),
+        )
+
+    async def retrieve(self) -> dict:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        wd = next(synthetic_weather_data(self.plan, 1, self.rng))
+        wd.update(
+            error=False,
+            timestamp=datetime.now().replace(microsecond=0).isoformat(),
+            stationname="Test",
+            data_from_fallback=False,
+        )
+        return normalize_snapshot(wd, self.name)
+
+
+@register_data_source("replay")
+class ReplayDataSource(DataSource):
+    """Replays the feeds in an archive, as if they were fetched again
+
+    Every retrieve() returns the next recorded feed, parsed by BuienradarParser. Whether it is stale is judged by the
+    time it was fetched, not by the current time. The replay keeps the time between the recorded fetches, divided by
+    `speedup`; a speedup of 0 replays as fast as possible. The time spent reading, decoding and parsing is kept in
+    `timings`.
+
+    @param start: replay the feeds fetched from this time on (seconds since the epoch)
+    @param end: replay the feeds fetched up to this time
+    @param repeat: start again at the first feed after the last one, instead of raising EOFError
+    @param fields: the fields to fill in from the secondary stations, those of all displays; defaults to bits
+    """
+    paced = True
+
+    def __init__(self, queue, stations, bits, archive_dir, speedup=1.0, start=None, end=None, repeat=False,
+                 snapshot_file=None, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, polling=None,
+                 history: TimeSeriesStore = None, max_distance=DEFAULT_FALLBACK_DISTANCE, interpolate_at=None,
+                 neighbours=DEFAULT_NEIGHBOURS, fields=None):
+        super().__init__(queue, bits, snapshot_file, snapshot_interval, polling)
+        self.bp = BuienradarParser(
+            stations=stations, bits=fields or bits, history=history, max_distance=max_distance,
+            interpolate_at=interpolate_at, neighbours=neighbours,
+        )
+        self.reader = ArchiveReader(archive_dir)
+        self.speedup = speedup
+        self.start = start
+        self.end = end
+        self.repeat = repeat
+        self.timings = PhaseTimings()
+        self.replayed = 0
+        self.fetched_at: Optional[float] = None
+        self._records = None
+        self._replayed_at: Optional[float] = None
+
+    def __repr__(self):
+        return f"ReplayDataSource(archive={self.reader.directory}, speedup={self.speedup}, replayed={self.replayed})"
+
+    @classmethod
+    def from_configuration(cls, queue, configuration: dict) -> "ReplayDataSource":
+        if not configuration.get("archive_dir"):
+            raise InvalidConfigException("The replay data source requires archive_dir")
+        return cls(
+            queue,
+            configuration.get("stations"),
+            configuration.get("bits"),
+            configuration["archive_dir"],
+            speedup=configuration.get("replay_speedup", 1.0),
+            snapshot_file=configuration.get("snapshot_file"),
+            snapshot_interval=configuration.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL),
+            polling=PollingPolicy.from_configuration(configuration),
+            history=TimeSeriesStore.from_configuration(configuration, persistent=False),
+            max_distance=configuration.get("fallback_max_distance", DEFAULT_FALLBACK_DISTANCE),
+            interpolate_at=configuration.get("interpolate_at"),
+            neighbours=configuration.get("interpolate_neighbours", DEFAULT_NEIGHBOURS),
+            fields=required_fields(configuration),
+        )
+
+    def _next_record(self):
+        if self._records is None:
+            self._records = self.reader.records(self.start, self.end)
+        record = next(self._records, None)
+        if record is None and self.repeat and self.replayed:
+            self._records = self.reader.records(self.start, self.end)
+            self.fetched_at = None
+            record = next(self._records, None)
+        if record is None:
+            raise EOFError(f"No more feeds to replay in {self.reader.directory}")
+        return record
+
+    async def _wait_for(self, fetched_at: float):
+        """Keep the recorded time between the fetches, divided by the speedup
+
+        The feed counts as replayed at the time it is due before the wait, so if the wait is cancelled, the next feed
+        is not kept waiting for this one as well.
+        """
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        if self.speedup > 0 and self.fetched_at is not None:
+            due = max(due, self._replayed_at + (fetched_at - self.fetched_at) / self.speedup)
+        self.fetched_at, self._replayed_at = fetched_at, due
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def retrieve(self) -> dict:
+        with self.timings.measure("read"):
+            record = self._next_record()
+        await self._wait_for(record.fetched_at)
+        with self.timings.measure("decode"):
+            data = json.loads(record.data)
+        with self.timings.measure("parse"):
+            wd = self.bp.parse(data, now=datetime.fromtimestamp(record.fetched_at))
+        wd["source"] = self.name
+        self.replayed += 1
+        return wd
+
+    async def run(self):
+        """Publish all feeds of the archive, and None after the last one"""
+        while True:
+            try:
+                wd = await self.retrieve()
+            except EOFError:
+                break
+            await self.publish(wd)
+        await self.queue.put(None)
+
+
+class ProviderHealth(object):
+    """Latency and health of one provider of a composite data source
+
+    Both are exponentially weighted moving averages: the latency of the successful fetches in seconds, and the health as
+    the fraction of fetches that returned valid, fresh weather data. Fetches that were cancelled because another
+    provider won do not count.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.wins = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.latency: Optional[float] = None
+        self.health = 1.0
+
+    def __repr__(self):
+        latency = f"{self.latency * 1000:.0f} ms" if self.latency is not None else "unknown"
+        return (f"ProviderHealth(name={self.name}, health={self.health:.2f}, latency={latency}, wins={self.wins}, "
+                f"failures={self.failures}, cancelled={self.cancelled})")
+
+    def record_success(self, latency: float, won: bool):
+        self.wins += won
+        self.latency = latency if self.latency is None else self.latency + HEALTH_WEIGHT * (latency - self.latency)
+        self.health += HEALTH_WEIGHT * (1 - self.health)
+
+    def record_failure(self):
+        self.failures += 1
+        self.health -= HEALTH_WEIGHT * self.health
+
+    def record_cancel(self):
+        self.cancelled += 1
+
+
+class CompositeDataSource(DataSource):
+    """Queries several providers at the same time and takes the first valid, fresh weather data
+
+    The other fetches are cancelled as soon as there is a winner. If no provider has valid weather data, the first
+    answer with its error flag set is used, so the display shows the error.
+    """
+    name = "composite"
+
+    def __init__(self, queue, providers: Sequence[DataSource], bits=(), snapshot_file=None,
+                 snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, polling=None):
+        super().__init__(queue, bits, snapshot_file, snapshot_interval, polling)
+        self.providers = list(providers)
+        self.health: Dict[str, ProviderHealth] = {provider.name: ProviderHealth(provider.name) for provider in providers}
+
+    def __repr__(self):
+        return f"CompositeDataSource(providers={[provider.name for provider in self.providers]})"
+
+    async def _timed_retrieve(self, provider: DataSource):
+        start = time.monotonic()
+        wd = await provider.retrieve()
+        return wd, time.monotonic() - start
+
+    async def retrieve(self) -> dict:
+        tasks = {asyncio.create_task(self._timed_retrieve(provider)): provider for provider in self.providers}
+        for provider in self.providers:
+            self.health[provider.name].requests += 1
+        pending = set(tasks)
+        fallback = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # If several providers finish at once, the fastest one wins
+                results = []
+                for task in done:
+                    provider = tasks[task]
+                    try:
+                        wd, latency = task.result()
+                    except Exception as e:
+                        logger.warning(f"Provider {provider.name} failed: {e}")
+                        self.health[provider.name].record_failure()
+                        continue
+                    if wd.get("error"):
+                        logger.warning(f"Provider {provider.name} returned weather data with its error flag set")
+                        self.health[provider.name].record_failure()
+                        fallback = fallback or wd
+                    else:
+                        results.append((latency, provider, wd))
+                results.sort(key=lambda result: result[0])
+                for i, (latency, provider, _) in enumerate(results):
+                    self.health[provider.name].record_success(latency, won=i == 0)
+                if results:
+                    latency, provider, wd = results[0]
+                    logger.info(f"Weather data from {provider.name} in {latency * 1000:.0f} ms")
+                    return wd
+        finally:
+            for task in pending:
+                task.cancel()
+                self.health[tasks[task].name].record_cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if fallback is not None:
+            return fallback
+        raise ConnectionError(f"None of the providers {', '.join(self.health)} returned weather data")
+
+    async def aclose(self):
+        for provider in self.providers:
+            await provider.aclose()
+        await super().aclose()
+
+
+def create_data_source(queue, configuration: dict) -> DataSource:
+    """The data source for the `source` in the configuration
+
+    A comma separated list of sources, such as `buienradar,test`, creates a composite data source of those providers.
+    """
+    names = [name.strip().lower() for name in configuration.get("source", "buienradar").split(",") if name.strip()]
+    if not names:
+        raise InvalidConfigException("No data source configured")
+    if len(names) == 1:
+        return _data_source_class(names[0]).from_configuration(queue, configuration)
+
+    # The composite source queues the weather data and keeps the snapshot, its providers only retrieve
+    provider_configuration = dict(configuration, snapshot_file=None)
+    providers = [_data_source_class(name).from_configuration(None, provider_configuration) for name in names]
+    return CompositeDataSource(
+        queue,
+        providers,
+        configuration.get("bits", ()),
+        snapshot_file=configuration.get("snapshot_file"),
+        snapshot_interval=configuration.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL),
+        polling=PollingPolicy.from_configuration(configuration),
+    )
+
 
+def _data_source_class(name: str):
+    if name in DATA_SOURCES:
+        return DATA_SOURCES[name]
+    if name in PLANNED_DATA_SOURCES:
+        raise InvalidConfigException(f"Data source {name} is not implemented yet")
+    raise InvalidConfigException(f"Unknown data source {name}; choose from {', '.join(sorted(DATA_SOURCES))}")
@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# The httpcore trace events that mark the start and the end of each phase of a request. DNS resolution happens inside
+# connect_tcp, so it is part of the connect phase.
+TRACE_PHASES = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "http11.send_request_headers": "request",
+    "http11.send_request_body": "request",
+    "http11.receive_response_headers": "wait",
+    "http11.receive_response_body": "body",
+    "http2.send_connection_init": "request",
+    "http2.send_request_headers": "request",
+    "http2.send_request_body": "request",
+    "http2.receive_response_headers": "wait",
+    "http2.receive_response_body": "body",
+}
+
+# "extract" is the streaming extraction of the stations, which overlaps with receiving the body
+PHASES = ("connect", "tls", "request", "wait", "body", "extract", "parse")
+
+
+class PhaseTimings(object):
+    """The time spent in each phase of a fetch, summed over all attempts
+
+    Pass `trace` as the trace extension of an httpx request to time the network phases, and use `measure` for the
+    phases around it, such as parsing.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started: Dict[str, float] = {}
+
+    def __repr__(self):
+        return f"PhaseTimings({self})"
+
+    def __str__(self):
+        phases = [phase for phase in PHASES if phase in self.phases]
+        phases += [phase for phase in self.phases if phase not in PHASES]
+        return ", ".join(f"{phase} {self.phases[phase] * 1000:.0f} ms" for phase in phases)
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    async def trace(self, event: str, info: dict):
+        name, _, state = event.rpartition(".")
+        phase = TRACE_PHASES.get(name)
+        if phase is None:
+            return
+        if state == "started":
+            self._started[name] = time.perf_counter()
+        elif name in self._started:
+            self.add(phase, time.perf_counter() - self._started.pop(name))
+
+    @contextlib.contextmanager
+    def measure(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+
+class FetchCoordinator(object):
+    """Runs the fetches of a data source one at a time, each within a deadline
+
+    A fetch can take much longer than a single request: the data source retries, resets the WiFi connection and retries
+    again. Starting another fetch in the meantime only makes two producers compete for the queue, so a new cycle is
+    skipped while the previous one is still in flight. A fetch that exceeds the deadline is cancelled and replaced by the
+    fallback data, so the display shows the error instead of stale data. The fetches of a paced data source, which
+    waits until its next snapshot is due, have no deadline.
+    """
+
+    def __init__(self, data_source, deadline: float, fallback_data: dict):
+        self.data_source = data_source
+        self.deadline = deadline
+        self.fallback_data = fallback_data
+        self.task: Optional[asyncio.Task] = None
+        self.started = 0
+        self.completed = 0
+        self.skipped = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.last_duration: Optional[float] = None
+
+    def __repr__(self):
+        return (f"FetchCoordinator(started={self.started}, completed={self.completed}, skipped={self.skipped}, "
+                f"timed_out={self.timed_out}, failed={self.failed})")
+
+    @property
+    def in_flight(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start a fetch in the background, unless one is still in flight
+
+        @return: the task of the new fetch, or None if this cycle is skipped
+        """
+        if self.in_flight:
+            self.skipped += 1
+            logger.warning("The previous fetch of weather data is still in flight, skipping this cycle")
+            return None
+        self.task = asyncio.create_task(self._run())
+        return self.task
+
+    async def fetch(self):
+        """Start a fetch, or join the one in flight, and wait until it is done"""
+        task = self.task if self.in_flight else self.start()
+        await task
+
+    async def _run(self):
+        self.started += 1
+        start = time.monotonic()
+        try:
+            deadline = None if self.data_source.paced else self.deadline
+            await asyncio.wait_for(self.data_source.fetch_weather_data(), deadline)
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.error(f"Fetching weather data did not finish within {self.deadline} seconds; cancelled")
+            self._publish()
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Fetching weather data failed unexpectedly: {e}")
+            self._publish()
+        finally:
+            self.last_duration = time.monotonic() - start
+
+    def _publish(self):
+        try:
+            self.data_source.queue.put_nowait(self.fallback_data)
+        except asyncio.QueueFull:
+            logger.warning("The queue still holds unprocessed weather data; not adding the fallback data")
+
+    async def aclose(self):
+        """Cancel the fetch in flight, if any, and wait until it has stopped"""
+        if self.in_flight:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+        self.task = None
@@ -1,8 +1,16 @@
+import asyncio
 import logging
+import time
 from unittest.mock import Mock
 
 import spidev
 
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.parser import DEFAULT_KEEP_ALIVE_INTERVAL
+from weathervane.resilience import LatencyTracker
+from weathervane.simulator import SimulatedDisplay
+from weathervane.spiwriter import WHOLE_FRAME, SpiWriter, TransferReport
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,33 +19,164 @@ class GPIO:
         """
         The constructor creates the SPI object which sends the data.
 
-        @param test: if True, then the GPIO pins are not used. Instead, a mock object is used to simulate the GPIO pins.
+        @param test: if True, then the GPIO pins are not used. Instead, the frames are sent to a SimulatedDisplay, and a
+        mock object is used to simulate the GPIO pins.
         @param bus: the bus number. The Raspberry Pi has 2 SPI buses, 0 and 1. Defaults to 0.
         @param device: the device number. The Raspberry Pi can drive 2 SPI devices on each bus, 0 and 1. Defaults to 0.
         @param frequency: the amount of bits per second that are sent over the channel. See also:
         http://raspberrypi.stackexchange.com/questions/699/what-spi-frequencies-does-raspberry-pi-support
+        @param keep_alive_interval: the amount of seconds after which an unchanged frame is sent again. Defaults to 60.
+        @param dont_care: a mask with the bits that are ignored when comparing a frame with the previous one, such as
+        the bits of the random field.
+        @param writer_thread: if True, the frames are sent from a thread of its own that owns the SPI device, see
+        SpiWriter, so send_data does not wait for the transfer. Defaults to False.
+        @param write_only: if True, the frames are sent with writebytes2, which reads the frame from its buffer and does
+        not read anything back, instead of xfer, which converts the frame into a list. Defaults to False.
+        @param bits: the layout with which the simulated display decodes the frames in test mode
+        @param simulator: the keyword arguments of the SimulatedDisplay in test mode, such as bit_error_rate and latency
         """
         self.test = kwargs.get("test", False)
         self.bus = kwargs.get("bus", 0)
         self.device = kwargs.get("device", 0)
         self.frequency = kwargs.get("frequency", 100_000)
-        if not self.test:
-            spi = spidev.SpiDev()
-            spi.open(self.bus, self.device)
-            spi.max_speed_hz = self.frequency
-            self.spi = spi
-        else:
-            self.spi = Mock()
+        self.keep_alive_interval = kwargs.get("keep_alive_interval", DEFAULT_KEEP_ALIVE_INTERVAL)
+        self.write_only = kwargs.get("write_only", False)
+        self.bits = kwargs.get("bits")
+        self.simulator = kwargs.get("simulator") or {}
+        dont_care = kwargs.get("dont_care")
+        self.dont_care = int.from_bytes(dont_care, "big") if dont_care else 0
+        # The bits that are compared, computed once instead of inverting dont_care for every frame
+        self.care = ~self.dont_care
+        self.last_frame = None
+        self._last_frame_view = None
+        self.last_sent_time = None
+        self.frames_sent = 0
+        self.frames_suppressed = 0
+        # The outcome of the transfers of the writer thread
+        self.latency = LatencyTracker()
+        self.transfers = 0
+        self.transfer_errors = 0
+        self.last_error = None
+        if self.test:
             self.read_pin = Mock(return_value=[1, 1])
+        self.writer = None
+        # Opened here even for the writer thread, so a missing device stops the weathervane at startup
+        spi = self.open_spi()
+        if kwargs.get("writer_thread", False):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            self.spi = None
+            self.writer = SpiWriter(
+                spi, self.record_transfer, loop, name=f"spi-writer-{self.bus}.{self.device}",
+                write_only=self.write_only,
+            )
+        else:
+            self.spi = spi
 
     def __repr__(self):
         return f"GPIO(channel={self.bus}, device={self.device}, frequency={self.frequency}), test mode={self.test}"
 
-    def send_data(self, data: bytes) -> None:
+    def open_spi(self):
+        """The SPI device, or a simulation of the display in test mode"""
+        if self.test:
+            plan = BitPackingPlan(self.bits) if self.bits else None
+            return SimulatedDisplay(plan, self.frequency, **self.simulator)
+        spi = spidev.SpiDev()
+        spi.open(self.bus, self.device)
+        spi.max_speed_hz = self.frequency
+        return spi
+
+    def close(self):
+        """Stop the writer thread, if any"""
+        if self.writer is not None:
+            self.writer.close()
+
+    def send_data(self, data: bytes, force: bool = False) -> bool:
         """Send data over the 'wire'
 
-        @param data: an iterable of bytes, such as a bytearray or bytes
+        A frame that is identical to the previous one, apart from the don't care bits, is not sent again, unless the
+        keep alive interval has passed since the last transfer.
+
+        Neither the data nor the frame that it is compared with are copied into new objects, so the caller may pass a
+        buffer that it reuses for every frame.
+
+        @param data: a bytes-like object, such as bytes, a bytearray or a memoryview
+        @param force: if True, the data is always sent
+        @return: True if the data was sent, False if it was suppressed
         """
-        self.spi.xfer(data)
+        now = time.monotonic()
+        if not force and self.is_unchanged(data) and now - self.last_sent_time < self.keep_alive_interval:
+            self.frames_suppressed += 1
+            logger.debug("Frame unchanged; skipped sending data via SPI")
+            return False
+
+        if self.writer is not None:
+            self.writer.put(data)
+        elif self.write_only:
+            self.spi.writebytes2(data)
+        else:
+            self.spi.xfer(data)
+        self.remember(data)
+        self.last_sent_time = now
+        self.frames_sent += 1
         logger.debug("Sent data via SPI")
+        return True
+
+    def record_transfer(self, report: TransferReport):
+        """Keep the outcome of a transfer of the writer thread"""
+        if report.error is not None:
+            self.transfer_errors += 1
+            self.last_error = report.error
+            logger.error(f"Could not send {report.frame.hex()} via SPI: {report.error!r}")
+            return
+        self.transfers += 1
+        self.latency.add(report.latency)
+
+    def stats(self) -> dict:
+        p50, p99 = self.latency.percentile(0.5), self.latency.percentile(0.99)
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_suppressed": self.frames_suppressed,
+            "transfers": self.transfers,
+            "overwrites": self.writer.overwrites if self.writer is not None else 0,
+            "transfer_errors": self.transfer_errors,
+            "latency_p50_ms": p50 * 1000 if p50 is not None else None,
+            "latency_p99_ms": p99 * 1000 if p99 is not None else None,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        latency = (f"latency {stats['latency_p50_ms']:.2f} ms median / {stats['latency_p99_ms']:.2f} ms p99"
+                   if stats["latency_p50_ms"] is not None else "too few transfers for the latency")
+        logger.info(
+            f"SPI {self.bus}.{self.device}: {stats['frames_sent']} frames sent, {stats['frames_suppressed']} "
+            f"suppressed, {stats['transfers']} transferred, {stats['overwrites']} overwritten before the transfer, "
+            f"{stats['transfer_errors']} errors; {latency}"
+        )
+        display = self.writer.spi if self.writer is not None else self.spi
+        if isinstance(display, SimulatedDisplay):
+            logger.info(f"{display}: {display.stats()}")
+
+    def remember(self, data):
+        """Copy the sent frame into last_frame, which is only allocated again if the length of the frames changes"""
+        if self.last_frame is not None and len(self.last_frame) == len(data):
+            # Assigning to a bytearray would copy data into a new bytearray first, a memoryview copies it directly
+            self._last_frame_view[WHOLE_FRAME] = data
+        else:
+            self.last_frame = bytearray(data)
+            self._last_frame_view = memoryview(self.last_frame)
+
+    def is_unchanged(self, data) -> bool:
+        """Whether the data equals the previously sent frame, ignoring the don't care bits"""
+        last_frame = self.last_frame
+        if last_frame is None or len(data) != len(last_frame):
+            return False
+        if last_frame == data:
+            return True
+        if not self.dont_care:
+            return False
+        difference = int.from_bytes(last_frame, "big") ^ int.from_bytes(data, "big")
+        return not difference & self.care
 
@@ -0,0 +1,169 @@
+"""The weather at a location, interpolated from the stations nearest to it with inverse-distance weighting
+
+Every numeric field is the weighted mean of the K nearest stations that have it, with weights of 1 / distance ** POWER.
+The weights only depend on the location of the stations, so they are computed once per set of stations in the feed.
+Interpolating a feed then takes a single matrix-vector product: the rows of the matrix are the fields, its columns the
+stations, and the vector the weights. Missing values are zero in the matrix, and every field has a second row that is 1
+where the value is known, which gives the sum of the weights of the stations that have the field.
+
+The wind direction is an angle, so it is interpolated as the weighted mean of unit vectors instead.
+
+NumPy is an optional dependency; it is only needed when a location is configured.
+"""
+import logging
+import math
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+
+import numpy as np
+
+from weathervane.bitpacking import COMPASS_POINTS, WIND_DIRECTIONS
+from weathervane.spatial import StationIndex
+
+logger = logging.getLogger(__name__)
+
+INTERPOLATED_FIELDS = (
+    "windspeed",
+    "windgusts",
+    "windspeedBft",
+    "airpressure",
+    "temperature",
+    "groundtemperature",
+    "feeltemperature",
+    "humidity",
+    "visibility",
+    "precipitation",
+    "rainFallLastHour",
+    "rainFallLast24Hour",
+    "sunpower",
+)
+# Fields that are whole numbers
+ROUNDED_FIELDS = frozenset(["windspeedBft"])
+POWER = 2
+# A station closer than this is at the location, and its measurements are used as they are
+SAME_LOCATION_KM = 0.01
+# This many times the nearest stations are kept when the feed is streamed, to replace stations that drop out of it
+CANDIDATE_FACTOR = 3
+DEGREES_PER_POINT = 360 / len(COMPASS_POINTS)
+
+
+def wind_direction_degrees(measurements: Mapping) -> Optional[float]:
+    """The wind direction of a station in degrees, from winddirectiondegrees or else from its compass notation"""
+    degrees = measurements.get("winddirectiondegrees")
+    if degrees is not None:
+        try:
+            degrees = float(degrees)
+        except (TypeError, ValueError):
+            degrees = math.nan
+        if not math.isnan(degrees):
+            return degrees
+    code = WIND_DIRECTIONS.get(measurements.get("winddirection"))
+    return None if code is None else code * DEGREES_PER_POINT
+
+
+def _number(value) -> float:
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class InverseDistanceInterpolator(object):
+    """Interpolates the measurements of the feed at a location
+
+    @param lat: the latitude of the location
+    @param lon: the longitude of the location
+    @param neighbours: the amount of nearest stations to interpolate from
+    """
+
+    def __init__(self, lat: float, lon: float, neighbours: int):
+        self.lat = lat
+        self.lon = lon
+        self.neighbours = neighbours
+        self.stations: Tuple[int, ...] = ()
+        self.distances = np.zeros(0)
+        self.weights = np.zeros(0)
+        # The stations that are near enough to replace one of the nearest, see is_candidate
+        self.candidates: Optional[FrozenSet[int]] = None
+        # The location of every station seen in a feed so far, which the candidates are chosen from
+        self.locations: Dict[int, Tuple[float, float]] = {}
+        self.weights_computed = 0
+        self._station_set: Optional[FrozenSet[int]] = None
+
+    def __repr__(self):
+        return f"InverseDistanceInterpolator(lat={self.lat}, lon={self.lon}, stations={self.stations})"
+
+    def is_candidate(self, station: dict) -> bool:
+        """Whether a station of the feed is needed, which is every station until the first feed is interpolated"""
+        return self.candidates is None or station.get("stationid") in self.candidates
+
+    def update_weights(self, measurements: Mapping[int, Mapping]):
+        """Find the nearest stations and their weights, unless the stations in the feed are the same as before"""
+        station_set = frozenset(measurements)
+        if station_set == self._station_set:
+            return
+        self._station_set = station_set
+        index = StationIndex.from_feed(measurements.values())
+        self.update_candidates(index.locations)
+        nearest = index.nearest(self.lat, self.lon, self.neighbours)
+        self.stations = tuple(station for _, station in nearest)
+        self.distances = np.array([distance for distance, _ in nearest])
+        if len(nearest) and nearest[0][0] < SAME_LOCATION_KM:
+            self.weights = np.zeros(len(nearest))
+            self.weights[0] = 1.0
+        else:
+            self.weights = 1 / self.distances ** POWER
+        self.weights_computed += 1
+        logger.debug(f"Interpolating at {self.lat},{self.lon} from stations {self.stations} at "
+                     f"{np.round(self.distances, 1).tolist()} km")
+
+    def update_candidates(self, locations: Mapping[int, Tuple[float, float]]):
+        """Choose the candidates from all stations seen so far, if the feed has stations that were not seen before
+
+        A streamed feed only has the candidates, so choosing them from the stations of the feed would drop a station
+        that missed a single feed for good.
+        """
+        if all(self.locations.get(station) == location for station, location in locations.items()):
+            return
+        self.locations.update(locations)
+        seen = StationIndex((station, lat, lon) for station, (lat, lon) in self.locations.items())
+        nearest = seen.nearest(self.lat, self.lon, self.neighbours * CANDIDATE_FACTOR)
+        self.candidates = frozenset(station for _, station in nearest)
+
+    def interpolate(self, measurements: Mapping[int, Mapping]) -> Dict:
+        """The measurements at the location: the interpolated fields, the other fields of the nearest station
+
+        @raise ValueError: if the feed has no stations with a location
+        """
+        self.update_weights(measurements)
+        if not self.stations:
+            raise ValueError("None of the stations in the feed has a location")
+        stations = [measurements[station] for station in self.stations]
+
+        rows = [[_number(station.get(field)) for station in stations] for field in INTERPOLATED_FIELDS]
+        radians = [wind_direction_degrees(station) for station in stations]
+        radians = [math.nan if degrees is None else math.radians(degrees) for degrees in radians]
+        rows.append([math.sin(angle) for angle in radians])
+        rows.append([math.cos(angle) for angle in radians])
+
+        values = np.array(rows)
+        known = ~np.isnan(values)
+        totals = np.vstack((np.where(known, values, 0.0), known)) @ self.weights
+        sums, weights = totals[:len(rows)], totals[len(rows):]
+
+        weather_data = dict(stations[0])
+        weather_data["lat"] = self.lat
+        weather_data["lon"] = self.lon
+        weather_data["data_from_fallback"] = False
+        for field, total, weight in zip(INTERPOLATED_FIELDS, sums, weights):
+            if weight > 0:
+                value = float(total / weight)
+                weather_data[field] = round(value) if field in ROUNDED_FIELDS else value
+            else:
+                weather_data.pop(field, None)
+        if weights[-1] > 0 and (sums[-2] or sums[-1]):
+            degrees = math.degrees(math.atan2(sums[-2], sums[-1])) % 360
+            weather_data["winddirectiondegrees"] = degrees
+            weather_data["winddirection"] = COMPASS_POINTS[round(degrees / DEGREES_PER_POINT) % len(COMPASS_POINTS)]
+        return weather_data
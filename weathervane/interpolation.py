@@ -0,0 +1,88 @@
+import math
+from typing import Callable, List, Mapping, Optional
+
+NON_INTERPOLATABLE_VARIABLES = frozenset(["error", "winddirection", "rain", "barometric_trend"])
+
+
+def interpolate(old_weatherdata: Optional[Mapping], new_weatherdata: Mapping, percentage: float) -> Mapping:
+    """Linearly interpolate between two snapshots of weather data
+
+    The snapshots are dicts or StationMeasurement records; the interpolated weather data is a dict.
+
+    @param old_weatherdata: the previous snapshot, or None if there is none
+    @param new_weatherdata: the latest snapshot
+    @param percentage: how far along the interpolation is, between 0 (old) and 1 (new)
+    @return: the interpolated weather data
+    """
+    percentage = min(percentage, 1)
+    if new_weatherdata["error"]:
+        return new_weatherdata
+    if not old_weatherdata:
+        return new_weatherdata
+
+    interpolated_wd = {}
+    get = new_weatherdata.get
+
+    for key, old_value in old_weatherdata.items():
+        new_value = get(key, None)
+        if not new_value:
+            interpolated_wd[key] = old_value
+        elif key in NON_INTERPOLATABLE_VARIABLES:
+            interpolated_wd[key] = new_value
+        else:
+            try:
+                old_float = float(old_value)
+                interpolated_wd[key] = old_float + (percentage * (float(new_value) - old_float))
+            except (ValueError, TypeError):
+                interpolated_wd[key] = new_value
+    # A cleared error flag is falsy, but it must not keep the flag of the old snapshot
+    interpolated_wd["error"] = new_weatherdata["error"]
+
+    return interpolated_wd
+
+
+class FrameTable(object):
+    """All frames of the transition from one snapshot to the next, encoded up front
+
+    The frames are spaced `interval` seconds apart, starting at `anchor` (a time.monotonic() timestamp). After the last
+    frame, the table keeps returning the last frame, which is the encoded new snapshot.
+    """
+
+    def __init__(self, frames: List[bytes], anchor: float, interval: float):
+        self.frames = frames
+        self.anchor = anchor
+        self.interval = interval
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        return f"FrameTable(frames={len(self.frames)}, interval={self.interval})"
+
+    @classmethod
+    def build(
+            cls,
+            old_weatherdata: Optional[dict],
+            new_weatherdata: dict,
+            encode: Callable[[dict], bytes],
+            anchor: float,
+            duration: float,
+            interval: float,
+    ) -> "FrameTable":
+        """Interpolate and encode the ramp from the old to the new snapshot over `duration` seconds"""
+        if not old_weatherdata or new_weatherdata["error"] or duration <= 0:
+            return cls([bytes(encode(new_weatherdata))], anchor, interval)
+
+        steps = max(1, math.ceil(duration / interval))
+        frames = [
+            bytes(encode(interpolate(old_weatherdata, new_weatherdata, step * interval / duration)))
+            for step in range(steps + 1)
+        ]
+        return cls(frames, anchor, interval)
+
+    def index_at(self, now: float) -> int:
+        index = int((now - self.anchor) / self.interval)
+        return min(max(index, 0), len(self.frames) - 1)
+
+    def frame_at(self, now: float) -> bytes:
+        return self.frames[self.index_at(now)]
@@ -1,21 +1,206 @@
 import logging
 
+from collections.abc import MutableMapping
 from configparser import ConfigParser
 from datetime import datetime
-from typing import List, Sequence
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from weathervane.bitpacking import COMPASS_POINTS, WIND_DIRECTIONS
+from weathervane.spatial import StationIndex, bounding_box, distance_km, location_of
+from weathervane.timeseries import DEFAULT_HISTORY_FILE, DROPPING, RISING, STABLE, TimeSeriesStore
 
 HOUR_ERROR_LIMIT = 2.0 * 60 * 60
+DEFAULT_KEEP_ALIVE_INTERVAL = 60.0
+DEFAULT_SNAPSHOT_FILE = "weathervane-snapshot.json"
+DEFAULT_SNAPSHOT_INTERVAL = 60.0 * 60
+DEFAULT_ARCHIVE_MAX_MB = 64
+# Kilometers from the primary station within which other stations of the feed can fill in its missing fields; by
+# default only the configured stations do
+DEFAULT_FALLBACK_DISTANCE = 0.0
+# The amount of nearest stations the weather at interpolate_at is interpolated from
+DEFAULT_NEIGHBOURS = 4
+# The amount of frames that the simulated display of test mode keeps
+DEFAULT_SIMULATOR_HISTORY = 1000
 
 SIMPLE_CONFIG = 2
 EXTENDED_CONFIG = 5
+# Every [SPI <name>] section configures another display, with the layout of [Bit Packing <name>] if there is one
+DISPLAY_SECTION_PREFIX = "SPI "
+BIT_PACKING_SECTION = "Bit Packing"
 
 logger = logging.getLogger(__name__)
 
 
+# The fields of a normalized snapshot and their types. Every data source produces snapshots with (a subset of) these
+# fields, converted to these types, plus the name of the data source in "source". Other fields are kept as they are.
+SNAPSHOT_SCHEMA = {
+    "error": bool,
+    "source": str,
+    "timestamp": str,
+    "stationid": int,
+    "stationname": str,
+    "lat": float,
+    "lon": float,
+    "winddirection": str,
+    "winddirectiondegrees": float,
+    "windspeed": float,
+    "windgusts": float,
+    "windspeedBft": int,
+    "airpressure": float,
+    "temperature": float,
+    "groundtemperature": float,
+    "feeltemperature": float,
+    "humidity": float,
+    "visibility": float,
+    "precipitation": float,
+    "rainFallLastHour": float,
+    "rainFallLast24Hour": float,
+    "sunpower": float,
+    "barometric_trend": int,
+    "temperatureMinLast24Hour": float,
+    "temperatureMaxLast24Hour": float,
+    "rainAccumulationLast24Hour": float,
+    "data_from_fallback": bool,
+}
+
+
+_WIND_DIRECTION = "winddirection"
+
+
+class StationMeasurement(MutableMapping):
+    """The measurements of a single station, as a compact record instead of a dict
+
+    Every field of SNAPSHOT_SCHEMA has a slot and is converted to its type when it is set; a missing field is an empty
+    slot. Other fields are kept in a dict that is only created when needed. The wind direction is kept as its code of
+    the bit-packing layout and read as its compass notation, so the record behaves like the dict it replaces.
+    """
+    __slots__ = tuple(SNAPSHOT_SCHEMA) + ("_extra",)
+
+    def __init__(self, fields: Mapping = None):
+        """Copy the fields, ignoring values that cannot be converted to the type of their field"""
+        # The same as setting the fields one by one, without a method call per field
+        extra = None
+        for key, value in (fields or {}).items():
+            kind = SNAPSHOT_SCHEMA.get(key)
+            if kind is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if value is not None and type(value) is not kind:
+                try:
+                    value = kind(value)
+                except (TypeError, ValueError):
+                    logger.warning(f"Value {value!r} of {key} is not a valid {kind.__name__}; ignoring it")
+                    continue
+            if key == _WIND_DIRECTION:
+                value = WIND_DIRECTIONS.get(value, value)
+            setattr(self, key, value)
+        self._extra = extra
+
+    def __repr__(self):
+        return f"StationMeasurement({dict(self)!r})"
+
+    def __getitem__(self, key):
+        if key in SNAPSHOT_SCHEMA:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            if key == _WIND_DIRECTION and type(value) is int:
+                return COMPASS_POINTS[value]
+            return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        # Mapping.get goes through an exception for every missing field
+        if key in SNAPSHOT_SCHEMA:
+            if not hasattr(self, key):
+                return default
+        elif self._extra is None or key not in self._extra:
+            return default
+        return self[key]
+
+    def __setitem__(self, key, value):
+        kind = SNAPSHOT_SCHEMA.get(key)
+        if kind is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if value is not None and type(value) is not kind:
+            value = kind(value)
+        if key == _WIND_DIRECTION:
+            value = WIND_DIRECTIONS.get(value, value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key in SNAPSHOT_SCHEMA:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in SNAPSHOT_SCHEMA:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(hasattr(self, key) for key in SNAPSHOT_SCHEMA) + len(self._extra or ())
+
+    @property
+    def wind_direction_code(self) -> Optional[int]:
+        """The code of the wind direction in the bit-packing layout, or None if it is missing or unknown"""
+        value = getattr(self, _WIND_DIRECTION, None)
+        return value if type(value) is int else None
+
+    def copy(self) -> "StationMeasurement":
+        return StationMeasurement(self)
+
+
 class InvalidConfigException(Exception):
     pass
 
 
+def normalize_snapshot(weather_data: dict, source: str) -> dict:
+    """Convert the fields of the weather data to the types of SNAPSHOT_SCHEMA, in place
+
+    Values that cannot be converted are removed, so they are treated as missing. A StationMeasurement converts its
+    values when they are set, so it only gets its source.
+    """
+    weather_data["source"] = source
+    if isinstance(weather_data, StationMeasurement):
+        return weather_data
+    for key, kind in SNAPSHOT_SCHEMA.items():
+        value = weather_data.get(key)
+        if value is None or type(value) is kind:
+            continue
+        try:
+            weather_data[key] = kind(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Value {value!r} of {key} from {source} is not a valid {kind.__name__}; ignoring it")
+            del weather_data[key]
+    return weather_data
+
+
+def required_fields(configuration: dict) -> List[dict]:
+    """The fields of the layouts of all displays, each key once, to know which fields the parser has to fill in"""
+    fields = {}
+    for display in configuration.get("displays") or [configuration]:
+        for field in display.get("bits") or ():
+            fields.setdefault(field["key"], field)
+    return list(fields.values())
+
+
 class WeathervaneConfigParser(ConfigParser):
     DEFAULT_STATIONS = [6260, 6370]
     KEY_INDEX = 0
@@ -27,13 +212,13 @@ class WeathervaneConfigParser(ConfigParser):
     def __init__(self):
         super(WeathervaneConfigParser, self).__init__()
 
-    def parse_bit_packing_section(self) -> List[dict]:
-        bit_numbers = self.options("Bit Packing")
+    def parse_bit_packing_section(self, section: str = BIT_PACKING_SECTION) -> List[dict]:
+        bit_numbers = self.options(section)
         bit_numbers = sorted([int(n) for n in bit_numbers])
 
         bits = []
         for bit_number in bit_numbers:
-            bit_config = self.get("Bit Packing", str(bit_number))
+            bit_config = self.get(section, str(bit_number))
             bit_config = bit_config.split(",")
             if len(bit_config) == SIMPLE_CONFIG:
                 bits.append({"key": bit_config[self.KEY_INDEX], "length": bit_config[self.LENGTH_INDEX]})
@@ -69,6 +254,64 @@ class WeathervaneConfigParser(ConfigParser):
                 stations.append(station_id)
         return stations
 
+    def parse_location(self) -> Optional[Tuple[float, float]]:
+        """The latitude and longitude of interpolate_at, or None if it is not set"""
+        location = self.get("General", "interpolate_at", fallback="").strip()
+        if not location:
+            return None
+        try:
+            lat, lon = (float(coordinate) for coordinate in location.split(","))
+        except ValueError:
+            raise InvalidConfigException(f"interpolate_at should be a latitude and longitude, not {location}") from None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise InvalidConfigException(f"interpolate_at {location} is not a valid latitude and longitude")
+        return lat, lon
+
+    def parse_display(self, section: str, name: str, bits: List[dict], defaults: dict = None) -> dict:
+        """The SPI device and the layout of a display, with the settings it does not have taken from the defaults"""
+        defaults = defaults or {}
+        channel = self.getint(section, "channel", fallback=defaults.get("channel", 0))
+        return {
+            "name": name,
+            "channel": channel,
+            "bus": channel,
+            "device": self.getint(section, "device", fallback=defaults.get("device", 0)),
+            "frequency": self.getint(section, "frequency", fallback=defaults.get("frequency")),
+            "keep_alive_interval": self.getfloat(
+                section, "keep_alive_interval",
+                fallback=defaults.get("keep_alive_interval", DEFAULT_KEEP_ALIVE_INTERVAL),
+            ),
+            "writer_thread": self.getboolean(section, "writer_thread", fallback=defaults.get("writer_thread", False)),
+            "write_only": self.getboolean(section, "write_only", fallback=defaults.get("write_only", True)),
+            "bits": bits,
+        }
+
+    def parse_displays(self, bits: List[dict]) -> List[dict]:
+        """The displays to drive: the one of [SPI] and [Bit Packing], followed by one per [SPI <name>] section"""
+        display = self.parse_display("SPI", "SPI", bits)
+        displays = [display]
+        for section in self.sections():
+            if not section.startswith(DISPLAY_SECTION_PREFIX):
+                continue
+            name = section[len(DISPLAY_SECTION_PREFIX):].strip()
+            layout = f"{BIT_PACKING_SECTION} {name}"
+            display_bits = self.parse_bit_packing_section(layout) if self.has_section(layout) else bits
+            displays.append(self.parse_display(section, name, display_bits, display))
+        devices = [(display["bus"], display["device"]) for display in displays]
+        if len(set(devices)) != len(devices):
+            raise InvalidConfigException(f"Every display needs a bus and device of its own, not {devices}")
+        return displays
+
+    def parse_simulator(self) -> dict:
+        """The settings of the display that is simulated in test mode, see SimulatedDisplay"""
+        return {
+            "bit_error_rate": self.getfloat("Simulator", "bit_error_rate", fallback=0.0),
+            "latency": self.getfloat("Simulator", "latency", fallback=0.0),
+            "latency_jitter": self.getfloat("Simulator", "latency_jitter", fallback=0.0),
+            "history": self.getint("Simulator", "history", fallback=DEFAULT_SIMULATOR_HISTORY),
+            "realtime": self.getboolean("Simulator", "realtime", fallback=True),
+        }
+
     def parse_config(self):
         """Takes a configuration parser and returns the configuration as a dictionary
 
@@ -77,18 +320,40 @@ class WeathervaneConfigParser(ConfigParser):
         logger.info("Parsing configuration")
         station_config = self.parse_station_numbers()
         bits: List[dict] = self.parse_bit_packing_section()
+        displays = self.parse_displays(bits)
 
         configuration = {
             "channel": self.getint("SPI", "channel"),
             "frequency": self.getint("SPI", "frequency"),
+            "keep_alive_interval": self.getfloat("SPI", "keep_alive_interval", fallback=DEFAULT_KEEP_ALIVE_INTERVAL),
+            "writer_thread": self.getboolean("SPI", "writer_thread", fallback=False),
+            "write_only": self.getboolean("SPI", "write_only", fallback=True),
             "library": self.get("SPI", "library"),
             "data_collection_interval": self.getint("General", "data_collection_interval"),
+            "adaptive_polling": self.getboolean("General", "adaptive_polling", fallback=False),
             "source": self.get("General", "source"),
             "data_display_interval": float(self.get("General", "data_display_interval")),
             "test": self.getboolean("General", "test"),
             "barometric_trend": self.getboolean("General", "barometric_trend"),
+            "history_file": self.get("General", "history_file", fallback=DEFAULT_HISTORY_FILE),
+            "streaming": self.getboolean("General", "streaming", fallback=False),
+            "snapshot_file": self.get("General", "snapshot_file", fallback=DEFAULT_SNAPSHOT_FILE),
+            "snapshot_interval": self.getfloat("General", "snapshot_interval", fallback=DEFAULT_SNAPSHOT_INTERVAL),
+            "archive_dir": self.get("General", "archive_dir", fallback=""),
+            "archive_max_bytes": int(
+                self.getfloat("General", "archive_max_mb", fallback=DEFAULT_ARCHIVE_MAX_MB) * 1024 * 1024
+            ),
+            "archive_whole_feed": self.getboolean("General", "archive_whole_feed", fallback=False),
+            "replay_speedup": self.getfloat("General", "replay_speedup", fallback=1.0),
+            "fallback_max_distance": self.getfloat(
+                "General", "fallback_max_distance", fallback=DEFAULT_FALLBACK_DISTANCE
+            ),
+            "interpolate_at": self.parse_location(),
+            "interpolate_neighbours": self.getint("General", "interpolate_neighbours", fallback=DEFAULT_NEIGHBOURS),
             "stations": station_config,
             "bits": bits,
+            "displays": displays,
+            "simulator": self.parse_simulator(),
             "display": {
                 "auto-turn-off": self.getboolean("Display", "auto-turn-off"),
                 "start-time": self.get("Display", "start-time"),
@@ -110,79 +375,257 @@ def is_weather_data_stale(timestamp, now):
     return False
 
 
+class FallbackPlan(object):
+    """For every field, the stations to take it from when the primary station lacks it, in order of preference
+
+    The configured secondary stations come first, in their order, followed by the other stations within the maximum
+    distance of the primary station, nearest first. Of those other stations, only the ones that had the field when the
+    plan was made are planned, so the first candidate nearly always has it. The plan is made again when the stations in
+    the feed change, or when none of the candidates of a field had it.
+    """
+
+    def __init__(self, primary: int, candidates: Dict[str, Tuple[int, ...]], stations: FrozenSet[int]):
+        self.primary = primary
+        self.stations = stations
+        self.exhausted = False
+        self._candidates = candidates
+
+    def __repr__(self):
+        return f"FallbackPlan(primary={self.primary}, fields={len(self._candidates)})"
+
+    def candidates(self, field: str) -> Tuple[int, ...]:
+        return self._candidates.get(field, ())
+
+    @classmethod
+    def build(
+            cls,
+            weather_data: Mapping[int, Mapping],
+            stations: Sequence[int],
+            fields: Iterable[str],
+            index: StationIndex,
+            max_distance: float,
+    ) -> "FallbackPlan":
+        primary = next((station for station in stations if station in weather_data), stations[0])
+        secondaries = tuple(station for station in stations if station != primary)
+        neighbours = []
+        if max_distance > 0 and primary in index:
+            lat, lon = index.locations[primary]
+            neighbours = [station for _, station in index.within(lat, lon, max_distance) if station not in stations]
+        candidates = {
+            field: secondaries + tuple(
+                station for station in neighbours if weather_data[station].get(field) is not None
+            )
+            for field in fields
+        }
+        return cls(primary, candidates, frozenset(weather_data))
+
+
 class BuienradarParser(object):
     DERIVED_FIELDS = [
         "error",
         "DUMMY_BYTE",
         "barometric_trend",
+        "temperatureMinLast24Hour",
+        "temperatureMaxLast24Hour",
+        "rainAccumulationLast24Hour",
         "data_from_fallback",
         "random",
         "service_byte",
     ]
-    TREND_MAPPING = {'dropping': 2, 'stable': 4, 'rising': 1}
+    TREND_MAPPING = {'dropping': DROPPING, 'stable': STABLE, 'rising': RISING}
+    SOURCE = "buienradar"
 
-    def __init__(self, stations, bits):
+    def __init__(self, stations, bits, history: TimeSeriesStore = None,
+                 max_distance: float = DEFAULT_FALLBACK_DISTANCE, interpolate_at: Tuple[float, float] = None,
+                 neighbours: int = DEFAULT_NEIGHBOURS):
+        """
+        @param history: the measurements of the last day, to derive the barometric trend and other statistics over
+            time from; without it the barometric trend is always stable
+        @param max_distance: kilometers from the primary station within which the nearest station that has a missing
+            field fills it in, after the configured secondary stations; 0 only uses the configured stations
+        @param interpolate_at: the latitude and longitude to interpolate the weather at from the nearest stations,
+            instead of using the configured stations; requires NumPy
+        @param neighbours: the amount of nearest stations to interpolate from
+        """
         self.fallback_used = None
         self.stations = stations
         self.bits = bits
+        self.history = history
+        self.max_distance = max_distance
+        self.location: Optional[Tuple[float, float]] = None
+        self.index: Optional[StationIndex] = None
+        self.plan: Optional[FallbackPlan] = None
+        self._box = None
+        self.interpolator = None
+        if interpolate_at is not None:
+            from weathervane.idw import InverseDistanceInterpolator
+            self.interpolator = InverseDistanceInterpolator(*interpolate_at, neighbours)
 
-    def parse(self, data: dict) -> dict:
-        raw_stations_weather_data = self._to_dict(
-            data["actual"]["stationmeasurements"]
-        )
+    def parse(self, data: dict, now: datetime = None) -> StationMeasurement:
+        """The weather data of the configured stations in the feed
+
+        @param now: the time at which the feed was fetched, to judge whether it is stale; defaults to the current time
+        """
+        if self.interpolator is not None:
+            return self.parse_interpolated(data, now)
+        raw_stations_weather_data = self._nearby_stations(data["actual"]["stationmeasurements"])
         raw_primary_station_data = self.merge(
-            raw_stations_weather_data, self.stations, self.bits
+            raw_stations_weather_data, self.stations, self.bits, self._fallback_plan(raw_stations_weather_data)
         )
-        station_weather_data = self.enrich(raw_primary_station_data)
+        if self.history is not None:
+            self._record(raw_stations_weather_data)
+        station_weather_data = self.enrich(raw_primary_station_data, now, self.history, self.stations)
 
-        return station_weather_data
+        return normalize_snapshot(station_weather_data, self.SOURCE)
+
+    def parse_interpolated(self, data: dict, now: datetime = None) -> StationMeasurement:
+        """The weather data at interpolate_at, interpolated from the nearest stations in the feed"""
+        raw_stations_weather_data = self._to_dict(data["actual"]["stationmeasurements"])
+        weather_data = StationMeasurement(self.interpolator.interpolate(raw_stations_weather_data))
+        weather_data["error"] = False
+        if self.history is not None:
+            self._record(raw_stations_weather_data)
+        weather_data = self.enrich(weather_data, now, self.history, self.stations)
+        return normalize_snapshot(weather_data, self.SOURCE)
+
+    def _locate(self, location: Optional[Tuple[float, float]]):
+        self.location = location
+        if location is not None:
+            self._box = bounding_box(*location, self.max_distance)
+
+    def is_nearby(self, station: dict) -> bool:
+        """Whether a station of the feed is within the maximum distance of the primary station, which is only known
+        after the first feed, or near interpolate_at"""
+        if self.interpolator is not None:
+            return self.interpolator.is_candidate(station)
+        if self.location is None or self.max_distance <= 0:
+            return False
+        location = location_of(station)
+        if location is None:
+            return False
+        lat, lon = location
+        min_lat, max_lat, min_lon, max_lon = self._box
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return distance_km(*self.location, lat, lon) <= self.max_distance
+
+    def _nearby_stations(self, stations_weather_data: Sequence[dict]) -> dict:
+        """The measurements per station id of the configured stations and the stations near the primary station"""
+        configured = self._to_dict(stations_weather_data, self.stations)
+        if self.max_distance <= 0:
+            return configured
+        if self.location is None:
+            self._locate(next(
+                (location_of(configured[station]) for station in self.stations if station in configured), None
+            ))
+        is_nearby = self.is_nearby
+        nearby = {
+            station_data["stationid"]: station_data
+            for station_data in stations_weather_data
+            if station_data["stationid"] not in configured and is_nearby(station_data)
+        }
+        return {**configured, **nearby} if nearby else configured
+
+    def _fallback_plan(self, stations_weather_data: Mapping[int, Mapping]) -> FallbackPlan:
+        """The fallback plan, made again only if the stations changed or the plan fell short"""
+        plan = self.plan
+        if plan is None or plan.exhausted or plan.stations != stations_weather_data.keys():
+            self.index = StationIndex.from_feed(stations_weather_data.values())
+            fields = [field["key"] for field in self.bits if field["key"] not in self.DERIVED_FIELDS]
+            plan = self.plan = FallbackPlan.build(
+                stations_weather_data, self.stations, fields, self.index, self.max_distance
+            )
+            self._locate(self.index.locations.get(plan.primary, self.location))
+            logger.debug(f"New fallback plan for {len(self.index)} stations: {plan}")
+        return plan
+
+    def _record(self, stations_weather_data: Mapping[int, Mapping]):
+        """Add the measurements of the configured stations to the history"""
+        for station in self.stations:
+            measurements = stations_weather_data.get(station)
+            try:
+                timestamp = datetime.fromisoformat(measurements["timestamp"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.history.record(station, timestamp, measurements)
 
     @staticmethod
-    def enrich(weather_data: dict) -> dict:
-        weather_data["barometric_trend"] = BuienradarParser.TREND_MAPPING['stable']
-        weather_data["error"] = is_weather_data_stale(weather_data["timestamp"], datetime.now())
+    def enrich(
+            weather_data: MutableMapping, now: datetime = None, history: TimeSeriesStore = None, stations: list = None
+    ) -> MutableMapping:
+        """Add the fields that are not in the feed: the statistics over time from the history, and the error flag"""
+        derived = history.derived(stations) if history is not None else {}
+        weather_data["barometric_trend"] = derived.pop("barometric_trend", BuienradarParser.TREND_MAPPING['stable'])
+        weather_data.update(derived)
+        weather_data["error"] = is_weather_data_stale(weather_data["timestamp"], now or datetime.now())
         return weather_data
 
     @staticmethod
     def merge(
-            weather_data: dict, stations: list, required_fields: Sequence[dict]
-    ) -> dict:
+            weather_data: Mapping[int, Mapping],
+            stations: list,
+            required_fields: Sequence[dict],
+            plan: FallbackPlan = None,
+    ) -> StationMeasurement:
+        """The measurements of the primary station, with missing fields taken from the secondary stations
+
+        The measurements in weather_data are copied into a new record, so the decoded feed is left as it is.
+
+        @param plan: the stations to take each missing field from; without it, the secondary stations in their order
+        """
         primary_station = stations[0]
-        try:
-            weather_data[primary_station]["data_from_fallback"] = False
-            secondary_stations = stations[1:]
-        except KeyError:
+        secondary_stations = stations[1:]
+        data_from_fallback = False
+        if primary_station not in weather_data:
             logger.error(f"Primary station {primary_station} not found in data")
             primary_station = stations[1]
-            secondary_stations = stations[1:]
-            weather_data[primary_station]["data_from_fallback"] = True
+            data_from_fallback = True
+        measurement = StationMeasurement(weather_data[primary_station])
+        measurement["data_from_fallback"] = data_from_fallback
+        measurement["error"] = False
 
-        weather_data[primary_station]["error"] = False
-
-        if not secondary_stations:
-            return weather_data[primary_station]
+        if not secondary_stations and plan is None:
+            return measurement
         for field_dict in required_fields:
             field_name = field_dict["key"]
-            value = weather_data[primary_station].get(field_name, None)
+            value = measurement.get(field_name, None)
             if value is None and field_name not in BuienradarParser.DERIVED_FIELDS:
                 logger.warning(f"Using data from fallback stations for field {field_name}")
-                for secondary_station in secondary_stations:
+                candidates = plan.candidates(field_name) if plan is not None else secondary_stations
+                for secondary_station in candidates:
                     try:
                         fallback_data = weather_data.get(secondary_station, {})[field_name]
-                        weather_data[primary_station][field_name] = fallback_data
-                        weather_data[primary_station]["data_from_fallback"] = True
-                        logger.info(f"Set {field_name} to {fallback_data}, due to missing data at the primary station")
-                        break
+                        if fallback_data is None:
+                            continue
+                        measurement[field_name] = fallback_data
                     except KeyError:
                         continue
+                    except (TypeError, ValueError):
+                        logger.warning(f"Value {fallback_data!r} of {field_name} at station {secondary_station} is "
+                                       f"not valid; ignoring it")
+                        continue
+                    measurement["data_from_fallback"] = True
+                    logger.info(f"Set {field_name} to {fallback_data} of station {secondary_station}, due to missing "
+                                f"data at the primary station")
+                    break
                 else:
                     logger.error(f"No backup value found for {field_name}; setting error")
-                    weather_data[primary_station]["error"] = True
-        return weather_data[primary_station]
+                    measurement["error"] = True
+                    if plan is not None:
+                        plan.exhausted = True
+        return measurement
 
     @staticmethod
-    def _to_dict(stations_weather_data: dict) -> dict:
+    def _to_dict(stations_weather_data: Iterable[dict], stations: Sequence[int] = None) -> dict:
+        """The measurements per station id, of the given stations only if any"""
+        if stations is None:
+            return {
+                station_data["stationid"]: station_data
+                for station_data in stations_weather_data
+            }
+        wanted = set(stations)
         return {
             station_data["stationid"]: station_data
             for station_data in stations_weather_data
+            if station_data["stationid"] in wanted
         }
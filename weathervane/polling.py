@@ -0,0 +1,119 @@
+"""When to fetch the weather data again, based on when the provider publishes new measurements
+
+The measurements of Buienradar are published every 10 minutes, some minutes after the time in their `timestamp`.
+Polling at a fixed interval is either late or fetches the same measurements again. PollingPolicy learns the cadence
+from the changes of the timestamp, and the delay of the publication from the moment a new timestamp was first seen.
+The next fetch is planned just after the next update is expected. While that update is overdue it polls somewhat faster,
+until the update arrives or it is a whole cadence late, after which it falls back to the configured interval.
+"""
+import logging
+import statistics
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 300
+# Seconds after the expected publication of new measurements to fetch them
+PUBLICATION_MARGIN = 15
+OVERDUE_INTERVAL = 60
+MIN_INTERVAL = 30
+MAX_INTERVAL = 30 * 60
+# The amount of timestamp changes to learn the cadence and the publication delay from
+HISTORY = 12
+
+
+def _timestamp(weather_data: dict) -> Optional[datetime]:
+    try:
+        timestamp = datetime.fromisoformat(weather_data["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+class PollingPolicy(object):
+    """Plans the next fetch of a data source
+
+    @param default_interval: seconds between fetches until the cadence is known, or if adaptive is False
+    @param clock: returns the current local time, to compare with the timestamps of the measurements
+    """
+
+    def __init__(
+            self,
+            default_interval: float = DEFAULT_INTERVAL,
+            adaptive: bool = True,
+            margin: float = PUBLICATION_MARGIN,
+            overdue_interval: float = OVERDUE_INTERVAL,
+            clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.default_interval = default_interval
+        self.adaptive = adaptive
+        self.margin = margin
+        self.overdue_interval = overdue_interval
+        self.clock = clock
+        self.cadences = deque(maxlen=HISTORY)
+        self.publication_delays = deque(maxlen=HISTORY)
+        self.last_timestamp: Optional[datetime] = None
+        self.polls = 0
+        self.updates = 0
+
+    def __repr__(self):
+        return (f"PollingPolicy(cadence={self.cadence}, publication_delay={self.publication_delay}, "
+                f"polls={self.polls}, updates={self.updates})")
+
+    @classmethod
+    def from_configuration(cls, configuration: dict) -> "PollingPolicy":
+        return cls(
+            configuration.get("data_collection_interval", DEFAULT_INTERVAL),
+            adaptive=configuration.get("adaptive_polling", False),
+        )
+
+    @property
+    def cadence(self) -> Optional[float]:
+        """Seconds between the timestamps of consecutive measurements, or None if not known yet"""
+        return statistics.median(self.cadences) if self.cadences else None
+
+    @property
+    def publication_delay(self) -> Optional[float]:
+        """Seconds from the timestamp of the measurements until they are published, at the earliest"""
+        return min(self.publication_delays) if self.publication_delays else None
+
+    def observe(self, weather_data: dict) -> bool:
+        """Learn from fetched weather data
+
+        @return: whether it has newer measurements than the previous weather data
+        """
+        self.polls += 1
+        timestamp = _timestamp(weather_data)
+        if timestamp is None or (self.last_timestamp is not None and timestamp <= self.last_timestamp):
+            return False
+        if self.last_timestamp is not None:
+            self.cadences.append((timestamp - self.last_timestamp).total_seconds())
+        # The measurements were published before they were first seen, so this overestimates the delay
+        self.publication_delays.append(max(0.0, (self.clock() - timestamp).total_seconds()))
+        self.last_timestamp = timestamp
+        self.updates += 1
+        logger.debug(f"New measurements of {timestamp:%H:%M}: {self}")
+        return True
+
+    def expected_update(self) -> Optional[datetime]:
+        """When the next measurements are expected to be published, or None if that is not known yet"""
+        if self.cadence is None:
+            return None
+        return self.last_timestamp + timedelta(seconds=self.cadence + self.publication_delay)
+
+    def next_delay(self) -> float:
+        """Seconds until the next fetch"""
+        expected = self.expected_update() if self.adaptive else None
+        if expected is None:
+            return self.default_interval
+        delay = (expected - self.clock()).total_seconds() + self.margin
+        if delay > 0:
+            return min(MAX_INTERVAL, max(MIN_INTERVAL, delay))
+        if -delay < self.cadence:
+            logger.debug(f"The measurements expected at {expected:%H:%M:%S} are overdue")
+            return self.overdue_interval
+        return self.default_interval
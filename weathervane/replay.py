@@ -0,0 +1,127 @@
+"""Replay an archive through the whole pipeline, to measure its throughput without network access
+
+Every recorded feed is parsed, interpolated from the previous one into the frames of its transition and encoded, just
+like the main loop does, only without waiting for the display. The report shows the time per stage and how many vanes
+a single process could keep up with.
+
+Usage, from the root of the repository:
+
+    python -m weathervane.replay -c config.ini -a archive                   # as fast as possible
+    python -m weathervane.replay -c config.ini -a archive --speedup 60      # an hour of feeds per minute
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from weathervane.datasources import ReplayDataSource
+from weathervane.fetcher import PhaseTimings
+from weathervane.interpolation import interpolate
+from weathervane.parser import WeathervaneConfigParser
+from weathervane.polling import MAX_INTERVAL
+from weathervane.weathervaneinterface import WeatherVaneInterface
+
+
+class ReplayReport(object):
+    def __init__(self, snapshots: int, frames: int, elapsed: float, timings: PhaseTimings, display_interval: float):
+        self.snapshots = snapshots
+        self.frames = frames
+        self.elapsed = elapsed
+        self.timings = timings
+        self.display_interval = display_interval
+
+    def __repr__(self):
+        return f"ReplayReport(snapshots={self.snapshots}, frames={self.frames}, elapsed={self.elapsed:.3f})"
+
+    @property
+    def snapshots_per_second(self) -> float:
+        return self.snapshots / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def vanes(self) -> float:
+        """The amount of vanes that need a frame every display interval that this throughput could keep up with"""
+        return self.frames_per_second * self.display_interval
+
+    def __str__(self):
+        lines = [
+            f"{self.snapshots} snapshots and {self.frames} frames in {self.elapsed:.3f} s: "
+            f"{self.snapshots_per_second:.0f} snapshots/s, {self.frames_per_second:.0f} frames/s",
+            f"enough for {self.vanes:.0f} vanes at a frame every {self.display_interval} s",
+        ]
+        for stage, seconds in self.timings.phases.items():
+            count = self.frames if stage in ("interpolate", "encode") else self.snapshots
+            per_item = seconds / count * 1_000_000 if count else 0.0
+            lines.append(f"  {stage:<12}{seconds * 1000:10.1f} ms{per_item:10.1f} us each")
+        return "\n".join(lines)
+
+
+def transition_duration(old_weatherdata: Optional[dict], new_weatherdata: dict, display_interval: float) -> float:
+    """The time between the measurements of two snapshots, as the main loop would see it between their arrivals"""
+    if not old_weatherdata:
+        return display_interval
+    seconds = (datetime.fromisoformat(new_weatherdata["timestamp"])
+               - datetime.fromisoformat(old_weatherdata["timestamp"])).total_seconds()
+    return min(MAX_INTERVAL, max(display_interval, seconds))
+
+
+async def replay(data_source: ReplayDataSource, encode: Callable[[dict], bytes], display_interval: float) -> ReplayReport:
+    """Run the feeds of the data source through interpolation and encoding"""
+    timings = data_source.timings
+    producer = asyncio.create_task(data_source.run())
+    snapshots = frames = 0
+    previous = None
+    start = time.perf_counter()
+    try:
+        while (wd := await data_source.queue.get()) is not None:
+            snapshots += 1
+            steps = round(transition_duration(previous, wd, display_interval) / display_interval)
+            with timings.measure("interpolate"):
+                transition = [interpolate(previous, wd, step / steps) for step in range(1, steps + 1)]
+            with timings.measure("encode"):
+                for weather_data in transition:
+                    encode(weather_data)
+            frames += len(transition)
+            previous = wd
+        await producer
+    finally:
+        producer.cancel()
+    return ReplayReport(snapshots, frames, time.perf_counter() - start, timings, display_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an archive through parsing, interpolation and encoding")
+    parser.add_argument("-c", "--config", default="config.ini")
+    parser.add_argument("-a", "--archive", help="folder of the archive (default: archive_dir in the configuration)")
+    parser.add_argument("--speedup", type=float, default=0.0, help="replay this many times faster; 0 is unlimited")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="replay the feeds fetched from this time on")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="replay the feeds fetched up to this time")
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    config = config_parser.parse_config()
+    # Encoding frames does not need the SPI bus
+    interface = WeatherVaneInterface(**dict(config, test=True))
+
+    async def run():
+        data_source = ReplayDataSource(
+            asyncio.Queue(maxsize=1),
+            config["stations"],
+            config["bits"],
+            args.archive or config["archive_dir"],
+            speedup=args.speedup,
+            start=args.start.timestamp() if args.start else None,
+            end=args.end.timestamp() if args.end else None,
+        )
+        return await replay(data_source, interface.encode_weather_data, config["data_display_interval"])
+
+    print(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Timeouts, hedging, retries and a circuit breaker that follow the observed latency of an endpoint
+
+A fixed timeout is either too short for a slow WiFi link or far too long for the usual response of a few hundred
+milliseconds, and a fixed delay between retries wastes time after a single lost packet. LatencyTracker keeps the latency
+of the recent requests, from which the timeout and the moment to send a hedged request are derived. A hedged request is
+a second request for the same feed, sent when the first takes longer than nearly all recent requests; the first answer
+wins. It hides a lost SYN or a stalled connection without waiting for the timeout.
+"""
+import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Used until enough requests have been observed
+DEFAULT_TIMEOUT = 5.0
+MIN_SAMPLES = 5
+WINDOW = 100
+HEDGE_PERCENTILE = 0.95
+# When more than 5% of the requests stall, the 95th percentile is a stall itself. Hedge no later than this many times
+# the latency of a fast request, the 25th percentile, but not before the minimum.
+FAST_PERCENTILE = 0.25
+HEDGE_FAST_FACTOR = 4
+MIN_HEDGE_DELAY = 0.05
+TIMEOUT_PERCENTILE = 0.99
+# The timeout is this many times the 99th percentile of the latency, within the bounds
+TIMEOUT_FACTOR = 4
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT = 10.0
+
+# Retries wait a random time between zero and an exponentially growing maximum
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 20.0
+
+# The circuit opens after this many failed attempts in a row, and allows a trial attempt after the reset timeout
+FAILURE_THRESHOLD = 4
+RESET_TIMEOUT = 60.0
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+
+class LatencyTracker(object):
+    """The latency of the most recent successful requests to an endpoint"""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def __repr__(self):
+        return f"LatencyTracker(samples={len(self.samples)}, hedge_delay={self.hedge_delay()}, timeout={self.timeout()})"
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """The latency below which the fraction of the samples falls, or None if there are too few samples"""
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a hedged request is sent, or None to not hedge yet"""
+        latency = self.percentile(HEDGE_PERCENTILE)
+        if latency is None:
+            return None
+        return max(MIN_HEDGE_DELAY, min(latency, HEDGE_FAST_FACTOR * self.percentile(FAST_PERCENTILE)))
+
+    def timeout(self) -> float:
+        latency = self.percentile(TIMEOUT_PERCENTILE)
+        if latency is None:
+            return DEFAULT_TIMEOUT
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * latency))
+
+
+def backoff_delay(attempt: int, rng: random.Random = random, base: float = BACKOFF_BASE,
+                  cap: float = BACKOFF_CAP) -> float:
+    """Seconds to wait before retrying after the failed attempt (counting from 0), with full jitter"""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """Stops sending requests to an endpoint that keeps failing
+
+    After `failure_threshold` failed attempts in a row the circuit opens and allow() returns False. After `reset_timeout`
+    seconds a single trial attempt is allowed (half open): if it succeeds the circuit closes, otherwise it opens again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half open"
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+
+    def __repr__(self):
+        return f"CircuitBreaker(state={self.state}, failures={self.failures}, times_opened={self.times_opened})"
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            logger.info("Circuit half open, allowing a trial request")
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit closed")
+        self.reset()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit open after {self.failures} failures; no requests for {self.reset_timeout} s")
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+
+    def reset(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Timer(object):
+    """A callback that is due at a deadline
+
+    A timer repeats either every interval seconds, or at the deadline that next_deadline(previous deadline) returns,
+    until that returns None.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            callback: Callable,
+            deadline: float,
+            interval: Optional[float] = None,
+            next_deadline: Optional[Callable[[float], Optional[float]]] = None,
+    ):
+        self.name = name
+        self.callback = callback
+        self.deadline = deadline
+        self.interval = interval
+        self.next_deadline = next_deadline
+        self.cancelled = False
+        # The heap entry that is current; entries of earlier deadlines are left in the heap and skipped
+        self.entry = None
+        self.runs = 0
+        self.skipped = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def __repr__(self):
+        return f"Timer(name={self.name}, deadline={self.deadline:.3f}, interval={self.interval})"
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def mean_lateness(self) -> float:
+        return self.total_lateness / self.runs if self.runs else 0.0
+
+
+class Scheduler(object):
+    """Runs callbacks exactly when they are due and sleeps in between
+
+    Repeating timers are rescheduled relative to their previous deadline instead of the time they actually ran, so the
+    lateness of a single run does not accumulate. If a timer falls behind by more than a full interval, the missed runs
+    are skipped rather than run in a burst.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.timers = []
+        self.wakeups = 0
+        self.started = None
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._stopped = False
+
+    def __repr__(self):
+        return f"Scheduler(timers={len(self.timers)}, wakeups={self.wakeups})"
+
+    def call_at(self, deadline: float, callback: Callable, name: str = None) -> Timer:
+        """Run the callback once, at the deadline (a clock() timestamp)"""
+        return self._schedule(Timer(name or callback.__name__, callback, deadline))
+
+    def call_later(self, delay: float, callback: Callable, name: str = None) -> Timer:
+        return self.call_at(self.clock() + delay, callback, name)
+
+    def call_every(self, interval: float, callback: Callable, name: str = None, start: float = None) -> Timer:
+        """Run the callback every interval seconds, the first time at start (default: now)"""
+        deadline = self.clock() if start is None else start
+        return self._schedule(Timer(name or callback.__name__, callback, deadline, interval))
+
+    def call_repeatedly(
+            self,
+            deadline: float,
+            next_deadline: Callable[[float], Optional[float]],
+            callback: Callable,
+            name: str = None,
+    ) -> Timer:
+        """Run the callback at the deadline, and after that at the deadlines that next_deadline returns"""
+        return self._schedule(Timer(name or callback.__name__, callback, deadline, next_deadline=next_deadline))
+
+    def reschedule(self, timer: Timer, deadline: float) -> Timer:
+        """Move the timer to a new deadline, keeping its statistics, also if it already ran for the last time
+
+        A repeating timer continues from the new deadline.
+        """
+        timer.deadline = deadline
+        return self._schedule(timer)
+
+    def _schedule(self, timer: Timer) -> Timer:
+        if timer not in self.timers:
+            self.timers.append(timer)
+        timer.entry = next(self._counter)
+        heapq.heappush(self._heap, (timer.deadline, timer.entry, timer))
+        if self._wakeup and self._heap[0][2] is timer:
+            self._wakeup.set()
+        return timer
+
+    def stop(self):
+        """Make run() return, after the timer that is running now"""
+        self._stopped = True
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self.started = self.clock()
+        while not self._stopped:
+            await self.run_due_timers()
+            if self._stopped:
+                break
+            timeout = self._heap[0][0] - self.clock() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeups += 1
+
+    async def run_due_timers(self):
+        while self._heap and self._heap[0][0] <= self.clock():
+            deadline, entry, timer = heapq.heappop(self._heap)
+            if entry != timer.entry:
+                # The timer was rescheduled
+                continue
+            if timer.cancelled:
+                self.timers.remove(timer)
+                continue
+
+            lateness = self.clock() - deadline
+            timer.runs += 1
+            timer.total_lateness += lateness
+            timer.max_lateness = max(timer.max_lateness, lateness)
+            try:
+                result = timer.callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Timer {timer.name} failed: {e}")
+
+            if timer.cancelled:
+                self.timers.remove(timer)
+            elif entry != timer.entry:
+                # The callback rescheduled its own timer
+                continue
+            elif timer.interval:
+                timer.deadline = deadline + timer.interval
+                now = self.clock()
+                if timer.deadline <= now - timer.interval:
+                    missed = int((now - timer.deadline) // timer.interval) + 1
+                    timer.skipped += missed
+                    timer.deadline += missed * timer.interval
+                    logger.warning(f"Timer {timer.name} fell behind; skipped {missed} runs")
+                self._schedule(timer)
+            elif timer.next_deadline and (next_deadline := timer.next_deadline(deadline)) is not None:
+                timer.deadline = next_deadline
+                self._schedule(timer)
+            else:
+                self.timers.remove(timer)
+
+    def stats(self) -> dict:
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return {
+            "wakeups": self.wakeups,
+            "wakeups_per_hour": self.wakeups / elapsed * 3600 if elapsed else 0.0,
+            "timers": {
+                timer.name: {
+                    "runs": timer.runs,
+                    "skipped": timer.skipped,
+                    "mean_lateness_ms": timer.mean_lateness * 1000,
+                    "max_lateness_ms": timer.max_lateness * 1000,
+                }
+                for timer in self.timers
+            },
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        timers = ", ".join(
+            f"{name}: {t['runs']} runs, late {t['mean_lateness_ms']:.1f} ms avg / {t['max_lateness_ms']:.1f} ms max"
+            for name, t in stats["timers"].items()
+        )
+        logger.info(f"Scheduler woke up {stats['wakeups']} times ({stats['wakeups_per_hour']:.0f}/hour); {timers}")
@@ -0,0 +1,149 @@
+"""A simulated display, which stands in for the SPI device in test mode
+
+The display of the weathervane is driven by a PIC that only receives frames. SimulatedDisplay has the methods of spidev
+that GPIO uses, and does with a frame what the display would: it receives the bits at the clock rate of the bus and
+decodes them with the [Bit Packing] layout. The time of a transfer is modelled from the frequency and the length of the
+frame, plus the latency of the driver, and the transfer waits that long unless `realtime` is off. Bit errors and extra
+latency can be injected, to see how the rest of the send path copes with them. The most recent frames are kept in
+`history`, so tests, benchmarks and soak tests can check what was sent and how long it took without a Raspberry Pi.
+"""
+import logging
+import random
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from weathervane.bitpacking import BitPackingPlan
+from weathervane.parser import DEFAULT_SIMULATOR_HISTORY
+
+logger = logging.getLogger(__name__)
+
+BITS_PER_BYTE = 8
+
+
+class ReceivedFrame(NamedTuple):
+    """A frame as the display received it"""
+
+    # time.perf_counter() at the end of the transfer
+    received_at: float
+    # The frame with the injected bit errors, and the frame that was sent
+    frame: bytes
+    sent: bytes
+    bit_errors: int
+    # The modelled duration of the transfer in seconds
+    duration: float
+    # The frame decoded with the layout, or None if there is no layout or the frame does not match it
+    weather_data: Optional[dict]
+
+
+class SimulatedDisplay(object):
+    """A display on the SPI bus, with the spidev methods xfer, writebytes2 and close
+
+    @param plan: the layout to decode the frames with; without it the frames are only kept
+    @param frequency: the clock rate of the bus in bits per second
+    @param bit_error_rate: the chance that a bit is flipped on its way to the display
+    @param latency: seconds of overhead of the driver for every transfer
+    @param latency_jitter: at most this many seconds are added to the latency, at random
+    @param history: the amount of frames to keep
+    @param realtime: if True, a transfer takes as long as modelled; otherwise it returns right away
+    @param seed: seed of the bit errors and the jitter, for reproducible tests
+    """
+
+    def __init__(
+            self,
+            plan: Optional[BitPackingPlan] = None,
+            frequency: int = 100_000,
+            bit_error_rate: float = 0.0,
+            latency: float = 0.0,
+            latency_jitter: float = 0.0,
+            history: int = DEFAULT_SIMULATOR_HISTORY,
+            realtime: bool = True,
+            seed=None,
+    ):
+        self.plan = plan
+        self.max_speed_hz = frequency
+        self.bit_error_rate = bit_error_rate
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.realtime = realtime
+        self.rng = random.Random(seed)
+        self.history = deque(maxlen=history)
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.bit_errors = 0
+        self.undecodable = 0
+        self.busy_time = 0.0
+        self.closed = False
+
+    def __repr__(self):
+        return (f"SimulatedDisplay(frequency={self.max_speed_hz}, bit_error_rate={self.bit_error_rate}, "
+                f"latency={self.latency}, frames={self.frames_received})")
+
+    def transfer_time(self, length: int) -> float:
+        """The seconds it takes to clock a frame of length bytes into the display, without the latency"""
+        return length * BITS_PER_BYTE / self.max_speed_hz
+
+    def xfer(self, data) -> list:
+        """Send the frame, and return what the display sent back at the same time, which is nothing but zeros"""
+        self.receive(data)
+        return [0] * len(data)
+
+    def writebytes2(self, data):
+        self.receive(data)
+
+    def close(self):
+        self.closed = True
+
+    def receive(self, data) -> ReceivedFrame:
+        sent = bytes(data)
+        frame, bit_errors = self.inject_bit_errors(sent)
+        duration = self.transfer_time(len(sent)) + self.latency
+        if self.latency_jitter:
+            duration += self.rng.uniform(0, self.latency_jitter)
+        if self.realtime:
+            time.sleep(duration)
+        received = ReceivedFrame(time.perf_counter(), frame, sent, bit_errors, duration, self.decode(frame))
+        self.history.append(received)
+        self.frames_received += 1
+        self.bytes_received += len(sent)
+        self.bit_errors += bit_errors
+        self.busy_time += duration
+        return received
+
+    def inject_bit_errors(self, frame: bytes):
+        """The frame with every bit flipped with the chance of the bit error rate, and the amount of flipped bits"""
+        if not self.bit_error_rate:
+            return frame, 0
+        received = bytearray(frame)
+        flipped = 0
+        chance = self.rng.random
+        for index in range(len(received)):
+            for bit in range(BITS_PER_BYTE):
+                if chance() < self.bit_error_rate:
+                    received[index] ^= 1 << bit
+                    flipped += 1
+        return bytes(received), flipped
+
+    def decode(self, frame: bytes) -> Optional[dict]:
+        if self.plan is None:
+            return None
+        try:
+            return self.plan.decode(frame)
+        except ValueError as e:
+            self.undecodable += 1
+            logger.warning(f"The simulated display could not decode {frame.hex()}: {e}")
+            return None
+
+    @property
+    def last_weather_data(self) -> Optional[dict]:
+        """The weather data of the last frame that was received"""
+        return self.history[-1].weather_data if self.history else None
+
+    def stats(self) -> dict:
+        return {
+            "frames_received": self.frames_received,
+            "bytes_received": self.bytes_received,
+            "bit_errors": self.bit_errors,
+            "undecodable": self.undecodable,
+            "busy_time": self.busy_time,
+        }
@@ -0,0 +1,147 @@
+"""The last good weather data and its frame, kept on disk so a restart can show it right away
+
+The file is small and replaced atomically: it is written next to its final name, synced and then renamed, so a crash or
+power cut leaves either the old or the new snapshot, never half of one. To spare the SD card, a snapshot is written at
+most once every `min_write_interval` seconds and only if the weather data changed; flush() writes the pending one on
+shutdown.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, NamedTuple, Optional
+
+from weathervane.bitpacking import BitPackingPlan
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+# Fields that differ between frames of the same weather data, and are not worth a write
+VOLATILE_FIELDS = frozenset(["random"])
+
+
+class Snapshot(NamedTuple):
+    weather_data: dict
+    frame: bytes
+    layout: str
+    saved_at: float
+
+    def age(self, now: float = None) -> float:
+        """The age of the snapshot in seconds, according to the wall clock"""
+        return (time.time() if now is None else now) - self.saved_at
+
+
+def layout_fingerprint(plan: BitPackingPlan) -> str:
+    """Identifies the bit-packing layout, so a frame is not reused after the layout changed"""
+    return hashlib.blake2b(repr(plan.fields).encode(), digest_size=8).hexdigest()
+
+
+def _content_key(weather_data: dict) -> str:
+    return json.dumps({k: v for k, v in weather_data.items() if k not in VOLATILE_FIELDS}, sort_keys=True, default=str)
+
+
+class SnapshotCache(object):
+    def __init__(self, path: str, plan: BitPackingPlan, min_write_interval: float,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.plan = plan
+        self.layout = layout_fingerprint(plan)
+        self.min_write_interval = min_write_interval
+        self.clock = clock
+        self.writes = 0
+        self.last_write = None
+        self._saved_key = None
+        self._pending = None
+
+    def __repr__(self):
+        return f"SnapshotCache(path={self.path}, writes={self.writes})"
+
+    def save(self, weather_data: dict) -> bool:
+        """Remember the weather data, and write it if the last write is long enough ago
+
+        @return: whether the snapshot was written
+        """
+        key = _content_key(weather_data)
+        if key == self._saved_key:
+            self._pending = None
+            return False
+        self._pending = (weather_data, key)
+        if self.last_write is not None and self.clock() - self.last_write < self.min_write_interval:
+            return False
+        return self.flush()
+
+    def flush(self) -> bool:
+        """Write the pending weather data, if any, regardless of the write interval"""
+        if self._pending is None:
+            return False
+        weather_data, key = self._pending
+        now = self.clock()
+        content = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": now,
+            "layout": self.layout,
+            "frame": bytes(self.plan.encode(weather_data)).hex(),
+            "weather_data": dict(weather_data),
+        }
+        try:
+            self._write_atomically(json.dumps(content, default=str).encode())
+        except OSError as e:
+            logger.warning(f"Could not write the snapshot to {self.path}: {e}")
+            return False
+        self._pending = None
+        self._saved_key = key
+        self.last_write = now
+        self.writes += 1
+        logger.debug(f"Snapshot written to {self.path}")
+        return True
+
+    def _write_atomically(self, content: bytes):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temporary_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+            raise
+
+    def load(self) -> Optional[Snapshot]:
+        """The snapshot on disk, or None if there is none or it cannot be read"""
+        try:
+            with open(self.path, "rb") as f:
+                content = json.loads(f.read())
+            if content.get("version") != SNAPSHOT_VERSION:
+                logger.info(f"Ignoring snapshot {self.path} of version {content.get('version')}")
+                return None
+            snapshot = Snapshot(
+                weather_data=content["weather_data"],
+                frame=bytes.fromhex(content["frame"]),
+                layout=content["layout"],
+                saved_at=float(content["saved_at"]),
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {self.path}: {e}")
+            return None
+        self._saved_key = _content_key(snapshot.weather_data)
+        self.last_write = snapshot.saved_at
+        return snapshot
+
+    def frame_of(self, snapshot: Snapshot, error: bool) -> bytes:
+        """The frame of the snapshot, with the error flag set if required
+
+        The stored frame is used as is if it was encoded with the same layout and without the error flag, otherwise
+        the weather data is encoded again, so the error field gets the value of a set flag whatever its length.
+        """
+        if not error and snapshot.layout == self.layout and len(snapshot.frame) == self.plan.byte_length:
+            return snapshot.frame
+        return bytes(self.plan.encode(dict(snapshot.weather_data, error=error)))
@@ -0,0 +1,107 @@
+"""The stations of the feed by location, to find the stations near a point
+
+StationIndex puts the stations in a grid of cells of CELL_DEGREES by CELL_DEGREES, so a query only looks at the cells
+that overlap with the circle around the point, instead of at every station. The feed has about 50 stations, but the
+index keeps queries cheap for feeds of many thousands.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 0.25
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """The great-circle distance between two points, with the haversine formula"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """The smallest and largest latitude and longitude of the points within the radius"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def location_of(station: dict) -> Optional[Tuple[float, float]]:
+    """The latitude and longitude of a station of the feed, or None if it has no valid location"""
+    try:
+        lat, lon = float(station["lat"]), float(station["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if math.isnan(lat) or math.isnan(lon):
+        return None
+    return lat, lon
+
+
+class StationIndex(object):
+    """The locations of stations in a grid, for the stations within a distance of a point or the nearest ones"""
+
+    def __init__(self, locations: Iterable[Tuple[int, float, float]]):
+        self.locations: Dict[int, Tuple[float, float]] = {}
+        self._cells = defaultdict(list)
+        for station, lat, lon in locations:
+            self.locations[station] = (lat, lon)
+            self._cells[self._cell(lat, lon)].append(station)
+
+    def __repr__(self):
+        return f"StationIndex(stations={len(self.locations)}, cells={len(self._cells)})"
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, station):
+        return station in self.locations
+
+    @classmethod
+    def from_feed(cls, stations: Iterable[dict]) -> "StationIndex":
+        """The index of the stations of the feed that have a valid location"""
+        locations = []
+        for station in stations:
+            location = location_of(station)
+            if location is not None:
+                locations.append((station["stationid"], *location))
+        return cls(locations)
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, int]]:
+        """The distance and id of the stations within the radius of the point, nearest first"""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        (first_row, first_column), (last_row, last_column) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        found = []
+        if (last_row - first_row + 1) * (last_column - first_column + 1) > len(self._cells):
+            # The circle covers more cells than there are stations in the grid
+            cells = self._cells.values()
+        else:
+            cells = (self._cells.get((row, column), ())
+                     for row in range(first_row, last_row + 1) for column in range(first_column, last_column + 1))
+        for stations in cells:
+            for station in stations:
+                station_lat, station_lon = self.locations[station]
+                distance = distance_km(lat, lon, station_lat, station_lon)
+                if distance <= radius_km:
+                    found.append((distance, station))
+        found.sort()
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float = None) -> List[Tuple[float, int]]:
+        """The distance and id of the k stations nearest to the point, within max_km if given, nearest first"""
+        radius = CELL_DEGREES * KM_PER_DEGREE
+        limit = max_km if max_km is not None else math.pi * EARTH_RADIUS_KM
+        while True:
+            radius = min(radius, limit)
+            found = self.within(lat, lon, radius)
+            # Stations outside the radius are farther than those found, so the k nearest are known
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius *= 2
@@ -0,0 +1,139 @@
+"""Sends frames over SPI from a thread of its own, so a slow transfer never blocks the asyncio loop
+
+At 100 kHz a frame of a few bytes plus the overhead of the driver takes milliseconds, during which the loop could not
+show the next frame or handle the response of a fetch. The SPI device is opened before the thread starts, so a missing
+device fails at startup instead of in the thread, and from then on the writer thread is the only one that uses it. The
+loop drops each frame into a mailbox of a single slot: a frame that the thread has not picked up yet is
+overwritten by the next one, because only the newest frame is worth showing. The outcome of every transfer is reported
+back on the loop, where the statistics are kept.
+
+The mailbox and the frame in transfer are two buffers that are swapped, so handing over a frame copies it into memory
+that was allocated before, instead of into a new object. They are memoryviews, because assigning to a slice of a
+bytearray copies the data into a temporary bytearray first.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds that close() waits for the transfer in progress
+JOIN_TIMEOUT = 1.0
+# view[WHOLE_FRAME] = data copies into the memoryview, without building a new slice object every time like view[:] does
+WHOLE_FRAME = slice(None)
+
+
+class TransferReport(NamedTuple):
+    """The outcome of a transfer: its latency in seconds, and the exception and the frame if it failed"""
+
+    latency: float
+    error: Optional[BaseException] = None
+    frame: bytes = b""
+
+
+def transfer_function(spi, write_only: bool) -> Callable:
+    """The method of the SPI device that sends a frame
+
+    xfer copies the frame into a list and returns the bytes it read back in another list. writebytes2 takes any object
+    with the buffer protocol, such as a bytearray or a memoryview, and reads nothing back.
+    """
+    return spi.writebytes2 if write_only else spi.xfer
+
+
+class SpiWriter(object):
+    """A thread that owns the SPI device and sends the newest frame of its mailbox
+
+    @param spi: the opened SPI device, which is closed by the writer thread when it stops
+    @param report: called with a TransferReport after every transfer, on the loop if one is given
+    @param loop: the asyncio loop to report on; without it the reports are made on the writer thread
+    @param name: the name of the thread
+    @param write_only: if True, the frames are sent with writebytes2 instead of xfer, see transfer_function
+    """
+
+    def __init__(
+            self,
+            spi,
+            report: Callable[[TransferReport], None],
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+            name: str = "spi-writer",
+            write_only: bool = False,
+    ):
+        self.spi = spi
+        self.report = report
+        self.loop = loop
+        self.write_only = write_only
+        self.overwrites = 0
+        self._mailbox = memoryview(bytearray())
+        self._has_frame = False
+        self._sending = memoryview(bytearray())
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f"SpiWriter(thread={self._thread.name}, alive={self._thread.is_alive()}, overwrites={self.overwrites})"
+
+    def put(self, frame) -> bool:
+        """Copy the frame into the mailbox, in place of a frame that the writer thread has not picked up yet
+
+        @param frame: a bytes-like object, which may be changed as soon as this returns
+        @return: False if a waiting frame was overwritten
+        """
+        with self._condition:
+            overwritten = self._has_frame
+            if overwritten:
+                self.overwrites += 1
+            if len(self._mailbox) == len(frame):
+                self._mailbox[WHOLE_FRAME] = frame
+            else:
+                self._mailbox = memoryview(bytearray(frame))
+            self._has_frame = True
+            self._condition.notify()
+        return not overwritten
+
+    def close(self):
+        """Stop the thread after it sent the frame in its mailbox, and close the SPI device"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(JOIN_TIMEOUT)
+
+    def _take(self) -> Optional[memoryview]:
+        """The frame of the mailbox, which becomes the frame in transfer, or None once closed and empty"""
+        with self._condition:
+            while not self._has_frame and not self._closed:
+                self._condition.wait()
+            if not self._has_frame:
+                return None
+            self._mailbox, self._sending = self._sending, self._mailbox
+            self._has_frame = False
+            return self._sending
+
+    def _run(self):
+        try:
+            transfer = transfer_function(self.spi, self.write_only)
+            while (frame := self._take()) is not None:
+                start = time.perf_counter()
+                try:
+                    transfer(frame)
+                except Exception as e:
+                    self._deliver(TransferReport(time.perf_counter() - start, e, bytes(frame)))
+                else:
+                    self._deliver(TransferReport(time.perf_counter() - start))
+        finally:
+            close = getattr(self.spi, "close", None)
+            if close is not None:
+                close()
+
+    def _deliver(self, report: TransferReport):
+        if self.loop is None:
+            self.report(report)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.report, report)
+        except RuntimeError:
+            # The loop is closed while shutting down
+            logger.debug(f"Dropped the report of a transfer: {report}")
@@ -0,0 +1,118 @@
+"""Incremental extraction of the measurements of a few stations from the Buienradar feed
+
+json.loads builds Python objects for the whole feed: every station, the forecasts and their texts, while only a couple
+of stations are used. StationExtractor walks the feed as it arrives instead. It decodes the elements of
+actual.stationmeasurements one at a time and only keeps those of the wanted stations, and it picks up the simple values
+of actual before them, such as sunrise and sunset. Everything after the station measurements is not decoded at all, and
+the part of the feed that has been processed is released, so only a single station is held in memory at a time.
+
+The result has the same shape as the feed, so it can be passed to BuienradarParser.parse as is.
+"""
+import codecs
+import json
+import re
+from typing import Callable, Iterable
+
+_ACTUAL = re.compile(r'"actual"\s*:\s*\{')
+_STATION_MEASUREMENTS = re.compile(r'"stationmeasurements"\s*:\s*\[')
+_SCALAR = re.compile(r'"([^"\\]+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d[\d.eE+-]*|true|false|null)\s*[,}]')
+_WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+_DECODER = json.JSONDecoder()
+
+# The station measurements are expected near the start of the feed; give up searching after this many characters
+MAX_PREAMBLE = 64 * 1024
+
+SEARCHING, IN_ARRAY, DONE = range(3)
+
+
+class StationExtractor(object):
+    """Feed the bytes of the feed in chunks of any size, then call close() for the extracted data
+
+    @param station_ids: the ids of the stations to extract; all other stations are skipped
+    @param keep: whether to extract a station that is not in station_ids as well, e.g. one near the primary station
+    """
+
+    def __init__(self, station_ids: Iterable[int], keep: Callable[[dict], bool] = None):
+        self.station_ids = {int(station_id) for station_id in station_ids}
+        self.keep = keep
+        self.actual = {}
+        self.stations = []
+        self.skipped = 0
+        self.state = SEARCHING
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+
+    def __repr__(self):
+        return f"StationExtractor(stations={len(self.stations)}, skipped={self.skipped})"
+
+    def feed(self, chunk: bytes):
+        if self.state == DONE:
+            return
+        self._buffer += self._text.decode(chunk)
+        if self.state == SEARCHING:
+            self._search()
+        if self.state == IN_ARRAY:
+            self._decode_elements()
+
+    def close(self) -> dict:
+        """The extracted data, shaped like the feed: {"actual": {..., "stationmeasurements": [...]}}"""
+        if self.state != DONE:
+            raise ValueError("The feed is incomplete or invalid before the end of actual.stationmeasurements")
+        return {"actual": dict(self.actual, stationmeasurements=self.stations)}
+
+    def _search(self):
+        match = _STATION_MEASUREMENTS.search(self._buffer)
+        if match is None:
+            if len(self._buffer) > MAX_PREAMBLE:
+                raise ValueError(f"No actual.stationmeasurements in the first {MAX_PREAMBLE} characters of the feed")
+            return
+        actual = _ACTUAL.search(self._buffer, 0, match.start())
+        if actual:
+            for key, value in _SCALAR.findall(self._buffer, actual.end(), match.start()):
+                self.actual[key] = json.loads(value)
+        self.state = IN_ARRAY
+        self._buffer = self._buffer[match.end():]
+
+    def _decode_elements(self):
+        buffer = self._buffer
+        position = 0
+        while True:
+            position = _WHITESPACE_AND_COMMAS.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                self.state = DONE
+                buffer, position = "", 0
+                break
+            try:
+                station, end = _DECODER.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Most likely the element continues in the next chunk; otherwise close() reports the feed as invalid
+                break
+            if isinstance(station, dict) and (
+                    station.get("stationid") in self.station_ids or (self.keep is not None and self.keep(station))
+            ):
+                self.stations.append(station)
+            else:
+                self.skipped += 1
+            position = end
+        self._buffer = buffer[position:]
+
+
+def select_stations(data: dict, station_ids: Iterable[int], keep: Callable[[dict], bool] = None) -> dict:
+    """The part of the decoded feed that StationExtractor extracts: the simple values of actual and the wanted stations"""
+    station_ids = {int(station_id) for station_id in station_ids}
+    actual = data["actual"]
+    selected = {key: value for key, value in actual.items() if not isinstance(value, (dict, list))}
+    selected["stationmeasurements"] = [
+        station for station in actual["stationmeasurements"]
+        if station.get("stationid") in station_ids or (keep is not None and keep(station))
+    ]
+    return {"actual": selected}
+
+
+def extract_stations(data: bytes, station_ids: Iterable[int]) -> dict:
+    """Extract the wanted stations from the complete feed at once"""
+    extractor = StationExtractor(station_ids)
+    extractor.feed(data)
+    return extractor.close()
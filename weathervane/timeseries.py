@@ -0,0 +1,299 @@
+"""The measurements of the last day per station, in a memory-mapped ring buffer, for trends over time
+
+The feed only has the latest measurements, so the barometric trend (the change of the air pressure over four hours)
+and other statistics over time need a history. It is kept in a file of fixed size that is memory-mapped, so it survives
+a restart without reading or writing the file as a whole: a new measurement changes a few bytes in the page cache,
+which the kernel writes back in the background.
+
+Every station has a ring buffer of `capacity` samples: the time of the measurement followed by TRACKED_FIELDS, NaN
+when missing. A sample is written before the count of samples is increased, so a crash never exposes half a sample.
+Rolling windows keep the statistics of their time span up to date in O(1) per sample (amortized): the sum is updated
+with every sample that enters or leaves the window, the minimum and maximum are the heads of monotonic queues. The
+windows are rebuilt from the ring buffers when the file is opened.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+from collections import deque
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+RISING = 1
+DROPPING = 2
+STABLE = 4
+
+TRACKED_FIELDS = ("airpressure", "temperature", "precipitation")
+# More than a day of measurements that are published every 10 minutes
+DEFAULT_CAPACITY = 256
+DEFAULT_HISTORY_FILE = "weathervane-history.bin"
+
+PRESSURE_WINDOW = 4 * 60 * 60
+# The trend is only known once the samples span most of the window
+MIN_TREND_SPAN = 3 * 60 * 60
+# Change of the air pressure in hPa over the window above which it is rising or dropping
+TREND_THRESHOLD = 1.0
+DAY = 24 * 60 * 60
+# The precipitation is an intensity in mm/h; a gap between samples longer than this does not count as rain
+MAX_RAIN_GAP = 60 * 60
+
+MAGIC = b"WVTS"
+VERSION = 1
+# Magic, version, capacity per station and amount of stations
+HEADER = struct.Struct("<4sIII")
+# Station id and the amount of samples written in total
+SLOT_HEADER = struct.Struct("<qq")
+
+
+class RollingWindow(object):
+    """The samples of the last `span` seconds, with their sum, minimum and maximum kept up to date
+
+    Samples must be added in chronological order.
+    """
+
+    def __init__(self, span: float):
+        self.span = span
+        self.samples = deque()
+        self.sum = 0.0
+        self._minima = deque()
+        self._maxima = deque()
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, timestamp: float, value: float):
+        self.samples.append((timestamp, value))
+        self.sum += value
+        while self._minima and self._minima[-1][1] >= value:
+            self._minima.pop()
+        self._minima.append((timestamp, value))
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((timestamp, value))
+        self.expire(timestamp)
+
+    def expire(self, now: float):
+        """Drop the samples that are older than the span"""
+        cutoff = now - self.span
+        samples = self.samples
+        while samples and samples[0][0] < cutoff:
+            self.sum -= samples.popleft()[1]
+        if not samples:
+            # Do not let rounding errors of the sum accumulate
+            self.sum = 0.0
+        while self._minima and self._minima[0][0] < cutoff:
+            self._minima.popleft()
+        while self._maxima and self._maxima[0][0] < cutoff:
+            self._maxima.popleft()
+
+    @property
+    def first(self) -> Optional[Tuple[float, float]]:
+        return self.samples[0] if self.samples else None
+
+    @property
+    def last(self) -> Optional[Tuple[float, float]]:
+        return self.samples[-1] if self.samples else None
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._minima[0][1] if self._minima else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._maxima[0][1] if self._maxima else None
+
+
+class StationSeries(object):
+    """The rolling windows of a single station"""
+
+    def __init__(self):
+        self.last_timestamp: Optional[float] = None
+        self.pressure = RollingWindow(PRESSURE_WINDOW)
+        self.temperature = RollingWindow(DAY)
+        self.rain = RollingWindow(DAY)
+        self._precipitation: Optional[float] = None
+
+    def add(self, timestamp: float, values: Sequence[float]):
+        airpressure, temperature, precipitation = values
+        if not math.isnan(airpressure):
+            self.pressure.add(timestamp, airpressure)
+        if not math.isnan(temperature):
+            self.temperature.add(timestamp, temperature)
+        if self.last_timestamp is not None and self._precipitation is not None:
+            # The rain since the previous sample, at the intensity measured then
+            hours = min(timestamp - self.last_timestamp, MAX_RAIN_GAP) / 3600
+            self.rain.add(timestamp, self._precipitation * hours)
+        self._precipitation = None if math.isnan(precipitation) else precipitation
+        self.last_timestamp = timestamp
+
+    def barometric_trend(self) -> Optional[int]:
+        """Whether the air pressure is rising, dropping or stable, or None if the samples do not span enough time"""
+        if len(self.pressure) < 2:
+            return None
+        (start, first), (end, last) = self.pressure.first, self.pressure.last
+        if end - start < MIN_TREND_SPAN:
+            return None
+        change = last - first
+        if change >= TREND_THRESHOLD:
+            return RISING
+        if change <= -TREND_THRESHOLD:
+            return DROPPING
+        return STABLE
+
+    def derived(self) -> dict:
+        """The statistics that are known, as fields of the weather data"""
+        derived = {}
+        trend = self.barometric_trend()
+        if trend is not None:
+            derived["barometric_trend"] = trend
+        if len(self.temperature):
+            derived["temperatureMinLast24Hour"] = self.temperature.min
+            derived["temperatureMaxLast24Hour"] = self.temperature.max
+        if len(self.rain):
+            derived["rainAccumulationLast24Hour"] = round(self.rain.sum, 6)
+        return derived
+
+
+class TimeSeriesStore(object):
+    """The ring buffers of the configured stations, memory-mapped from a file
+
+    @param path: the file; None keeps the history in memory only, e.g. for a replay
+    @param capacity: the amount of samples per station
+    """
+
+    def __init__(self, path: Optional[str], stations: Sequence[int], capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.stations = list(stations)
+        self.capacity = capacity
+        self.width = 1 + len(TRACKED_FIELDS)
+        self.slot_size = SLOT_HEADER.size + capacity * self.width * 8
+        self.size = HEADER.size + len(self.stations) * self.slot_size
+        self.samples_recorded = 0
+        self._map = self._open()
+        self._values = memoryview(self._map).cast("d")
+        self._slots: Dict[int, int] = {}
+        self._assign_slots()
+        self.series: Dict[int, StationSeries] = {station: self._rebuild(station) for station in self.stations}
+
+    def __repr__(self):
+        return f"TimeSeriesStore(path={self.path}, stations={self.stations}, capacity={self.capacity})"
+
+    @classmethod
+    def from_configuration(cls, configuration: dict, persistent: bool = True) -> Optional["TimeSeriesStore"]:
+        """The history of the configured stations if the barometric trend is enabled, otherwise None
+
+        @param persistent: keep the history in history_file; a replay keeps it in memory, apart from the real one
+        """
+        if not configuration.get("barometric_trend"):
+            return None
+        path = configuration.get("history_file") if persistent else None
+        try:
+            return cls(path or None, configuration.get("stations"))
+        except OSError as e:
+            logger.warning(f"Could not open the history in {path}: {e}; keeping it in memory instead")
+            return cls(None, configuration.get("stations"))
+
+    def _open(self) -> mmap.mmap:
+        if self.path is None:
+            return mmap.mmap(-1, self.size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, self.size)
+            mapped = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        if HEADER.unpack_from(mapped) != (MAGIC, VERSION, self.capacity, len(self.stations)):
+            logger.info(f"Starting a new history in {self.path}")
+            mapped[:] = bytes(self.size)
+            HEADER.pack_into(mapped, 0, MAGIC, VERSION, self.capacity, len(self.stations))
+        return mapped
+
+    def _slot_offset(self, slot: int) -> int:
+        return HEADER.size + slot * self.slot_size
+
+    def _assign_slots(self):
+        """Find the ring buffer of every configured station, and give the others those of stations no longer used"""
+        free = []
+        for slot in range(len(self.stations)):
+            station, _ = SLOT_HEADER.unpack_from(self._map, self._slot_offset(slot))
+            if station in self.stations and station not in self._slots:
+                self._slots[station] = slot
+            else:
+                free.append(slot)
+        for station in self.stations:
+            if station not in self._slots:
+                slot = free.pop(0)
+                SLOT_HEADER.pack_into(self._map, self._slot_offset(slot), station, 0)
+                self._slots[station] = slot
+
+    def _count(self, station: int) -> int:
+        return SLOT_HEADER.unpack_from(self._map, self._slot_offset(self._slots[station]))[1]
+
+    def _sample_index(self, station: int, sample: int) -> int:
+        """The index in the array of doubles of the sample, counting all samples ever written to the station"""
+        base = (self._slot_offset(self._slots[station]) + SLOT_HEADER.size) // 8
+        return base + (sample % self.capacity) * self.width
+
+    def samples(self, station: int) -> List[Tuple[float, Tuple[float, ...]]]:
+        """The time and the tracked fields of the samples of a station, oldest first"""
+        count = self._count(station)
+        samples = []
+        for sample in range(max(0, count - self.capacity), count):
+            index = self._sample_index(station, sample)
+            row = self._values[index:index + self.width]
+            samples.append((row[0], tuple(row[1:])))
+        return samples
+
+    def _rebuild(self, station: int) -> StationSeries:
+        series = StationSeries()
+        for timestamp, values in self.samples(station):
+            series.add(timestamp, values)
+        return series
+
+    def record(self, station: int, timestamp: float, weather_data: Mapping) -> bool:
+        """Add the measurements of a station, unless they are not newer than its last sample
+
+        @return: whether the sample was added
+        """
+        series = self.series.get(station)
+        if series is None or (series.last_timestamp is not None and timestamp <= series.last_timestamp):
+            return False
+        values = []
+        for field in TRACKED_FIELDS:
+            value = weather_data.get(field)
+            try:
+                values.append(float(value))
+            except (TypeError, ValueError):
+                values.append(math.nan)
+        count = self._count(station)
+        index = self._sample_index(station, count)
+        self._values[index] = timestamp
+        self._values[index + 1:index + self.width] = memoryview(struct.pack(f"{len(values)}d", *values)).cast("d")
+        SLOT_HEADER.pack_into(self._map, self._slot_offset(self._slots[station]), station, count + 1)
+        series.add(timestamp, values)
+        self.samples_recorded += 1
+        return True
+
+    def derived(self, stations: Sequence[int] = None) -> dict:
+        """The statistics of the first station, with those it does not have yet taken from the next stations"""
+        derived = {}
+        for station in self.stations if stations is None else stations:
+            series = self.series.get(station)
+            if series is not None:
+                for key, value in series.derived().items():
+                    derived.setdefault(key, value)
+        return derived
+
+    def flush(self):
+        if self.path is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map.closed:
+            return
+        self.flush()
+        self._values.release()
+        self._map.close()
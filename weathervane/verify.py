@@ -0,0 +1,139 @@
+"""Round-trip weather data through the bit-packing layout and report the quantization error per field
+
+Usage, from the root of the repository:
+
+    python -m weathervane.verify -c config.ini                  # 10000 synthetic weather dicts
+    python -m weathervane.verify -c config.ini -i records.jsonl  # recorded weather dicts, one JSON object per line
+"""
+import argparse
+import json
+import random
+from typing import Dict, Iterable, Iterator
+
+from weathervane.bitpacking import NUMERIC, PRECIPITATION, RANDOM, WIND_DIRECTION, WIND_DIRECTIONS, BitPackingPlan
+from weathervane.parser import WeathervaneConfigParser
+
+
+class FieldError(object):
+    """Accumulates the error between original and decoded values of one field"""
+
+    def __init__(self, key, step):
+        self.key = key
+        self.step = step
+        self.count = 0
+        self.mismatches = 0
+        self.clipped = 0
+        self.total_error = 0.0
+        self.max_error = 0.0
+
+    def add(self, error, clipped=False):
+        self.count += 1
+        if clipped:
+            self.clipped += 1
+            return
+        if error:
+            self.mismatches += 1
+        self.total_error += error
+        self.max_error = max(self.max_error, error)
+
+    @property
+    def mean_error(self):
+        in_range = self.count - self.clipped
+        return self.total_error / in_range if in_range else 0.0
+
+    def __repr__(self):
+        return (f"FieldError(key={self.key}, count={self.count}, mean={self.mean_error:.4f}, max={self.max_error:.4f}, "
+                f"mismatches={self.mismatches}, clipped={self.clipped})")
+
+
+def representable_max(field) -> float:
+    """The largest value that survives the round trip: either the configured max or the largest value that fits"""
+    return min(field.max, field.min + field.mask * field.step)
+
+
+def synthetic_weather_data(plan: BitPackingPlan, amount: int, rng=None) -> Iterator[dict]:
+    """Generate weather data that covers the full range of every field, plus a margin outside of it"""
+    rng = rng or random.Random()
+    directions = list(WIND_DIRECTIONS)
+    for _ in range(amount):
+        weather_data = {}
+        for field in plan.fields:
+            if field.kind == WIND_DIRECTION:
+                weather_data[field.key] = rng.choice(directions)
+            elif field.kind == PRECIPITATION:
+                weather_data[field.key] = rng.choice([0.0, rng.uniform(0.1, 10)])
+            elif field.kind == NUMERIC:
+                upper = representable_max(field)
+                margin = (upper - field.min) * 0.05
+                weather_data[field.key] = rng.uniform(field.min - margin, upper + margin)
+        if "windspeed" in weather_data and "windgusts" in weather_data:
+            # Wind speed is capped at the gusts by the encoder, which is not a quantization error
+            weather_data["windgusts"] = max(weather_data["windgusts"], weather_data["windspeed"])
+        yield weather_data
+
+
+def round_trip(plan: BitPackingPlan, records: Iterable[dict]) -> Dict[str, FieldError]:
+    """Encode and decode every record and compare the decoded values with the originals"""
+    errors = {field.key: FieldError(field.key, field.step) for field in plan.fields if field.kind != RANDOM}
+    for weather_data in records:
+        decoded = plan.decode(plan.encode(weather_data))
+        for field in plan.fields:
+            if field.kind == RANDOM:
+                continue
+            original = weather_data.get(field.key)
+            if field.kind == WIND_DIRECTION:
+                if original is not None:
+                    errors[field.key].add(0 if decoded[field.key] == original else 1)
+            elif field.kind == PRECIPITATION:
+                if isinstance(original, (int, float)):
+                    errors[field.key].add(abs(decoded[field.key] - (1 if original > 0 else 0)))
+            elif isinstance(original, (int, float)):
+                clipped = not field.min <= original <= representable_max(field)
+                errors[field.key].add(abs(decoded[field.key] - original), clipped=clipped)
+    return errors
+
+
+def read_records(file_name) -> Iterator[dict]:
+    with open(file_name, "r", encoding="UTF-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def report(plan: BitPackingPlan, errors: Dict[str, FieldError], frequency: int) -> str:
+    lines = [
+        f"Layout: {len(plan.fields)} fields, {plan.bit_length} bits, {plan.byte_length} bytes per frame",
+        f"SPI transfer at {frequency} Hz: {plan.byte_length * 8 / frequency * 1000:.3f} ms per frame",
+        f"{'field':<20}{'step':>8}{'count':>8}{'mean err':>12}{'max err':>12}{'mismatch':>10}{'clipped':>9}",
+    ]
+    for error in errors.values():
+        lines.append(
+            f"{error.key:<20}{error.step:>8g}{error.count:>8}{error.mean_error:>12.4f}{error.max_error:>12.4f}"
+            f"{error.mismatches:>10}{error.clipped:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the bit-packing layout by encoding and decoding weather data")
+    parser.add_argument("-c", "--config", default="config.ini", help="configuration file with the layout")
+    parser.add_argument("-i", "--input", help="file with recorded weather data, one JSON object per line")
+    parser.add_argument("-n", "--samples", type=int, default=10_000, help="amount of synthetic weather data")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the synthetic weather data")
+    args = parser.parse_args()
+
+    config_parser = WeathervaneConfigParser()
+    config_parser.read(args.config)
+    plan = BitPackingPlan(config_parser.parse_bit_packing_section())
+    frequency = config_parser.getint("SPI", "frequency")
+
+    if args.input:
+        records = read_records(args.input)
+    else:
+        records = synthetic_weather_data(plan, args.samples, random.Random(args.seed))
+    print(report(plan, round_trip(plan, records), frequency))
+
+
+if __name__ == "__main__":
+    main()
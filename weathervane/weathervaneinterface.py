@@ -1,46 +1,43 @@
 import logging
-import math
 import time
-from random import randint
-from typing import List
+from typing import List, Mapping, Sequence
 
 import gpiozero
 
+from weathervane.bitpacking import WIND_DIRECTIONS, BitPackingPlan
 from weathervane.gpio import GPIO
 
 logger = logging.getLogger(__name__)
 
+MINUTES_PER_DAY = 24 * 60
+# Seconds after the start of a minute at which the display is switched, to be safely inside that minute
+TRANSITION_MARGIN = 1.0
+
+# Fields that change on every frame without carrying information; they do not force a new transfer
+DONT_CARE_FIELDS = ["random"]
+
 
 class WeatherVaneInterface(object):
-    wind_directions = {
-        "N": 0x00,
-        "NNO": 0x01,
-        "NO": 0x02,
-        "ONO": 0x03,
-        "O": 0x04,
-        "OZO": 0x05,
-        "ZO": 0x06,
-        "ZZO": 0x07,
-        "Z": 0x08,
-        "ZZW": 0x09,
-        "ZW": 0x0A,
-        "WZW": 0x0B,
-        "W": 0x0C,
-        "WNW": 0x0D,
-        "NW": 0x0E,
-        "NNW": 0x0F,
-    }
+    wind_directions = WIND_DIRECTIONS
 
     def __init__(self, *args, **kwargs):
         self.channel = kwargs["channel"]
         self.frequency = kwargs["frequency"]
-        self.gpio = GPIO(**kwargs)
         self.bits: List[dict] = kwargs["bits"]
+        self.plan = BitPackingPlan(self.bits)
+        # send() encodes every frame into the same buffer
+        self.buffer = bytearray(self.plan.byte_length)
+        self.frame = memoryview(self.buffer)
+        self.gpio = GPIO(dont_care=self.plan.mask_of(DONT_CARE_FIELDS), **kwargs)
         self.stations = kwargs["stations"]
 
     def __repr__(self):
         return f"WeatherVaneInterface(channel={self.channel}, frequency={self.frequency})"
 
+    @property
+    def byte_length(self) -> int:
+        return self.plan.byte_length
+
     def encode_weather_data(self, weather_data) -> bytes:
         """Converts the weather data into a string of bits
 
@@ -53,21 +50,21 @@ class WeatherVaneInterface(object):
         # Each element has a maximum value
         # Each element can vary only in discrete steps
 
+        The layout is compiled once into a BitPackingPlan, so encoding a frame only involves integer arithmetic.
+
         @precondition: the member 'requested data' is properly set
         @param weather_data: a dictionary containing the weatherdata
         @return: a byte array
         """
-        t_data = self._transmittable_data(weather_data, self.bits)
-
-        binary_string = ""
-        for data in self.bits:
-            bit_key = data["key"]
-            bit_value = f"{t_data[bit_key]:0{int(data['length'])}b}"
-            binary_string += bit_value
-        data_length = math.ceil(len(binary_string) / 8)
-        binary_string_list_in_bytes = [binary_string[i * 8:(i * 8) + 8] for i in range(data_length)]
-        data_bytes = bytearray([int(b, base=2) for b in binary_string_list_in_bytes])
-        return data_bytes
+        return self.plan.encode(weather_data)
+
+    def encode_frame(self, weather_data) -> memoryview:
+        """Encode the weather data into the buffer of the interface, instead of into a new bytearray
+
+        The frame is only valid until the next call; use encode_weather_data for frames that are kept.
+        """
+        self.plan.pack_into(self.buffer, weather_data)
+        return self.frame
 
     def send(self, weather_data):
         """Send data to the connected SPI device.
@@ -75,59 +72,86 @@ class WeatherVaneInterface(object):
         Keyword arguments:
         weather_data -- a dictionary with the data
         """
-        data_array = self.encode_weather_data(weather_data)
-        logger.info(f'Sending data {data_array} to device')
-        self.gpio.send_data(data_array)
-
-
-    def _transmittable_data(self, weather_data, requested_data: List[dict]):
-        result = {}
-
-        for data_point in requested_data:
-            measurement_name = data_point["key"]
-            value = weather_data.get(measurement_name, 0)
-            if measurement_name == "random":
-                length = int(data_point["length"])
-                value = randint(0, 2 ** length - 1)
-
-            step_value = float(data_point.get("step", 1))
-            min_value = float(data_point.get("min", 0))
-            max_value = float(data_point.get("max", 255))
-            result[measurement_name] = self._value_to_bits(
-                measurement_name, value, step_value, min_value, max_value
-            )
-            result = WeatherVaneInterface._compensate_wind(result)
-
-        return result
-
-    def _value_to_bits(self, measurement_name, value, step_value, min_value, max_value):
-        if measurement_name == "winddirection":
-            return self.wind_directions.get(value, 0)
-        elif measurement_name == "precipitation":
-            return 1 if value and value > 0 else 0
-        else:
-            if not value:
-                logger.debug(f"Value {value} is missing. Setting to min-value")
-            value = min(max(value, min_value), max_value)
+        self.send_frame(self.encode_frame(weather_data))
 
-            try:
-                value -= min_value
-                value /= float(step_value)
-            except TypeError:
-                logger.debug(f"Value {value} for {measurement_name} is not a number")
-                return 0
+    def send_frame(self, data_array):
+        """Send an already encoded frame to the connected SPI device."""
+        if self.gpio.send_data(data_array) and logger.isEnabledFor(logging.INFO):
+            logger.info(f"Sent data {bytes(data_array).hex()} to device")
 
-            return int(value)
+    def log_stats(self):
+        self.gpio.log_stats()
 
-    @staticmethod
-    def _compensate_wind(result):
-        windspeed = result.get("windspeed", 0)
-        windgusts = result.get("windgusts", windspeed)
-        if windspeed > windgusts:
-            result["windspeed"] = windgusts
-            logger.debug(f"Wind speed {windspeed} should not exceed maximum wind speed {windgusts}")
+    def close(self):
+        self.gpio.close()
+
+    def _transmittable_data(self, weather_data: Mapping, requested_data: List[dict]):
+        plan = self.plan if requested_data is self.bits else BitPackingPlan(requested_data)
+        return plan.transmittable_data(weather_data)
+
+
+class DisplayGroup(object):
+    """Several displays that show the same weather data, each with its own SPI device, frequency and layout
 
-        return result
+    A frame of the group is the concatenation of the frames of its displays. The weather data is interpolated once for
+    all displays, the frames of all displays are encoded in the same pass, and a FrameTable of the group holds them all.
+    Every display sends its part from its own writer thread, so the transfers to different buses run in parallel.
+    """
+
+    def __init__(self, interfaces: Sequence[WeatherVaneInterface]):
+        self.interfaces = list(interfaces)
+        self.slices = []
+        offset = 0
+        for interface in self.interfaces:
+            self.slices.append(slice(offset, offset + interface.byte_length))
+            offset += interface.byte_length
+        self.byte_length = offset
+
+    def __repr__(self):
+        return f"DisplayGroup({', '.join(repr(interface) for interface in self.interfaces)})"
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    @classmethod
+    def from_configuration(cls, *args, **configuration) -> "DisplayGroup":
+        """A WeatherVaneInterface per display of the configuration, or for the configuration itself if it has none"""
+        displays = configuration.get("displays") or [{}]
+        return cls([WeatherVaneInterface(*args, **{**configuration, **display}) for display in displays])
+
+    def encode_weather_data(self, weather_data, first_frame: bytes = None) -> bytes:
+        """The frames of all displays, one after the other
+
+        @param first_frame: the frame of the first display, if it is encoded already
+        """
+        interfaces = self.interfaces if first_frame is None else self.interfaces[1:]
+        frames = [interface.encode_weather_data(weather_data) for interface in interfaces]
+        if first_frame is not None:
+            frames.insert(0, first_frame)
+        return b"".join(frames)
+
+    def frames_of(self, frame: bytes) -> List[bytes]:
+        """The frame of every display in a frame of the group"""
+        return [frame[frame_slice] for frame_slice in self.slices]
+
+    def send(self, weather_data):
+        self.send_frame(self.encode_weather_data(weather_data))
+
+    def send_frame(self, frame: bytes):
+        if len(self.interfaces) == 1:
+            self.interfaces[0].send_frame(frame)
+            return
+        frame = memoryview(frame)
+        for interface, frame_slice in zip(self.interfaces, self.slices):
+            interface.send_frame(frame[frame_slice])
+
+    def log_stats(self):
+        for interface in self.interfaces:
+            interface.log_stats()
+
+    def close(self):
+        for interface in self.interfaces:
+            interface.close()
 
 
 class Display(object):
@@ -148,6 +172,20 @@ class Display(object):
         minutes += time_array[1]
         return minutes
 
+    def seconds_until_next_transition(self, now):
+        """The amount of seconds from now (a datetime) until the display must be switched on or off
+
+        @return: the amount of seconds, or None if the display is never switched automatically
+        """
+        if not self.auto_disable_display:
+            return None
+        current_minute = now.hour * 60 + now.minute
+        seconds_into_minute = now.second + now.microsecond / 1_000_000
+        # The display is on during the start and the end minute, so it is switched off one minute after the end
+        transitions = {self.start_at_minutes, (self.end_at_minutes + 1) % MINUTES_PER_DAY}
+        minutes = min((minute - current_minute - 1) % MINUTES_PER_DAY + 1 for minute in transitions)
+        return minutes * 60 - seconds_into_minute + TRANSITION_MARGIN
+
     def is_active(self, current_minute):
         if self.start_at_minutes < self.end_at_minutes:
             return self.start_at_minutes <= current_minute <= self.end_at_minutes